@@ -1,81 +1,169 @@
 import json
-import re
+import math
+import time
+from typing import Dict, List, Optional, Tuple
+from command_schema import CommandError, validate_command
+from config_registry import get_registry
+from json_stream import first_json_value
+from term_matcher import TermMatcher
+
+class CommandRecord:
+    """One command issued to the robot and the pose it leaves the robot in"""
+    __slots__ = ['action', 'params', 'timestamp', 'pose']
+
+    def __init__(self, action: str, params: Dict, timestamp: float, pose: Tuple[float, float, float]):
+        self.action = action
+        self.params = params
+        self.timestamp = timestamp
+        self.pose = pose
+
+    def as_dict(self) -> Dict:
+        return {"action": self.action, "params": self.params,
+                "timestamp": self.timestamp, "pose": self.pose}
+
+
+class ContextBuffer:
+    """Fixed-capacity ring buffer of CommandRecord entries.
+
+    Slots are allocated once; appending overwrites the oldest record, so the
+    memory footprint stays constant over an all-day session. Indexing follows
+    list conventions (buffer[-1] is the newest record).
+    """
+
+    def __init__(self, capacity: int = 32):
+        if capacity < 1:
+            raise ValueError("Context buffer capacity must be positive")
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self._next = 0    # Slot the next record is written to
+        self._size = 0
+        self.last_pose = (0.0, 0.0, 0.0)
+
+    def append(self, record: CommandRecord):
+        self._slots[self._next] = record
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+        self.last_pose = record.pose
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __getitem__(self, index: int) -> CommandRecord:
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("context buffer index out of range")
+        return self._slots[(self._next - self._size + index) % self.capacity]
+
+    def last(self, n: int) -> List[CommandRecord]:
+        """Up to n most recent records, oldest first"""
+        n = min(n, self._size)
+        return [self[i] for i in range(self._size - n, self._size)]
+
+    def clear(self):
+        self._slots = [None] * self.capacity
+        self._next = 0
+        self._size = 0
+        self.last_pose = (0.0, 0.0, 0.0)
+
 
 class PepperPromptEngine:
-    def __init__(self):
-        # Load domain terminology library
-        with open("navigation_params.json") as f:
-            self.domain_terms = json.load(f)
-            
+    def __init__(self, context_capacity: int = 32):
+        """
+        :param context_capacity: Number of recent commands kept for completion and coreference
+        """
+        # Domain terminology library is shared through the config registry
+        self.registry = get_registry()
+
         # Initialize conversation memory
-        self.context_buffer = []
+        self.context_buffer = ContextBuffer(context_capacity)
+
+    @property
+    def domain_terms(self):
+        return self.registry.get("navigation_params.json")
+
+    @property
+    def term_matcher(self):
+        # Compiled once per version of the file; tags every term in a single pass
+        return self.registry.index("navigation_params.json", "term_matcher", TermMatcher)
     
     def _enhance_semantics(self, text):
         """Semantic enhancement processing"""
         # Term replacement
-        for term in self.domain_terms:
-            text = re.sub(term["pattern"], f"<{term['type']}>{term['std']}</{term['type']}>", text)
-        return text
+        return self.term_matcher.tag(text)
     def _generate_prompt(self, input_text):
         """Generate structured prompt"""
         enhanced_text = self._enhance_semantics(input_text)
-        return f"""**Input Instruction**: {enhanced_text}
+        context = self.context_prompt()
+        return f"""{context}**Input Instruction**: {enhanced_text}
         **Return Format Requirements**: Must be compact pure JSON format. No explanatory text should be added before or after the JSON    structure, and code block markers (such as ```json or ```) are prohibited.
         - Do not return empty objects. When no atomic tasks are found, return the following content:
           {{"action": "answer", "params": {{"response": "Sorry, I cannot complete the task"}}}}
         """
     def _validate_command(self, command):
-        """Command validation"""
-        # JSON Schema validation
-        required_params = {
-            "move": ["x", "y", "theta"],
-            "answer": ["response"]
-        }
-        action = command["action"]
-        missing = [p for p in required_params.get(action, []) 
-                  if p not in command["params"]]
-        
-        # Safety parameter check
-        if action == "move" and command["params"].get("speed", 0) > 1.0:
-            raise ValueError("Navigation speed exceeds safety threshold")
-            
-        return not missing
+        """Command validation against the action schema"""
+        try:
+            validate_command(command)
+        except CommandError as e:
+            # Safety parameter check: out-of-range values that must not be clamped
+            if "range" in e.kinds:
+                raise ValueError(str(e))
+            return False
+        return True
     def extract_json_from_text(self,text):
-        # 去掉换行符和空格
-        text = text.strip()
-        # 找到JSON的开始位置（第一个 '{' 或 '['）
-        start = 0
-        for i, char in enumerate(text):
-            if char in ['{', '[']:
-                start = i
-                print(f"{i}")
-                break
-        
-        # 找到JSON的结束位置（最后一个 '}' 或 ']'）
-        end = 0
-        i=0
-        stack = []
-        for i, char in enumerate(text[start:]):
-            if char in ['{', '[']:
-                stack.append(char)
-            elif char in ['}', ']']:
-                if stack:
-                    stack.pop()
-                    end=i
-                else:
-                    
-                    print(f"\n{i}")
-                    break
-        end = end + start
-        # 提取JSON部分
-        json_content = text[start:end+1]
-        return json_content
+        """Raw text of the first complete JSON object or array in an LLM reply"""
+        return first_json_value(text.strip())
 
     def _complete_parameters(self, command):
         """Parameter auto-completion"""
         # Coordinate completion logic
         if "x" not in command["params"]:
-            last_pos = self.context_buffer[-1]["params"] if self.context_buffer else {"x": 0, "y": 0}
-            return {**command["params"], "x": last_pos["x"] + 0.5}
+            last_params = self.context_buffer[-1].params if self.context_buffer else {}
+            return {**command["params"], "x": last_params.get("x", 0) + 0.5}
             
         return command["params"]
+
+    def _resolve_pose(self, action: str, params: Dict) -> Tuple[float, float, float]:
+        """Map pose after a command, starting from the last known pose"""
+        x, y, theta = self.context_buffer.last_pose
+        try:
+            if action == "move":
+                # moveTo is relative to the robot frame: forward x, left y, then turn theta
+                dx = float(params.get("x", 0))
+                dy = float(params.get("y", 0))
+                return (x + dx * math.cos(theta) - dy * math.sin(theta),
+                        y + dx * math.sin(theta) + dy * math.cos(theta),
+                        theta + float(params.get("theta", 0)))
+            if action == "navigate":
+                term = self.term_matcher.lookup(str(params.get("location", "")))
+                if term and term["type"] == "location":
+                    target = term["params"]
+                    return (float(target["x"]), float(target["y"]), float(target["theta"]))
+        except (TypeError, ValueError):
+            pass
+        return (x, y, theta)
+
+    def record(self, command: Dict, timestamp: Optional[float] = None) -> CommandRecord:
+        """
+        Remember a parsed command in the context buffer
+        :param command: Command with "action" and "params"
+        :param timestamp: Issue time, defaults to now
+        :return: The stored record
+        """
+        action = command.get("action", "answer")
+        params = command.get("params") or {}
+        record = CommandRecord(action, params, time.time() if timestamp is None else timestamp,
+                               self._resolve_pose(action, params))
+        self.context_buffer.append(record)
+        return record
+
+    def context_prompt(self, rounds: int = 3) -> str:
+        """Compact summary of the last rounds for coreference ("go back there", "again")"""
+        records = self.context_buffer.last(rounds)
+        if not records:
+            return ""
+        lines = [f"- {json.dumps({'action': r.action, 'params': r.params}, ensure_ascii=False)}"
+                 for r in records]
+        x, y, theta = self.context_buffer.last_pose
+        return ("**Recent Commands** (oldest first):\n" + "\n".join(lines)
+                + f"\n**Current Pose**: x={x:.2f}, y={y:.2f}, theta={theta:.2f}\n")
@@ -1,9 +1,15 @@
+import asyncio
 import json
+import os
+import sys
 from enum import Enum
 from typing import Dict, List, Tuple, Optional
-from openai import OpenAI
 import time
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config_registry import get_registry, thaw
+from llm_gateway import get_gateway
+
 # ==================== 节点类型（保持原样，不新增机器人专用类型） ====================
 class NodeType(Enum):
     START = "start"
@@ -34,6 +40,10 @@ class Node:
         print(f"执行基础节点 {self.id} ({self.type.value})")
         return context, []
 
+    async def execute_async(self, context: Dict) -> Tuple[Dict, List[str]]:
+        # 纯本地节点直接复用同步实现；调用大模型的节点重写此方法
+        return self.execute(context)
+
 # ==================== 所有节点类保持你原来的实现 ====================
 # 👇 以下所有节点类均未做任何修改，完全复制你原来的代码
 
@@ -67,6 +77,10 @@ class StartNode(Node):
             return context, []
         return context, [targets[0]]
 
+    async def execute_async(self, context: Dict) -> Tuple[Dict, List[str]]:
+        # input() 会阻塞事件循环，放到线程里等待语音输入
+        return await asyncio.to_thread(self.execute, context)
+
 class IfElseNode(Node):
     def __init__(self, node_id: str, data: Dict):
         super().__init__(node_id, NodeType.IF_ELSE, data)
@@ -126,10 +140,38 @@ class LLMNode(Node):
     def __init__(self, node_id: str, data: Dict, api_key: str):
         super().__init__(node_id, NodeType.LLM, data)
         self.api_key = api_key
-        self.client = OpenAI(api_key=api_key, base_url="https://ai.gitee.com/v1")  # 修复空格
+        self.client = get_gateway(api_key, "https://ai.gitee.com/v1")  # 所有节点共享连接池
 
     def execute(self, context: Dict) -> Tuple[Dict, List[str]]:
         print(f"[执行节点] {self.id} (llm): {self.data.get('title')}")
+        messages, model_name, temperature = self._build_request(context)
+        try:
+            response = self.client.chat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature
+            )
+            self._store_output(context, response)
+        except Exception as e:
+            print(f"LLM调用错误: {str(e)}")
+        return self._next(context)
+
+    async def execute_async(self, context: Dict) -> Tuple[Dict, List[str]]:
+        """异步版本：等待期间事件循环可以服务其他机器人/会话，取消任务即中止请求"""
+        print(f"[执行节点] {self.id} (llm): {self.data.get('title')}")
+        messages, model_name, temperature = self._build_request(context)
+        try:
+            response = await self.client.achat.completions.create(
+                model=model_name,
+                messages=messages,
+                temperature=temperature
+            )
+            self._store_output(context, response)
+        except Exception as e:
+            print(f"LLM调用错误: {str(e)}")
+        return self._next(context)
+
+    def _build_request(self, context: Dict) -> Tuple[List[Dict], str, float]:
         prompt_template = self.data.get("prompt_template", [])
         messages = []
         for item in prompt_template:
@@ -151,18 +193,14 @@ class LLMNode(Node):
         model_config = self.data.get("model", {})
         model_name = model_config.get("name", "Qwen3-8B")
         temperature = model_config.get("temperature", 0.7)
-        try:
-            response = self.client.chat.completions.create(
-                model=model_name,
-                messages=messages,
-                temperature=temperature
-            )
-            llm_output = response.choices[0].message.content.strip()
-            print(f"  LLM输出: {llm_output[:100]}...")
-            context.setdefault("node_outputs", {})[self.id] = llm_output
-        except Exception as e:
-            print(f"LLM调用错误: {str(e)}")
-            llm_output = ""
+        return messages, model_name, temperature
+
+    def _store_output(self, context: Dict, response):
+        llm_output = response.choices[0].message.content.strip()
+        print(f"  LLM输出: {llm_output[:100]}...")
+        context.setdefault("node_outputs", {})[self.id] = llm_output
+
+    def _next(self, context: Dict) -> Tuple[Dict, List[str]]:
         targets = self.get_next_node_targets()
         if not targets:
             print(f"[{self.id}] 警告：没有下一个节点，工作流结束")
@@ -182,7 +220,7 @@ class AnswerNode(Node):
             var_path = var_path_str.split(".")
             question_var = var_path[-1]
         question = context.get("conversation", {}).get(question_var, "请回答：")
-        user_answer = input(f"{question}: ")
+        user_answer = self._ask(question)
         context.setdefault("conversation", {})["query" + str(context["conversation"].get("dialogue_count",1))] = user_answer
         context["conversation"]["dialogue_count"] = context["conversation"].get("dialogue_count",1) + 1
         targets = self.get_next_node_targets()
@@ -191,6 +229,13 @@ class AnswerNode(Node):
             return context, []
         return context, [targets[0]]
 
+    def _ask(self, question: str) -> str:
+        return input(f"{question}: ")
+
+    async def execute_async(self, context: Dict) -> Tuple[Dict, List[str]]:
+        # input() 会阻塞事件循环，放到线程里等待用户回答
+        return await asyncio.to_thread(self.execute, context)
+
 class ParameterExtractorNode(Node):
     def __init__(self, node_id: str, data: Dict):
         super().__init__(node_id, NodeType.PARAM_EXTRACTOR, data)
@@ -307,12 +352,7 @@ class ResearchWorkflow:
 
     def execute(self, initial_context: Dict = None) -> Dict:
         context = initial_context or {}
-        current_nodes = []
-        for node_id, node in self.nodes.items():
-            if node.type == NodeType.START:
-                print(f"找到开始节点: {node_id}")
-                current_nodes = [node_id]
-                break
+        current_nodes = self._start_nodes()
 
         MAX_STEPS = 50
         step = 0
@@ -338,11 +378,48 @@ class ResearchWorkflow:
             print("警告: 达到最大步数，可能陷入循环")
         return context
 
+    async def execute_async(self, initial_context: Dict = None) -> Dict:
+        """与 execute 相同的遍历顺序；一个事件循环可以同时运行多个工作流（多台机器人/多个会话）"""
+        context = initial_context or {}
+        current_nodes = self._start_nodes()
+
+        MAX_STEPS = 50
+        step = 0
+        while current_nodes and step < MAX_STEPS:
+            step += 1
+            next_nodes = []
+            print(f"\n=== 步骤 {step} ===")
+            for node_id in current_nodes:
+                if node_id not in self.nodes:
+                    print(f"警告: 未找到节点 {node_id}")
+                    continue
+                node = self.nodes[node_id]
+                try:
+                    context, targets = await node.execute_async(context)
+                    for t in targets:
+                        if t not in next_nodes:
+                            next_nodes.append(t)
+                except Exception as e:
+                    print(f"节点执行错误: {str(e)}")
+            current_nodes = next_nodes
+
+        if step >= MAX_STEPS:
+            print("警告: 达到最大步数，可能陷入循环")
+        return context
+
+    def _start_nodes(self) -> List[str]:
+        for node_id, node in self.nodes.items():
+            if node.type == NodeType.START:
+                print(f"找到开始节点: {node_id}")
+                return [node_id]
+        return []
+
 # ==================== 主程序（加载 config.json） ====================
 if __name__ == "__main__":
     try:
-        with open("config.json", "r", encoding="utf-8") as f:
-            workflow_data = json.load(f)
+        # 通过共享配置注册表加载；工作流会修改节点数据，所以取可写副本
+        config_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.json")
+        workflow_data = thaw(get_registry().get(config_path))
     except FileNotFoundError:
         print("❌ 未找到 config.json，请创建配置文件")
         exit(1)
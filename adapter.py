@@ -1,108 +1,376 @@
-from openai import OpenAI
+from llm_gateway import get_gateway
+import asyncio
 import json
+import re
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
 from PepperPromptEngine import PepperPromptEngine
+from command_schema import CommandError, validate_command, validate_plan
+from config_registry import get_registry
+from fast_path import FastPathParser
+from json_stream import JsonStreamExtractor
+from prompt_builder import PromptBuilder
+from response_cache import ResponseCache
+from term_matcher import TermMatcher
+
+ACTIONS = ["move", "navigate", "explore", "set_volume", "set_led", "perform_gesture"]
+
+PROMPT_INTRO = """You are the control center for a Pepper robot. Please convert user commands into a JSON format that strictly follows the rules below:
+**Pepper Robot Control Hub Instruction Conversion Rules**"""
+
+# Per-action rule text: (mapping rule, parameter rule, default value rule, example)
+ACTION_RULES = {
+    "move": (
+        '- Detect movement-related verbs (e.g., "walk," "move," "turn") → Map to `move` action',
+        """- **move Action:**
+  - Must include and only include three parameters: `x` (meters), `y` (meters), `theta` (radians, 0 indicates forward direction)
+  - Default value: `y=0` (if no lateral displacement is specified by the user)
+  - Example: `Move forward 1 meter` → `{"action": "move", "params": {"x": 1, "y": 0, "theta": 0}}`
+  - ❌ Incorrect: `Move forward` → `{"action": "move", "params": {"x": 1, "name": "forward"}}`
+  - ✅ Correct: `Move forward` → `{"action": "move", "params": {"x": 1, "y": 0, "theta": 0}}`""",
+        "  - `move` action: `y=0` (no lateral displacement)",
+        None),
+    "navigate": (
+        '- Detect location-related nouns or navigation verbs (e.g., "take me to", "go to","directions to") → Map to `navigate` action',
+        "- `navigate` → Must include `location` (string); if no location is specified, ask where to go "
+        "with the `answer` action",
+        None,
+        """- User Instruction: `Take me to the meeting room`
+  - Output: `{"action": "navigate", "params": {"location": "meeting room"}}`"""),
+    "explore": (
+        '- Detect exploration-related verbs (e.g., "explore," "check") → Map to `explore` action',
+        "- `explore` → Must include `radius` (float)",
+        None,
+        None),
+    "set_volume": (
+        '- Detect volume adjustment verbs (e.g., "increase volume," "decrease volume") → Map to `set_volume` action',
+        "- `set_volume` → Must include `level` (float between 0.0 and 1.0)",
+        "  - `set_volume` action: `level=0.5` (default medium volume)",
+        """- User Instruction: `Increase the volume to maximum`
+  - Output: `{"action": "set_volume", "params": {"level": 1.0}}`"""),
+    "set_led": (
+        '- Detect lighting adjustment verbs (e.g., "light up," "turn off lights") → Map to `set_led` action',
+        '- `set_led` → Must include `color` (limited to: "red", "green", "blue", "yellow", "white")',
+        '  - `set_led` action: `color="white"` (default color)',
+        """- User Instruction: `Light up the red light`
+  - Output: `{"action": "set_led", "params": {"color": "red"}}`"""),
+    "perform_gesture": (
+        '- Detect gesture-related verbs (e.g., "wave," "bow") → Map to `perform_gesture` action',
+        """- **perform_gesture Action:**
+  - Must include and only include one parameter: `name` (limited to: "wave", "bow", "reset")
+  - Example: `Wave` → `{"action": "perform_gesture", "params": {"name": "wave"}}`""",
+        None,
+        None),
+}
+
+# Output template line of each parameter, by action
+TEMPLATE_PARAMS = {
+    "move": ['"x": float', '"y": float', '"theta": float'],
+    "explore": ['"radius": float'],
+    "answer": ['"response": "natural language response"'],
+    "navigate": ['"location": "location name"'],
+    "set_volume": ['"level": float(0.0-1.0)'],
+    "set_led": ['"color": "red|green|blue|yellow|white"'],
+    "perform_gesture": ['"name": "wave|bow|reset"'],
+}
+
+PROMPT_FORMAT = """**3. Format Requirements:**
+- Strictly follow the single JSON object format; arrays are prohibited
+- No extra parameters or missing required parameters
+- Parameter types must comply with constraints (e.g., `theta` must be a float, `level` must be a float between 0.0 and 1.0)
+- The `move` action must not include the `name` parameter"""
+
+PROMPT_SPECIAL = """**5. Special Case Handling:**
+- If the user instruction cannot be fully parsed, return the `answer` action and include the unparsed part as the `response` parameter
+  - Example: `I don't know how to operate` → `{"action": "answer", "params": {"response": "Please provide a clearer instruction"}}`"""
+
+BATCH_RULES = """**8. Batch Mode:**
+- When the user message contains numbered, independent instructions, convert each one separately with the rules above
+- Then return {"commands": [...]} with exactly one command object per instruction, in the same order"""
+
+# Cheap keyword cues used to pick the rules for a compact prompt
+ACTION_CUES = {
+    "move": r"\b(?:move|walk|step|turn|forward|backward|left|right|meters?)\b|前进|后退|走|转|米",
+    "navigate": r"\b(?:take me|go to|navigate|directions|bring me|lead me|where is)\b|带我|去|导航|在哪",
+    "explore": r"\b(?:explore|check|look around|scan)\b|探索|看看",
+    "set_volume": r"\b(?:volume|louder|quieter|mute|sound)\b|音量|声音|静音",
+    "set_led": r"\b(?:lights?|leds?|red|green|blue|yellow|white)\b|灯",
+    "perform_gesture": r"\b(?:wave|bow|gesture|reset|hand)\b|挥手|鞠躬|招手|手势",
+}
+_CUE_PATTERNS = {action: re.compile(pattern, re.IGNORECASE) for action, pattern in ACTION_CUES.items()}
+
+
+def build_command_prompt(actions=None):
+    """
+    Command conversion prompt restricted to some actions
+    :param actions: Actions whose rules are included (None = all); `answer` is always included
+    :return: PromptBuilder with one section per rule group
+    """
+    actions = [a for a in ACTIONS if actions is None or a in actions]
+    name = "command" if len(actions) == len(ACTIONS) else "command[" + ",".join(actions) + "]"
+    mapping = [ACTION_RULES[a][0] for a in actions] + ["- If the action cannot be clearly parsed → Default to `answer` action"]
+    params = [ACTION_RULES[a][1] for a in actions]
+    defaults = [ACTION_RULES[a][2] for a in actions if ACTION_RULES[a][2]]
+    examples = [ACTION_RULES[a][3] for a in actions if ACTION_RULES[a][3]]
+    template_params = [line for a in ["move", "explore", "answer", "navigate", "set_volume", "set_led", "perform_gesture"]
+                       if a == "answer" or a in actions for line in TEMPLATE_PARAMS[a]]
+    template = ('**6. Output Template:**\n{\n  "action": "' + "|".join(actions + ["answer"]) + '",\n  "params": {\n    '
+                + ",\n    ".join(template_params) + "\n  }\n}")
+    sections = [
+        ("intro", PROMPT_INTRO),
+        ("mapping", "**1. Action Mapping Rules:**\n" + "\n".join(mapping)),
+        ("parameters", "**2. Parameter Parsing Rules:**\n" + "\n".join(params)),
+        ("format", PROMPT_FORMAT),
+        ("defaults", "**4. Default Value Supplement Rules:**\n- When the user does not explicitly specify certain "
+                     "parameters, default values are automatically filled based on the action type:\n"
+                     + "\n".join(defaults) if defaults else ""),
+        ("special", PROMPT_SPECIAL),
+        ("template", template),
+        ("examples", "**7. Examples:**\n" + "\n".join(examples) if examples else ""),
+        # Only the full prompt serves parse_many, so compact variants leave it out
+        ("batch", BATCH_RULES if name == "command" else ""),
+    ]
+    return PromptBuilder(name, sections)
+
+
+def relevant_actions(text):
+    """Actions an utterance plausibly maps to, judged from keyword cues and known places"""
+    found = {action for action, pattern in _CUE_PATTERNS.items() if pattern.search(text)}
+    matcher = get_registry().index("navigation_params.json", "term_matcher", TermMatcher)
+    if any(term["type"] == "location" for _, _, term in matcher.finditer(text)):
+        found.add("navigate")
+    return found
+
 
 class DeepSeekAdapter:
-    def __init__(self, api_key: str, model: str ):
+    def __init__(self, api_key: str, model: str, use_fast_path: bool = True,
+                 response_cache: Optional[ResponseCache] = None, compact_prompt: bool = False):
         self.model = model    
-        self.client = OpenAI(api_key=api_key, base_url="https://api.chatanywhere.tech/v1")
-        self.system_prompt = """You are the control center for a Pepper robot. Please convert user commands into a JSON format that strictly follows the rules below:
-        **Pepper Robot Control Hub Instruction Conversion Rules**
-        **1. Action Mapping Rules:**
-        - Detect movement-related verbs (e.g., "walk," "move," "turn") → Map to `move` action
-        - Detect location-related nouns or navigation verbs (e.g., "take me to", "go to","directions to") → Map to `navigate` action
-        - Detect exploration-related verbs (e.g., "explore," "check") → Map to `explore` action
-        - Detect volume adjustment verbs (e.g., "increase volume," "decrease volume") → Map to `set_volume` action
-        - Detect lighting adjustment verbs (e.g., "light up," "turn off lights") → Map to `set_led` action
-        - Detect gesture-related verbs (e.g., "wave," "bow") → Map to `perform_gesture` action
-        - If the action cannot be clearly parsed → Default to `answer` action
-
-        **2. Parameter Parsing Rules:**
-        - **move Action:**
-          - Must include and only include three parameters: `x` (meters), `y` (meters), `theta` (radians, 0 indicates forward direction)
-          - Default value: `y=0` (if no lateral displacement is specified by the user)
-          - Example: `Move forward 1 meter` → `{"action": "move", "params": {"x": 1, "y": 0, "theta": 0}}`
-        - **perform_gesture Action:**
-          - Must include and only include one parameter: `name` (limited to: "wave", "bow", "reset")
-          - Example: `Wave` → `{"action": "perform_gesture", "params": {"name": "wave"}}`
-        - **Other Action Parameters:**
-          - `navigate` → Must include `location` (string)
-          - `explore` → Must include `radius` (float)
-          - `set_volume` → Must include `level` (float between 0.0 and 1.0)
-          - `set_led` → Must include `color` (limited to: "red", "green", "blue", "yellow", "white")
-
-        **3. Format Requirements:**
-        - Strictly follow the single JSON object format; arrays are prohibited
-        - No extra parameters or missing required parameters
-        - Parameter types must comply with constraints (e.g., `theta` must be a float, `level` must be a float between 0.0 and 1.0)
-        - The `move` action must not include the `name` parameter
-
-        **4. Error Example Correction:**
-        - ❌ Incorrect: `Move forward` → `{"action": "move", "params": {"x": 1, "name": "forward"}}`
-        - ✅ Correct: `Move forward` → `{"action": "move", "params": {"x": 1, "y": 0, "theta": 0}}`
-
-        **5. Default Value Supplement Rules:**
-        - When the user does not explicitly specify certain parameters, default values are automatically filled based on the action type:
-          - `move` action: `y=0` (no lateral displacement)
-          - `navigate` action: `location="current position"` (if no location is specified)
-          - `set_volume` action: `level=0.5` (default medium volume)
-          - `set_led` action: `color="white"` (default color)
-
-        **6. Special Case Handling:**
-        - If the user instruction cannot be fully parsed, return the `answer` action and include the unparsed part as the `response` parameter
-          - Example: `I don't know how to operate` → `{"action": "answer", "params": {"response": "Please provide a clearer instruction"}}`
-
-        **7. Output Template:**
-        {
-          "action": "move|answer|navigate|explore|set_volume|set_led|perform_gesture",
-          "params": {
-            "x": float, 
-            "y": float,
-            "theta": float,
-            "radius": float,
-            "response": "natural language response",
-            "location": "location name",
-            "level": float(0.0-1.0),
-            "color": "red|green|blue|yellow|white",
-            "name": "wave|bow|reset"
-          }
-        }
+        self.client = get_gateway(api_key, "https://api.chatanywhere.tech/v1")
+        self.engine = PepperPromptEngine()
+        # Simple commands are parsed locally; everything else goes to the LLM
+        self.fast_path = FastPathParser() if use_fast_path else None
+        self.response_cache = response_cache if response_cache is not None else ResponseCache()
+        # Compact prompts keep only the rules of the plausible actions
+        self.compact_prompt = compact_prompt
+        self.prompt = build_command_prompt()
+        self._compact_prompts = {}
+        self.system_prompt = self.prompt.prefix
+
+    def _prompt_for(self, text):
+        """Full prompt, or with compact_prompt the rules of the actions the text hints at"""
+        if not self.compact_prompt:
+            return self.prompt
+        actions = frozenset(relevant_actions(text))
+        if not actions or len(actions) == len(ACTIONS):
+            return self.prompt
+        prompt = self._compact_prompts.get(actions)
+        if prompt is None:
+            prompt = self._compact_prompts[actions] = build_command_prompt(actions)
+        return prompt
+
+    def _user_message(self, text):
+        """User turn prefixed with the last rounds so references like "go back" resolve"""
+        context = self.engine.context_prompt()
+        return f"{context}**Input Instruction**: {text}" if context else text
 
-        **8. Examples:**
-        - User Instruction: `Take me to the meeting room`
-          - Output: `{"action": "navigate", "params": {"location": "meeting room"}}`
-        - User Instruction: `Increase the volume to maximum`
-          - Output: `{"action": "set_volume", "params": {"level": 1.0}}`
-        - User Instruction: `Light up the red light`
-          - Output: `{"action": "set_led", "params": {"color": "red"}}`
-        """  
     def parse_command(self, text):
+        command = self._local_command(text)
+        if command is not None:
+            return self._validate_output(command)
+
         # Call the API only once
+        try:
+            parsed = self._request(self._user_message(text), self._prompt_for(text))
+        except ValueError as e:
+            return self._error_response(str(e))
+        command = self._validate_output(parsed)
+        self.response_cache.put(text, command)
+        return command
+
+    async def parse_command_async(self, text):
+        """parse_command on the asyncio gateway; cancelling the caller aborts the request"""
+        command = self._local_command(text)
+        if command is not None:
+            return self._validate_output(command)
+        try:
+            parsed = await self._request_async(self._user_message(text), self._prompt_for(text))
+        except ValueError as e:
+            return self._error_response(str(e))
+        command = self._validate_output(parsed)
+        self.response_cache.put(text, command)
+        return command
+
+    def _local_command(self, text):
+        """Command from the fast path or the response cache, without a request"""
+        if self.fast_path is not None:
+            command = self.fast_path.parse(text)
+            if command is not None:
+                return command
+        return self.response_cache.get(text)
+
+    def _request(self, content, prompt=None, keep_list=False):
+        """One chat completion; returns the first JSON value of the reply (ValueError if unusable)"""
+        prompt = prompt or self.prompt
+        messages = prompt.messages(content)
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": self.system_prompt},
-                {"role": "user", "content": text}
-            ],
+            messages=messages,
             response_format={"type": "json_object"},
             temperature=0.3
         )
+        return self._decode(prompt, messages, response, keep_list)
 
-        engine=PepperPromptEngine()
-        raw_content=engine.extract_json_from_text(response.choices[0].message.content) 
+    async def _request_async(self, content, prompt=None, keep_list=False):
+        prompt = prompt or self.prompt
+        messages = prompt.messages(content)
+        response = await self.client.achat.completions.create(
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.3
+        )
+        return self._decode(prompt, messages, response, keep_list)
+
+    def _decode(self, prompt, messages, response, keep_list):
+        prompt.record_usage(response, messages)
+
+        raw_content=self.engine.extract_json_from_text(response.choices[0].message.content) 
 
         try:
             parsed = json.loads(raw_content)
         except json.JSONDecodeError as e:
-            return self._error_response(f"JSON parsing failed: {str(e)}")
+            raise ValueError(f"JSON parsing failed: {str(e)}")
 
         # Handle array responses (should not occur)
-        if isinstance(parsed, list):
+        if isinstance(parsed, list) and not keep_list:
             if len(parsed) == 0:
-                return self._error_response("Received empty array response")
+                raise ValueError("Received empty array response")
             parsed = parsed[0]
+        return parsed
+
+    def parse_many(self, texts, max_workers=8, pack_size=1):
+        """
+        Parse several independent utterances concurrently
+        :param texts: Utterances, e.g. replayed logs or requests from several kiosks
+        :param max_workers: Upper bound on requests in flight
+        :param pack_size: Utterances packed into one JSON-array request (1 = one request each)
+        :return: One command per utterance, in input order; failures become error responses
+        """
+        results = [None] * len(texts)
+        pending = []
+        for i, text in enumerate(texts):
+            command = self.fast_path.parse(text) if self.fast_path is not None else None
+            if command is None:
+                command = self.response_cache.get(text)
+            if command is not None:
+                results[i] = self._validate_output(command, record=False)
+            else:
+                pending.append(i)
+
+        size = max(1, pack_size)
+        groups = [pending[start:start + size] for start in range(0, len(pending), size)]
+        if not groups:
+            return results
+
+        def run(group):
+            try:
+                if len(group) == 1:
+                    return [self._parse_isolated(texts[group[0]])]
+                return self._parse_packed([texts[i] for i in group])
+            except Exception as e:
+                return [self._error_response(f"Request failed: {str(e)}")] * len(group)
+
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(groups)))) as pool:
+            for group, commands in zip(groups, pool.map(run, groups)):
+                for i, command in zip(group, commands):
+                    results[i] = command
+                    self.response_cache.put(texts[i], command)
+        return results
+
+    async def parse_many_async(self, texts):
+        """
+        Async parse_many of independent utterances (one request each); concurrency
+        is bounded by the gateway's per-model limit
+        :return: One command per utterance, in input order; failures become error responses
+        """
+        async def parse(text):
+            command = self._local_command(text)
+            if command is not None:
+                return self._validate_output(command, record=False)
+            try:
+                parsed = await self._request_async(text, self._prompt_for(text))
+            except Exception as e:  # ValueError or a request failure; cancellation propagates
+                return self._error_response(str(e))
+            command = self._validate_output(parsed, record=False)
+            self.response_cache.put(text, command)
+            return command
+
+        return list(await asyncio.gather(*(parse(text) for text in texts)))
 
-        return self._validate_output(parsed)
+    def _parse_isolated(self, text):
+        """parse_command without conversation context, for batch items"""
+        try:
+            return self._validate_output(self._request(text, self._prompt_for(text)), record=False)
+        except ValueError as e:
+            return self._error_response(str(e))
+
+    def _parse_packed(self, texts):
+        """Several utterances in one request; falls back to one request each on a count mismatch"""
+        numbered = "\n".join(f"{n}. {text}" for n, text in enumerate(texts, 1))
+        try:
+            parsed = self._request(numbered, keep_list=True)
+        except ValueError:
+            parsed = None
+        commands = parsed.get("commands") if isinstance(parsed, dict) else parsed
+        if not isinstance(commands, list) or len(commands) != len(texts):
+            return [self._parse_isolated(text) for text in texts]
+
+        commands, errors = validate_plan(commands)
+        # An item the batch answer got wrong is asked again on its own
+        return [self._parse_isolated(text) if i in errors else command
+                for i, (command, text) in enumerate(zip(commands, texts))]
+
+    def parse_command_stream(self, text):
+        """
+        Stream the completion and yield each validated command as soon as its
+        JSON closes, so the first command can run while the rest is generated
+        """
+        if self.fast_path is not None:
+            command = self.fast_path.parse(text)
+            if command is not None:
+                yield self._validate_output(command)
+                return
+        cached = self.response_cache.get(text)
+        if cached is not None:
+            yield self._validate_output(cached)
+            return
+
+        prompt = self._prompt_for(text)
+        messages = prompt.messages(self._user_message(text))
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            response_format={"type": "json_object"},
+            temperature=0.3,
+            stream=True
+        )
+        prompt.record_usage(None, messages)
+
+        extractor = JsonStreamExtractor()
+        produced = False
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content or ""
+            for parsed in extractor.feed(delta):
+                if not isinstance(parsed, dict) or "action" not in parsed:
+                    continue
+                produced = True
+                yield self._validate_output(parsed)
+
+        if not produced:
+            yield self._error_response("No complete command in streamed response")
 
     def _error_response(self, message):
         return {
@@ -111,9 +379,12 @@ class DeepSeekAdapter:
         }
 
 
-    def _validate_output(self, command):
-        # Parameter range validation
-        if command["action"] == "set_volume":
-            level = command["params"].get("level", 0.5)
-            command["params"]["level"] = max(0.0, min(1.0, level))
+    def _validate_output(self, command, record=True):
+        # Types, enums, ranges and defaults from the action schema
+        try:
+            command = validate_command(command)
+        except CommandError as e:
+            return self._error_response(str(e))
+        if record:
+            self.engine.record(command)
         return command
@@ -0,0 +1,160 @@
+import math
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# Field spec keys: type (float|str), required, default, min, max,
+# clamp (True = clamp into [min, max], False = reject), enum, lower
+SCHEMAS: Dict[str, Dict[str, Dict[str, Any]]] = {
+    "move": {
+        "x": {"type": float, "default": 0.0},
+        "y": {"type": float, "default": 0.0},
+        "theta": {"type": float, "default": 0.0},
+        # Optional; anything above the safety threshold is refused, never clamped
+        "speed": {"type": float, "min": 0.0, "max": 1.0, "clamp": False},
+    },
+    "navigate": {
+        "location": {"type": str, "required": True},
+    },
+    "explore": {
+        "radius": {"type": float, "default": 2.0, "min": 0.0, "max": 20.0, "clamp": True},
+    },
+    "set_volume": {
+        "level": {"type": float, "default": 0.5, "min": 0.0, "max": 1.0, "clamp": True},
+    },
+    "set_led": {
+        "color": {"type": str, "default": "white", "lower": True,
+                  "enum": ["red", "green", "blue", "yellow", "white"]},
+        "duration": {"type": float, "default": 1.0, "min": 0.0, "max": 10.0, "clamp": True},
+    },
+    "perform_gesture": {
+        "name": {"type": str, "required": True, "lower": True, "enum": ["wave", "bow", "reset"]},
+    },
+    "answer": {
+        "response": {"type": str, "required": True},
+    },
+}
+
+
+class CommandError(ValueError):
+    """A command that does not match its action schema"""
+
+    def __init__(self, action: str, problems: List[Tuple[str, str, str]]):
+        """
+        :param action: Action of the rejected command
+        :param problems: (field, kind, message) with kind one of
+                         "action", "missing", "type", "range", "enum"
+        """
+        self.action = action
+        self.problems = problems
+        super().__init__(f"Invalid {action} command: " + "; ".join(message for _, _, message in problems))
+
+    @property
+    def kinds(self) -> set:
+        return {kind for _, kind, _ in self.problems}
+
+
+def _as_float(value):
+    if isinstance(value, bool):
+        raise TypeError
+    value = float(value)
+    if not math.isfinite(value):
+        raise ValueError
+    return value
+
+
+def _as_str(value):
+    if not isinstance(value, str):
+        raise TypeError
+    return value.strip()
+
+
+def _compile(action: str, fields: Dict[str, Dict[str, Any]]) -> Callable[[Dict], Dict]:
+    """Turn one schema into a validator closing over flat per-field tuples"""
+    plan = []
+    for name, spec in fields.items():
+        convert = _as_float if spec["type"] is float else _as_str
+        enum = frozenset(spec["enum"]) if "enum" in spec else None
+        plan.append((name, convert, spec.get("required", False), "default" in spec, spec.get("default"),
+                     spec.get("min"), spec.get("max"), spec.get("clamp", True),
+                     spec.get("lower", False), enum, spec["type"].__name__))
+
+    def validate(params: Dict) -> Dict:
+        out = {}
+        problems = []
+        for name, convert, required, has_default, default, lo, hi, clamp, lower, enum, type_name in plan:
+            value = params.get(name)
+            if value is None or value == "":
+                if required:
+                    problems.append((name, "missing", f"'{name}' is required"))
+                elif has_default:
+                    out[name] = default
+                continue
+            try:
+                value = convert(value)
+            except (TypeError, ValueError):
+                problems.append((name, "type", f"'{name}' must be a {type_name}"))
+                continue
+            if lower:
+                value = value.lower()
+            if enum is not None and value not in enum:
+                problems.append((name, "enum", f"'{name}' must be one of {sorted(enum)}"))
+                continue
+            if lo is not None and value < lo or hi is not None and value > hi:
+                if not clamp:
+                    problems.append((name, "range", f"'{name}'={value} outside [{lo}, {hi}]"))
+                    continue
+                value = max(lo, value) if lo is not None else value
+                value = min(hi, value) if hi is not None else value
+            out[name] = value
+        if problems:
+            raise CommandError(action, problems)
+        return out
+
+    validate.__name__ = f"validate_{action}"
+    return validate
+
+
+# Compiled once at import; validate_command only does a dict lookup per call
+VALIDATORS: Dict[str, Callable[[Dict], Dict]] = {action: _compile(action, fields)
+                                                  for action, fields in SCHEMAS.items()}
+
+
+def validate_command(command: Dict) -> Dict:
+    """
+    Check and normalize one command
+    :param command: {"action": ..., "params": {...}}
+    :return: New command with coerced types, clamped ranges, defaults filled
+             and unknown parameters dropped
+    :raises CommandError: When the action is unknown or a parameter is invalid
+    """
+    if not isinstance(command, dict):
+        raise CommandError("unknown", [("action", "action", "command must be an object")])
+    action = command.get("action")
+    validator = VALIDATORS.get(action)
+    if validator is None:
+        raise CommandError(str(action), [("action", "action", f"unknown action '{action}'")])
+    params = command.get("params")
+    if params is None:
+        params = {}
+    elif not isinstance(params, dict):
+        raise CommandError(action, [("params", "type", "'params' must be an object")])
+    return {"action": action, "params": validator(params)}
+
+
+def validate_plan(commands: List[Optional[Dict]]) -> Tuple[List[Optional[Dict]], Dict[int, CommandError]]:
+    """
+    Validate a whole plan before any of it reaches the robot
+    :param commands: Commands in plan order (None entries are skipped)
+    :return: (normalized commands with None for invalid or skipped ones, errors by index)
+    """
+    normalized = []
+    errors = {}
+    for i, command in enumerate(commands):
+        if command is None:
+            normalized.append(None)
+            continue
+        try:
+            normalized.append(validate_command(command))
+        except CommandError as e:
+            normalized.append(None)
+            errors[i] = e
+    return normalized, errors
@@ -0,0 +1,119 @@
+import json
+import os
+import threading
+import time
+from types import MappingProxyType
+from typing import Any, Callable, Optional
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def freeze(value: Any) -> Any:
+    """Read-only view of parsed JSON: dicts become mapping proxies, lists tuples"""
+    if isinstance(value, dict):
+        return MappingProxyType({k: freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+def thaw(value: Any) -> Any:
+    """Mutable deep copy of a frozen view"""
+    if isinstance(value, MappingProxyType):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [thaw(v) for v in value]
+    return value
+
+
+class _Snapshot:
+    """One parsed version of a config file plus the indexes built from it"""
+    __slots__ = ['stat', 'data', 'indexes', 'loaded_at']
+
+    def __init__(self, stat: tuple, data: Any):
+        self.stat = stat
+        self.data = data
+        self.indexes = {}
+        self.loaded_at = time.time()
+
+
+class ConfigRegistry:
+    """Process-wide, lazily loaded registry of the JSON config files.
+
+    Each file is parsed once into an immutable view. Derived indexes (term
+    matcher, example index, ...) are built on first use and cached with the
+    snapshot. The file's mtime and size are checked at most every
+    check_interval seconds; on change the file is parsed and the new
+    snapshot replaces the old one in a single assignment, so readers never
+    see a half-loaded state.
+    """
+
+    def __init__(self, base_dir: str = BASE_DIR, check_interval: float = 1.0):
+        """
+        :param base_dir: Directory that relative file names are resolved against
+        :param check_interval: Minimum seconds between mtime checks of a file
+        """
+        self.base_dir = base_dir
+        self.check_interval = check_interval
+        self._snapshots = {}
+        self._checked = {}
+        self._lock = threading.Lock()
+
+    def _path(self, filename: str) -> str:
+        return filename if os.path.isabs(filename) else os.path.join(self.base_dir, filename)
+
+    def _snapshot(self, filename: str) -> _Snapshot:
+        path = self._path(filename)
+        now = time.monotonic()
+        snapshot = self._snapshots.get(path)
+        if snapshot is not None and now - self._checked.get(path, 0.0) < self.check_interval:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshots.get(path)
+            st = os.stat(path)
+            stat = (st.st_mtime_ns, st.st_size)
+            self._checked[path] = now
+            if snapshot is None or snapshot.stat != stat:
+                with open(path, encoding="utf-8") as f:
+                    data = freeze(json.load(f))
+                if snapshot is not None:
+                    print(f"Reloaded {filename}")
+                snapshot = _Snapshot(stat, data)
+                self._snapshots[path] = snapshot
+            return snapshot
+
+    def get(self, filename: str) -> Any:
+        """Immutable parsed view of a config file (reloaded when it changes)"""
+        return self._snapshot(filename).data
+
+    def index(self, filename: str, name: str, builder: Callable[[Any], Any]) -> Any:
+        """
+        Derived structure cached with the current version of a file
+        :param filename: Config file the index is built from
+        :param name: Cache key of the index
+        :param builder: Called with the frozen data when the index is missing or stale
+        """
+        snapshot = self._snapshot(filename)
+        built = snapshot.indexes.get(name)
+        if built is None:
+            built = builder(snapshot.data)
+            snapshot.indexes[name] = built
+        return built
+
+    def loaded_at(self, filename: str) -> Optional[float]:
+        snapshot = self._snapshots.get(self._path(filename))
+        return snapshot.loaded_at if snapshot else None
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_registry() -> ConfigRegistry:
+    """The shared registry instance"""
+    global _registry
+    if _registry is None:
+        with _registry_lock:
+            if _registry is None:
+                _registry = ConfigRegistry()
+    return _registry
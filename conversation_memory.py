@@ -0,0 +1,162 @@
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional, Tuple
+
+from config_registry import get_registry
+from prompt_builder import count_tokens
+from term_matcher import TermMatcher
+
+# Locations come from the navigation table; objects and people from the entity lexicon
+TERM_FILES = ("navigation_params.json", "entity_terms.json")
+
+
+class Turn:
+    """One utterance of the conversation and the entities found in it"""
+    __slots__ = ['role', 'text', 'entities', 'timestamp']
+
+    def __init__(self, role: str, text: str, entities: List[Tuple[str, str]], timestamp: float):
+        self.role = role
+        self.text = text
+        self.entities = entities
+        self.timestamp = timestamp
+
+
+class ConversationMemory:
+    """Bounded multi-turn memory of one conversation.
+
+    Keeps the last max_turns turns and a table of the locations, objects and
+    people mentioned, extracted locally with the term matchers. summary()
+    renders the entity table first (most recently mentioned first) and then
+    as many of the newest turns as fit the token budget, so the prompt
+    overhead stays flat however long the session runs.
+    """
+
+    def __init__(self, max_turns: int = 8, max_entities: int = 16, token_budget: int = 160,
+                 max_turn_chars: int = 200):
+        """
+        :param max_turns: Turns kept in the window
+        :param max_entities: Entities kept in the table (least recently mentioned dropped first)
+        :param token_budget: Default token budget of summary()
+        :param max_turn_chars: Longer turns are shortened in the summary
+        """
+        self.turns = deque(maxlen=max_turns)
+        self.entities = OrderedDict()   # (type, std) -> {"type", "std", "surface", "mentions"}
+        self.max_entities = max_entities
+        self.token_budget = token_budget
+        self.max_turn_chars = max_turn_chars
+        self.registry = get_registry()
+        self._lock = threading.Lock()
+
+    def extract(self, text: str) -> List[Tuple[str, str, str]]:
+        """
+        Entities mentioned in text, in order of appearance
+        :return: (type, std, surface) tuples; a location wins over an overlapping object or person
+        """
+        taken = []
+        found = []
+        for filename in TERM_FILES:
+            matcher = self.registry.index(filename, "term_matcher", TermMatcher)
+            for start, end, term in matcher.finditer(text):
+                if any(start < other_end and other_start < end for other_start, other_end in taken):
+                    continue
+                taken.append((start, end))
+                found.append((start, (term["type"], term["std"], text[start:end])))
+        return [entity for _, entity in sorted(found, key=lambda item: item[0])]
+
+    def add(self, role: str, text: str) -> Turn:
+        """
+        Append a turn and update the entity table
+        :param role: "user" or "assistant"
+        :param text: What was said (or, for tasks, the normalized instruction)
+        """
+        entities = self.extract(text)
+        turn = Turn(role, text, [(kind, std) for kind, std, _ in entities], time.time())
+        with self._lock:
+            self.turns.append(turn)
+            for kind, std, surface in entities:
+                key = (kind, std)
+                entry = self.entities.pop(key, None) or {"type": kind, "std": std, "mentions": 0}
+                entry["surface"] = surface
+                entry["mentions"] += 1
+                self.entities[key] = entry
+            while len(self.entities) > self.max_entities:
+                self.entities.popitem(last=False)
+        return turn
+
+    def latest(self, kind: str) -> Optional[Dict]:
+        """Most recently mentioned entity of a type (what "there" or "it" most likely refers to)"""
+        with self._lock:
+            for entry in reversed(self.entities.values()):
+                if entry["type"] == kind:
+                    return dict(entry)
+        return None
+
+    def summary(self, token_budget: Optional[int] = None) -> str:
+        """
+        Compact memory for a prompt: entity table, then the newest turns that fit the budget
+        :param token_budget: Tokens allowed (the memory's default when None)
+        :return: Empty string when nothing has been said yet
+        """
+        budget = self.token_budget if token_budget is None else token_budget
+        with self._lock:
+            entities = list(reversed(self.entities.values()))
+            turns = list(self.turns)
+        if not entities and not turns:
+            return ""
+
+        lines = []
+        if entities:
+            by_type = OrderedDict()
+            for entry in entities:
+                by_type.setdefault(entry["type"], []).append(
+                    entry["std"] if entry["surface"].casefold() == entry["std"].replace("_", " ").casefold()
+                    else f"{entry['std']} ({entry['surface']})")
+            line = "Entities (latest first): " + "; ".join(f"{kind}: {', '.join(names)}"
+                                                          for kind, names in by_type.items())
+            if count_tokens(line) <= budget:
+                lines.append(line)
+        used = sum(count_tokens(line) for line in lines)
+
+        recent = []
+        for turn in reversed(turns):
+            text = turn.text.strip()
+            text = text if len(text) <= self.max_turn_chars else text[:self.max_turn_chars] + "..."
+            line = f"{turn.role}: {text}"
+            cost = count_tokens(line)
+            if used + cost > budget:
+                break
+            recent.append(line)
+            used += cost
+        if recent:
+            lines.append("Recent turns (oldest first):")
+            lines.extend(reversed(recent))
+        return "\n".join(lines)
+
+    def clear(self):
+        with self._lock:
+            self.turns.clear()
+            self.entities.clear()
+
+
+_memories = {}
+_memories_lock = threading.Lock()
+
+
+def get_memory(session_id: str = "default", **options) -> ConversationMemory:
+    """
+    Memory of one conversation session, created on first use
+    :param options: ConversationMemory settings, only applied when the memory is created
+    """
+    with _memories_lock:
+        memory = _memories.get(session_id)
+        if memory is None:
+            memory = ConversationMemory(**options)
+            _memories[session_id] = memory
+        return memory
+
+
+def end_session(session_id: str = "default"):
+    """Forget a session"""
+    with _memories_lock:
+        _memories.pop(session_id, None)
@@ -1,18 +1,60 @@
-from openai import OpenAI
+from intent_classifier import get_classifier, log_example
+from llm_gateway import get_gateway
 import re
 import time
 
 class Boss:
     # Initialization module
-    def __init__(self, api_key: str, model: str ):   
+    def __init__(self, api_key: str, model: str, classifier=None, threshold: float = 0.9):
+        """
+        :param classifier: Local intent classifier (the shared one when None)
+        :param threshold: Confidence below which the large model decides instead
+        """
         self.model = model  # Model
-        self.client = OpenAI(api_key=api_key, base_url="https://api.chatanywhere.tech/v1")
-        
+        self.client = get_gateway(api_key, "https://api.chatanywhere.tech/v1")
+        self.classifier = classifier if classifier is not None else get_classifier()  # Loaded once at startup
+        self.threshold = threshold
+
     def determine_task_type(self, user_input):
         """
-        Call the large model to determine the task type
+        Determine the task type locally, asking the large model only when unsure
+        Return: "dialogue" or "task"
+        """
+        label, confidence = self.classifier.predict(user_input)
+        if confidence >= self.threshold:
+            return label
+
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=self._messages(user_input),
+                temperature=0.3
+            )
+            return self._decide(user_input, response)
+        except Exception as e:
+            print(f"Large model call error: {e}, using local guess {label} ({confidence:.2f})")
+            return label
+
+    async def determine_task_type_async(self, user_input):
+        """
+        determine_task_type on the asyncio gateway; cancelling the caller aborts the request
         Return: "dialogue" or "task"
         """
+        label, confidence = self.classifier.predict(user_input)
+        if confidence >= self.threshold:
+            return label
+        try:
+            response = await self.client.achat.completions.create(
+                model=self.model,
+                messages=self._messages(user_input),
+                temperature=0.3
+            )
+            return self._decide(user_input, response)
+        except Exception as e:  # CancelledError is not an Exception and still propagates
+            print(f"Large model call error: {e}, using local guess {label} ({confidence:.2f})")
+            return label
+
+    def _messages(self, user_input):
         sys_prompt = f"""You are an expert in semantic scene judgment,
         Please determine whether the following user input is intended for general conversation with the robot or requires the robot to assist the user in performing a specific task.
         User input: {user_input}
@@ -21,20 +63,15 @@ class Boss:
         - If it is general conversation or question answering, return "dialogue"
         - If it requires the execution of a specific operation or task, return "task"
         """
-        
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": sys_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                temperature=0.3
-            )
-            decision = response.choices[0].message.content.lower().strip()
-            cleaned_response = re.sub(r'<think>.*?</think>', '', decision, flags=re.DOTALL)
-            decision = cleaned_response.strip()
-            return "task" if "task" in decision else "dialogue"
-        except Exception as e:
-            print(f"Large model call error: {e}")
-            return "dialogue"  # Default to dialogue mode
+        return [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": user_input}
+        ]
+
+    def _decide(self, user_input, response):
+        decision = response.choices[0].message.content.lower().strip()
+        cleaned_response = re.sub(r'<think>.*?</think>', '', decision, flags=re.DOTALL)
+        decision = cleaned_response.strip()
+        decision = "task" if "task" in decision else "dialogue"
+        log_example(user_input, decision)  # Training data for the next retrain
+        return decision
@@ -1,35 +1,67 @@
-from openai import OpenAI
+from conversation_memory import get_memory
+from llm_gateway import get_gateway
+from speech_stream import SentenceSplitter, ThinkFilter, stream_sentences
 import re
 import time
 
+# Dialogue role setting
+DIALOGUE_PROMPT = """
+        You are now a knowledgeable and skilled conversationalist with the following characteristics:
+        1. Broad knowledge base, capable of answering a variety of academic, technological, and cultural questions
+        2. Friendly and natural language style, occasionally incorporating appropriate humor
+        3. Concise and to the point, keeping responses within 3-5 sentences
+        4. Honest about uncertainty, not fabricating answers for unknown questions
+        5. Context continuity: Use the conversation memory given with the message (entities and recent turns) to resolve references
+        """
+
 class Boss:
     # Initialization module
-    def __init__(self, api_key: str, model: str ):   
+    def __init__(self, api_key: str, model: str, memory=None):
+        """
+        :param memory: ConversationMemory for context continuity (the default session when None)
+        """
         self.model = model  # Model
-        self.client = OpenAI(api_key=api_key, base_url="https://api.chatanywhere.tech/v1")
-    def dialogue_mode(self, text):
+        self.client = get_gateway(api_key, "https://api.chatanywhere.tech/v1")
+        self.memory = memory if memory is not None else get_memory()
+
+    def _user_message(self, text):
+        """The message prefixed with the token-budgeted memory summary"""
+        memory = self.memory.summary()
+        return f"**Conversation Memory**:\n{memory}\n\n**Message**: {text}" if memory else text
+
+    def _messages(self, text):
+        return [
+            {"role": "system", "content": DIALOGUE_PROMPT},
+            {"role": "user", "content": self._user_message(text)}
+        ]
+
+    def dialogue_mode(self, text, remember=True):
         """
         Large model configuration
+        :param remember: Add the message and the reply to the conversation memory
         """
         print("Dialogue--->\n")
-        # Dialogue role setting
-        sys_prompt = """
-        You are now a knowledgeable and skilled conversationalist with the following characteristics:
-        1. Broad knowledge base, capable of answering a variety of academic, technological, and cultural questions
-        2. Friendly and natural language style, occasionally incorporating appropriate humor
-        3. Concise and to the point, keeping responses within 3-5 sentences
-        4. Honest about uncertainty, not fabricating answers for unknown questions
-        5. Context continuity: Remember keywords from the last 3 rounds of conversation (automatically extract entity nouns)
-        """            
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": text}
-            ],
+            messages=self._messages(text),
             temperature=0.3
         )
-        saytext = response.choices[0].message.content
+        return self._finish(text, response.choices[0].message.content, remember)
+
+    async def dialogue_mode_async(self, text, remember=True):
+        """
+        dialogue_mode on the asyncio gateway; cancelling the caller aborts the request
+        :param remember: Add the message and the reply to the conversation memory
+        """
+        print("Dialogue--->\n")
+        response = await self.client.achat.completions.create(
+            model=self.model,
+            messages=self._messages(text),
+            temperature=0.3
+        )
+        return self._finish(text, response.choices[0].message.content, remember)
+
+    def _finish(self, text, saytext, remember):
         cleaned_response = re.sub(r'<think>.*?</think>', '', saytext, flags=re.DOTALL)
         saytext = cleaned_response.strip()
         chat_data = {
@@ -38,3 +70,63 @@ class Boss:
                 "response": saytext
             }
         }   
+        if remember:
+            self.memory.add("user", text)
+            self.memory.add("assistant", saytext)
+        return chat_data
+
+    def dialogue_stream(self, text, remember=True):
+        """
+        Streamed dialogue: yields each sentence of the answer as soon as it is complete,
+        with <think> blocks filtered out incrementally, so speech can start early
+        :param remember: Add the message and the full reply to the conversation memory
+        """
+        print("Dialogue (streaming)--->\n")
+        started = time.perf_counter()
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(text),
+            temperature=0.3,
+            stream=True
+        )
+        deltas = (chunk.choices[0].delta.content or "" for chunk in stream if chunk.choices)
+        spoken = []
+        for sentence in stream_sentences(deltas):
+            if not spoken:
+                print(f"First sentence after {(time.perf_counter() - started) * 1000:.0f} ms")
+            spoken.append(sentence)
+            yield sentence
+        if remember:
+            self.memory.add("user", text)
+            self.memory.add("assistant", " ".join(spoken))
+
+    async def dialogue_stream_async(self, text, remember=True):
+        """
+        Async dialogue_stream: an async iterator of sentences
+        :param remember: Add the message and the full reply to the conversation memory
+        """
+        print("Dialogue (streaming)--->\n")
+        started = time.perf_counter()
+        stream = await self.client.achat.completions.create(
+            model=self.model,
+            messages=self._messages(text),
+            temperature=0.3,
+            stream=True
+        )
+        think = ThinkFilter()
+        splitter = SentenceSplitter()
+        spoken = []
+        async for chunk in stream:
+            if not chunk.choices:
+                continue
+            for sentence in splitter.feed(think.feed(chunk.choices[0].delta.content or "")):
+                if not spoken:
+                    print(f"First sentence after {(time.perf_counter() - started) * 1000:.0f} ms")
+                spoken.append(sentence)
+                yield sentence
+        for sentence in splitter.feed(think.flush()) + splitter.flush():
+            spoken.append(sentence)
+            yield sentence
+        if remember:
+            self.memory.add("user", text)
+            self.memory.add("assistant", " ".join(spoken))
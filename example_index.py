@@ -0,0 +1,72 @@
+import re
+from typing import List, Tuple
+
+import numpy as np
+
+
+class ExampleIndex:
+    """Character n-gram TF-IDF index over demonstration task names.
+
+    The vocabulary and the L2-normalised document matrix are built once, so
+    a query costs one sparse-to-dense vectorisation and a matrix-vector
+    product. Results are deterministic for a given demonstration set.
+    """
+
+    def __init__(self, keys: List[str], ngram_range: Tuple[int, int] = (2, 4)):
+        """
+        :param keys: Demonstration task names to index
+        :param ngram_range: Smallest and largest character n-gram length
+        """
+        self.keys = list(keys)
+        self.ngram_range = ngram_range
+        self.vocabulary = {}
+        docs = [self._ngrams(key) for key in self.keys]
+        for grams in docs:
+            for gram in grams:
+                if gram not in self.vocabulary:
+                    self.vocabulary[gram] = len(self.vocabulary)
+
+        counts = np.zeros((len(self.keys), len(self.vocabulary)), dtype=np.float32)
+        for row, grams in enumerate(docs):
+            for gram in grams:
+                counts[row, self.vocabulary[gram]] += 1.0
+        doc_freq = np.count_nonzero(counts, axis=0)
+        # Smoothed IDF, as in the usual TF-IDF formulation
+        self.idf = (np.log((1.0 + len(self.keys)) / (1.0 + doc_freq)) + 1.0).astype(np.float32)
+        self.matrix = self._normalize(np.log1p(counts) * self.idf)
+
+    def _ngrams(self, text: str) -> List[str]:
+        text = " " + re.sub(r'\s+', ' ', text.lower()).strip() + " "
+        low, high = self.ngram_range
+        return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+    @staticmethod
+    def _normalize(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return matrix / norms
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """TF-IDF vector of a query; n-grams unseen in the index are ignored"""
+        vector = np.zeros(len(self.vocabulary), dtype=np.float32)
+        for gram in self._ngrams(text):
+            col = self.vocabulary.get(gram)
+            if col is not None:
+                vector[col] += 1.0
+        return self._normalize(np.log1p(vector) * self.idf)
+
+    def search(self, query: str, k: int = 1) -> List[Tuple[str, float]]:
+        """
+        Top-k cosine search
+        :param query: Natural language instruction
+        :param k: Number of results
+        :return: (task name, cosine similarity) pairs, best first
+        """
+        if not self.keys:
+            return []
+        scores = self.matrix @ self.vectorize(query)
+        k = min(k, len(self.keys))
+        top = np.argpartition(-scores, k - 1)[:k]
+        # Stable order: score descending, then insertion order
+        top = sorted(top, key=lambda i: (-scores[i], i))
+        return [(self.keys[i], float(scores[i])) for i in top]
@@ -0,0 +1,215 @@
+import math
+import re
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config_registry import get_registry
+from term_matcher import TermMatcher
+
+_NUMBER_WORDS = {
+    "half": 0.5, "a": 1.0, "one": 1.0, "two": 2.0, "three": 3.0, "four": 4.0, "five": 5.0,
+    "six": 6.0, "seven": 7.0, "eight": 8.0, "nine": 9.0, "ten": 10.0,
+}
+_CN_DIGITS = {"零": 0, "一": 1, "二": 2, "两": 2, "三": 3, "四": 4, "五": 5,
+              "六": 6, "七": 7, "八": 8, "九": 9}
+
+NUM = r"(\d+(?:\.\d+)?|half|a|one|two|three|four|five|six|seven|eight|nine|ten)"
+CN_NUM = r"(\d+(?:\.\d+)?|半|[零一二两三四五六七八九十]+)"
+METERS = r"(?:meters?|metres?|m)"
+# Longer moves and turns are unusual enough to leave to the LLM (and its clarifications)
+MAX_DISTANCE = 10.0
+MAX_DEGREES = 360.0
+
+COLORS = {"red": "red", "green": "green", "blue": "blue", "yellow": "yellow", "white": "white",
+          "红": "red", "绿": "green", "蓝": "blue", "黄": "yellow", "白": "white"}
+GESTURES = {"wave": "wave", "bow": "bow", "reset": "reset",
+            "挥手": "wave", "挥挥手": "wave", "招手": "wave", "鞠躬": "bow", "复位": "reset"}
+
+# Politeness and filler that never change the command
+_PREFIX = re.compile(r"^(?:(?:hey |ok |okay )?pepper[, ]+|please |can you |could you |would you |请|麻烦你?|帮我)+")
+_SUFFIX = re.compile(r"(?: please| now|吧|一下)+$")
+_TRAILING = re.compile(r"[\s.!?。！？,，~]+$")
+
+
+def _number(token: Optional[str], default: float = 1.0) -> float:
+    """English/Chinese number word or digits as a float"""
+    if not token:
+        return default
+    if token in _NUMBER_WORDS:
+        return _NUMBER_WORDS[token]
+    if token == "半":
+        return 0.5
+    if token[0] in _CN_DIGITS or token[0] == "十":
+        # 十 -> 10, 十二 -> 12, 二十 -> 20, 二十五 -> 25
+        if "十" in token:
+            tens, _, ones = token.partition("十")
+            return float(_CN_DIGITS.get(tens, 1) * 10 + _CN_DIGITS.get(ones, 0))
+        if len(token) == 1:
+            return float(_CN_DIGITS[token])
+        raise ValueError(f"Unsupported number: {token}")
+    return float(token)
+
+
+class FastPathParser:
+    """Deterministic parser for the simple command forms.
+
+    Every rule must consume the whole (normalized) utterance, so anything
+    with extra clauses, references to earlier turns or unknown places returns
+    None and goes to the LLM. Output matches the adapter's JSON format:
+    {"action": ..., "params": {...}}.
+    """
+
+    def __init__(self, registry=None):
+        """
+        :param registry: Config registry providing navigation_params.json (shared one by default)
+        """
+        self.registry = registry if registry is not None else get_registry()
+        self.stats = {"hits": 0, "misses": 0, "by_action": {}}
+        self._rules: List[Tuple[re.Pattern, Callable]] = [
+            # Movement
+            (re.compile(rf"(move|walk|go|step) (forwards?|ahead|backwards?|back|left|right)(?: {NUM} ?{METERS})?"),
+             lambda m: self._move(m.group(1), m.group(2), m.group(3))),
+            (re.compile(rf"(move|walk|go|step) {NUM} ?{METERS} (forwards?|ahead|backwards?|back|left|right)"),
+             lambda m: self._move(m.group(1), m.group(3), m.group(2))),
+            (re.compile(rf"turn (left|right|around)(?: (?:by )?(\d+(?:\.\d+)?) ?degrees?)?"),
+             lambda m: self._turn(m.group(1), m.group(2))),
+            (re.compile(rf"(前进|后退)(?:{CN_NUM}米)?"),
+             lambda m: self._move("", "forward" if m.group(1) == "前进" else "backward", m.group(2))),
+            (re.compile(rf"[向往](前|后|左|右)(?:走|移动|移)(?:{CN_NUM}米)?"),
+             lambda m: self._move("", {"前": "forward", "后": "backward", "左": "left", "右": "right"}[m.group(1)],
+                                  m.group(2))),
+            (re.compile(r"(?:向)?(左|右|后)转(?:(\d+(?:\.\d+)?)度)?|(转身)"),
+             lambda m: self._turn({"左": "left", "右": "right", "后": "around"}.get(m.group(1), "around"),
+                                  m.group(2))),
+            # Volume
+            (re.compile(r"(?:(?:set|turn|increase|raise|lower|decrease|change) )?(?:the )?volume"
+                        r"(?: up| down)? (?:to )?(?:the )?(max|maximum|full|min|minimum|\d+(?:\.\d+)?) ?(%|percent)?"),
+             lambda m: self._volume(m.group(1), m.group(2))),
+            (re.compile(r"mute"), lambda m: {"action": "set_volume", "params": {"level": 0.0}}),
+            (re.compile(r"(?:把)?音量(?:调到|调至|调成|设为|设置为|到)(最大|最小|百分之(\d+|[零一二两三四五六七八九十]+)|(\d+)%)"),
+             lambda m: self._volume({"最大": "max", "最小": "min"}.get(m.group(1), m.group(2) or m.group(3)),
+                                    "%")),
+            (re.compile(r"静音"), lambda m: {"action": "set_volume", "params": {"level": 0.0}}),
+            # Lighting
+            (re.compile(r"(?:(?:light up|turn on|switch (?:on|to)|set|change to|use) )?(?:the )?"
+                        r"(red|green|blue|yellow|white) (?:lights?|leds?|lighting)"),
+             lambda m: self._led(m.group(1))),
+            (re.compile(r"(?:set|change|switch|turn) (?:the )?(?:lights?|leds?) (?:to )?(red|green|blue|yellow|white)"),
+             lambda m: self._led(m.group(1))),
+            (re.compile(r"(?:打开|亮|开|点亮|切换到|换成)?(红|绿|蓝|黄|白)(?:色)?(?:的)?(?:灯光|灯)"),
+             lambda m: self._led(m.group(1))),
+            # Gestures
+            (re.compile(r"(wave|bow|reset)(?: (?:your |a )?(?:hands?|posture|pose))?"),
+             lambda m: self._gesture(m.group(1))),
+            (re.compile(r"(挥挥手|挥手|招手|鞠躬|复位)"), lambda m: self._gesture(m.group(1))),
+            # Exploration
+            (re.compile(rf"explore(?: (?:the )?(?:area|surroundings|around))?(?: within {NUM} ?{METERS})?"),
+             lambda m: {"action": "explore", "params": {"radius": _number(m.group(1), 2.0)}}),
+            (re.compile(r"探索(?:一下)?(?:周围|四周)?"),
+             lambda m: {"action": "explore", "params": {"radius": 2.0}}),
+            # Navigation to a known place
+            (re.compile(r"(?:take me|bring me|lead me|guide me|go|navigate|walk|head|directions) to (?:the )?(.+)"),
+             lambda m: self._navigate(m.group(1))),
+            (re.compile(r"(?:带我去|带我到|导航到|导航去|前往|去|到)(.+)"),
+             lambda m: self._navigate(m.group(1))),
+        ]
+
+    @property
+    def term_matcher(self) -> TermMatcher:
+        return self.registry.index("navigation_params.json", "term_matcher", TermMatcher)
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        """Lowercase, collapse spaces and strip filler words and trailing punctuation"""
+        text = " ".join(text.strip().lower().split())
+        text = _TRAILING.sub("", text)
+        text = _PREFIX.sub("", text)
+        text = _SUFFIX.sub("", text)
+        return _TRAILING.sub("", text)
+
+    def parse(self, text: str) -> Optional[Dict]:
+        """
+        Parse a simple command without the LLM
+        :param text: User utterance
+        :return: Command dict, or None when the utterance is not a high-confidence match
+        """
+        normalized = self.normalize(text)
+        command = None
+        for pattern, build in self._rules:
+            match = pattern.fullmatch(normalized)
+            if match is None:
+                continue
+            try:
+                command = build(match)
+            except (ValueError, KeyError):
+                command = None
+            break
+        if command is None:
+            self.stats["misses"] += 1
+            return None
+        self.stats["hits"] += 1
+        by_action = self.stats["by_action"]
+        by_action[command["action"]] = by_action.get(command["action"], 0) + 1
+        return command
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+    @staticmethod
+    def _move(verb: str, direction: str, distance: Optional[str]) -> Optional[Dict]:
+        if verb == "go" and direction in ("back", "ahead") and distance is None:
+            # "go back" usually means returning to an earlier place, "go ahead" is consent
+            return None
+        value = _number(distance)
+        if not 0.0 < value <= MAX_DISTANCE:
+            return None
+        x = y = 0.0
+        if direction in ("forward", "forwards", "ahead"):
+            x = value
+        elif direction in ("backward", "backwards", "back"):
+            x = -value
+        elif direction == "left":
+            y = value
+        else:
+            y = -value
+        return {"action": "move", "params": {"x": x, "y": y, "theta": 0.0}}
+
+    @staticmethod
+    def _turn(direction: str, degrees: Optional[str]) -> Optional[Dict]:
+        angle = float(degrees) if degrees else (180.0 if direction == "around" else 90.0)
+        if not 0.0 < angle <= MAX_DEGREES:
+            return None
+        theta = math.radians(angle)
+        if direction == "right":
+            theta = -theta
+        return {"action": "move", "params": {"x": 0.0, "y": 0.0, "theta": round(theta, 4)}}
+
+    @staticmethod
+    def _volume(value: str, unit: Optional[str]) -> Dict:
+        if value in ("max", "maximum", "full"):
+            level = 1.0
+        elif value in ("min", "minimum"):
+            level = 0.0
+        else:
+            level = _number(value)
+            if unit or level > 1.0:
+                level /= 100.0
+        if not 0.0 <= level <= 1.0:
+            raise ValueError(f"Volume out of range: {value}")
+        return {"action": "set_volume", "params": {"level": level}}
+
+    @staticmethod
+    def _led(color: str) -> Dict:
+        return {"action": "set_led", "params": {"color": COLORS[color]}}
+
+    @staticmethod
+    def _gesture(name: str) -> Dict:
+        return {"action": "perform_gesture", "params": {"name": GESTURES[name]}}
+
+    def _navigate(self, place: str) -> Optional[Dict]:
+        place = place.strip()
+        term = self.term_matcher.lookup(place)
+        if term is None or term["type"] != "location":
+            return None
+        # The place as the user said it, like the LLM does; the controller resolves it
+        return {"action": "navigate", "params": {"location": place}}
@@ -0,0 +1,322 @@
+"""Local dialogue/task intent classifier.
+
+Logistic regression over character n-grams in NumPy. Trained from the
+demonstration file, the command examples of the adapter prompt, the
+location terms of navigation_params.json, built-in conversation seeds and
+logged traffic (LLM decisions appended to intent_log.jsonl, compacted once
+it grows past LOG_MAX_BYTES), then saved so later processes only load it.
+
+    python intent_classifier.py train
+    python intent_classifier.py report --folds 5
+"""
+import argparse
+import json
+import os
+import random
+import re
+import sys
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from config_registry import BASE_DIR, get_registry
+
+LABELS = ["dialogue", "task"]
+MODEL_PATH = os.path.join(BASE_DIR, "intent_model.npz")
+LOG_PATH = os.path.join(BASE_DIR, "intent_log.jsonl")
+# Above this size the log is compacted: one entry per utterance, newest kept
+LOG_MAX_BYTES = 512 * 1024
+
+# Usual variants of the command forms; the forms spelled out in the adapter
+# prompt itself come from adapter.ACTION_RULES (see adapter_examples)
+TASK_SEEDS = [
+    "Walk 2 meters to the left", "Turn left", "Turn around", "Go to the reception", "Directions to the restroom",
+    "Explore the area", "Check the surroundings", "Decrease the volume",
+    "Set the volume to 50%", "Mute", "Turn off the lights", "Switch to blue light",
+    "Wave your hand", "Bow", "Reset your posture", "Bring me a cup of water", "Open the door",
+    "Follow me", "Pick up the box", "Clean the table", "Go to the charging station", "Stop",
+    "前进两米", "向左转", "带我去会议室", "去洗手间", "把音量调到最大", "打开红灯", "挥手", "鞠躬", "探索周围",
+    "带我去食堂", "帮我拿一杯水", "关灯", "停下", "跟我来",
+    # Short imperatives, so that brevity alone does not read as small talk
+    "Turn right", "Step back", "Go left", "Come here", "Sit down", "Stand up", "Stop moving", "Look at me",
+    "Raise your arm", "Dance", "Wave goodbye", "Take a bow", "Explore", "Scan the room", "Louder", "Quieter",
+    "Lights off", "Blue light", "Volume up", "Charge yourself", "Close the door", "Follow that person",
+    "前进三米", "后退一米", "向右转", "转身", "往前走", "往左走", "音量调小", "静音", "打开蓝灯", "关掉灯光",
+    "挥挥手", "招手", "复位", "探索一下", "停止", "别动", "过来", "跟着我", "拿一瓶水给我", "开门", "关门",
+    "坐下", "站起来", "看着我", "举起手", "跳个舞",
+]
+
+DIALOGUE_SEEDS = [
+    "Hello", "Hi there", "Good morning", "How are you", "How are you doing today", "What's your name",
+    "Who are you", "Nice to meet you", "Thank you", "Thanks a lot", "Goodbye", "See you later",
+    "What is the weather like today", "Tell me a joke", "Tell me a story", "What time is it",
+    "What is the capital of France", "Who wrote Hamlet", "What is artificial intelligence",
+    "Explain how a rainbow forms", "Why is the sky blue", "What do you like to do",
+    "Do you have feelings", "Are you a robot", "What can you do", "How old are you",
+    "What is the meaning of life", "Can you recommend a good book", "What's your favorite color",
+    "I feel tired today", "I'm bored", "That's interesting", "Really?", "I don't know how to operate",
+    "What is quantum computing", "How does photosynthesis work", "Who invented the telephone",
+    "What is 2 plus 2", "Do you like music", "What's new", "Are you happy", "Tell me about yourself",
+    "你好", "早上好", "你叫什么名字", "你是谁", "谢谢", "再见", "今天天气怎么样", "讲个笑话", "现在几点了",
+    "你会做什么", "你今年几岁", "人工智能是什么", "为什么天空是蓝色的", "给我讲个故事", "你喜欢音乐吗",
+    "我今天很累", "你开心吗", "法国的首都是哪里",
+    # Greetings, thanks and small talk that share words with commands
+    "Hey", "Hello Pepper", "Hi Pepper, nice to see you", "Good afternoon", "Good evening", "Good night",
+    "Nice to meet you too", "Pleased to meet you", "Thanks", "Thank you very much", "Thanks for your help",
+    "You're welcome", "Bye", "Bye bye", "See you tomorrow", "Have a nice day", "Sorry", "Excuse me",
+    "Okay", "Cool", "Great", "Wow", "No problem", "Really", "I see", "Me too", "I'm bored right now",
+    "I'm happy today", "I'm hungry", "I'm not feeling well", "I miss my family", "I had a long day",
+    "How does a computer work", "How do airplanes fly", "Explain gravity to me", "Explain what DNA is",
+    "What is the tallest mountain", "How far is the moon", "Who painted the Mona Lisa",
+    "Can you tell me something interesting", "What do you think about robots", "Do you dream",
+    "What's your favorite movie", "Where do you come from", "Who made you", "Can you sing",
+    "I don't understand", "I don't know what to do", "What does that mean",
+    "你好呀", "下午好", "晚上好", "晚安", "很高兴认识你", "非常感谢", "谢谢你的帮助", "不客气", "拜拜",
+    "明天见", "对不起", "好的", "真的吗", "我好无聊", "我饿了", "我今天很开心", "月亮有多远",
+    "飞机是怎么飞的", "谁发明了电话", "你是从哪里来的", "你会唱歌吗", "你觉得机器人怎么样",
+]
+
+
+# Navigation phrasings filled with every location name and alias from navigation_params.json
+NAVIGATION_TEMPLATES = ["Take me to the {}", "Go to the {}", "Guide me to the {}", "Walk to the {}"]
+NAVIGATION_TEMPLATES_CN = ["带我去{}", "去{}", "到{}去"]
+_CN = re.compile(r"[\u4e00-\u9fff]")
+# `instruction` followed by an arrow, or after "User Instruction:"
+_PROMPT_EXAMPLE = re.compile(r"User Instruction: `([^`]+)`|`([^`{]+)` → `{")
+
+
+def _ngrams(text: str, low: int = 1, high: int = 4) -> List[str]:
+    text = " " + re.sub(r"\s+", " ", text.lower()).strip() + " "
+    return [text[i:i + n] for n in range(low, high + 1) for i in range(len(text) - n + 1)]
+
+
+def adapter_examples() -> List[str]:
+    """User instructions quoted in the adapter prompt's per-action rules, in order"""
+    from adapter import ACTION_RULES   # Deferred: the adapter pulls in the LLM client
+    examples = []
+    for rules in ACTION_RULES.values():
+        for text in rules:
+            for match in _PROMPT_EXAMPLE.finditer(text or ""):
+                example = match.group(1) or match.group(2)
+                if example not in examples:
+                    examples.append(example)
+    return examples
+
+
+def training_data(log_path: Optional[str] = LOG_PATH) -> List[Tuple[str, str]]:
+    """(text, label) pairs from the seeds, the location terms, the demonstrations and the traffic log"""
+    data = [(text, "task") for text in adapter_examples() + TASK_SEEDS]
+    data += [(text, "dialogue") for text in DIALOGUE_SEEDS]
+    demonstrations = get_registry().get("available_examples_short.json")
+    for term in get_registry().get("navigation_params.json"):
+        if term.get("type") != "location":
+            continue
+        for name in (term["pattern"], *term.get("aliases", [])):
+            templates = NAVIGATION_TEMPLATES_CN if _CN.search(name) else NAVIGATION_TEMPLATES
+            data.extend((template.format(name), "task") for template in templates)
+    seen = set()
+    for name, steps in demonstrations.items():
+        for text in (name, *steps):
+            if text not in seen:
+                seen.add(text)
+                data.append((text, "task"))
+    if log_path and os.path.exists(log_path):
+        logged = {}
+        with open(log_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    continue
+                if entry.get("label") in LABELS and isinstance(entry.get("text"), str):
+                    logged[entry["text"]] = entry["label"]
+        # Each utterance counts once, with its latest label
+        data.extend(logged.items())
+    return data
+
+
+_log_lock = threading.Lock()
+
+
+def log_example(text: str, label: str, path: str = LOG_PATH, max_bytes: int = LOG_MAX_BYTES):
+    """
+    Append a labelled utterance (e.g. an LLM decision) to the traffic log used for retraining
+    :param max_bytes: Size above which the log is compacted to about half of it
+    """
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"text": text, "label": label}, ensure_ascii=False) + "\n")
+        if os.path.getsize(path) > max_bytes:
+            _compact_log(path, max_bytes // 2)
+
+
+def _compact_log(path: str, max_bytes: int):
+    """Rewrite the log with the latest label per utterance, dropping the oldest beyond max_bytes"""
+    latest = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(entry, dict) and isinstance(entry.get("text"), str):
+                latest.pop(entry["text"], None)   # Re-insert so the order follows the latest entry
+                latest[entry["text"]] = line if line.endswith("\n") else line + "\n"
+    kept = []
+    size = 0
+    for line in reversed(list(latest.values())):
+        size += len(line.encode("utf-8"))
+        if size > max_bytes:
+            break
+        kept.append(line)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        f.writelines(reversed(kept))
+    os.replace(path + ".tmp", path)
+
+
+class IntentClassifier:
+    """L2-regularised logistic regression over character 1-4-gram presence.
+
+    Predicting sums the weights of the n-grams present and applies a
+    sigmoid, so a query costs one dictionary lookup per n-gram. Classes are
+    weighted to balance the (task-heavy) training data.
+    """
+
+    def __init__(self, vocabulary: Dict[str, int], weights: np.ndarray, bias: float):
+        """
+        :param vocabulary: n-gram -> weight index
+        :param weights: Per n-gram weight towards "task"
+        :param bias: Intercept
+        """
+        self.vocabulary = vocabulary
+        self.weights = weights
+        self.bias = bias
+
+    @classmethod
+    def train(cls, data: List[Tuple[str, str]], l2: float = 1e-3, epochs: int = 300,
+              learning_rate: float = 0.5) -> "IntentClassifier":
+        """
+        :param data: (text, label) pairs with labels from LABELS
+        :param l2: Weight decay
+        :param epochs: Full-batch gradient steps
+        :param learning_rate: Step size
+        """
+        vocabulary = {}
+        rows = []
+        for text, _ in data:
+            cols = set()
+            for gram in _ngrams(text):
+                col = vocabulary.get(gram)
+                if col is None:
+                    col = vocabulary[gram] = len(vocabulary)
+                cols.add(col)
+            rows.append(sorted(cols))
+        x = np.zeros((len(data), len(vocabulary)), dtype=np.float32)
+        for i, cols in enumerate(rows):
+            x[i, cols] = 1.0
+        y = np.array([LABELS.index(label) for _, label in data], dtype=np.float32)
+        positives = max(float(y.sum()), 1.0)
+        negatives = max(float(len(y) - y.sum()), 1.0)
+        sample_weight = np.where(y == 1, len(y) / (2 * positives), len(y) / (2 * negatives)).astype(np.float32)
+
+        weights = np.zeros(len(vocabulary), dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            p = 1.0 / (1.0 + np.exp(-(x @ weights + bias)))
+            error = (p - y) * sample_weight / len(y)
+            weights -= learning_rate * (x.T @ error + l2 * weights)
+            bias -= learning_rate * float(error.sum())
+        return cls(vocabulary, weights, bias)
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """
+        :return: (label, probability of that label)
+        """
+        cols = {self.vocabulary.get(gram) for gram in _ngrams(text)}
+        cols.discard(None)
+        z = self.bias + float(self.weights[list(cols)].sum())
+        p_task = float(1.0 / (1.0 + np.exp(-z)))
+        return ("task", p_task) if p_task >= 0.5 else ("dialogue", 1.0 - p_task)
+
+    def save(self, path: str = MODEL_PATH):
+        grams = sorted(self.vocabulary, key=self.vocabulary.get)
+        np.savez_compressed(path, grams=np.array(grams, dtype=str), weights=self.weights,
+                            bias=np.array([self.bias]))
+
+    @classmethod
+    def load(cls, path: str = MODEL_PATH) -> "IntentClassifier":
+        with np.load(path) as data:
+            vocabulary = {gram: i for i, gram in enumerate(data["grams"].tolist())}
+            return cls(vocabulary, data["weights"], float(data["bias"][0]))
+
+
+def confusion_report(data: List[Tuple[str, str]], folds: int = 5, seed: int = 0) -> Dict:
+    """
+    Cross-validated confusion matrix
+    :return: {"matrix": rows = true label, columns = predicted label, "labels", "accuracy"}
+    """
+    shuffled = list(data)
+    random.Random(seed).shuffle(shuffled)
+    matrix = np.zeros((len(LABELS), len(LABELS)), dtype=int)
+    for fold in range(folds):
+        test = shuffled[fold::folds]
+        train = [item for i, item in enumerate(shuffled) if i % folds != fold]
+        model = IntentClassifier.train(train)
+        for text, label in test:
+            predicted, _ = model.predict(text)
+            matrix[LABELS.index(label), LABELS.index(predicted)] += 1
+    return {"labels": LABELS, "matrix": matrix.tolist(),
+            "accuracy": float(np.trace(matrix) / max(matrix.sum(), 1))}
+
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+
+def get_classifier(path: str = MODEL_PATH) -> IntentClassifier:
+    """Process-wide classifier: loaded from disk, or trained and saved on first use"""
+    global _classifier
+    if _classifier is None:
+        with _classifier_lock:
+            if _classifier is None:
+                if os.path.exists(path):
+                    try:
+                        _classifier = IntentClassifier.load(path)
+                    except ValueError as e:
+                        # e.g. a model saved with a pickled vocabulary by an older version
+                        print(f"Intent model {path} unusable ({e}), retraining")
+                if _classifier is None:
+                    _classifier = IntentClassifier.train(training_data())
+                    _classifier.save(path)
+    return _classifier
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Train or evaluate the local intent classifier")
+    sub = parser.add_subparsers(dest="command", required=True)
+    train = sub.add_parser("train", help="Retrain from all sources and save the model")
+    train.add_argument("--log", default=LOG_PATH, help="Traffic log of labelled utterances")
+    train.add_argument("--output", default=MODEL_PATH)
+    report = sub.add_parser("report", help="Cross-validated confusion matrix")
+    report.add_argument("--log", default=LOG_PATH)
+    report.add_argument("--folds", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    data = training_data(args.log)
+    if args.command == "train":
+        IntentClassifier.train(data).save(args.output)
+        print(f"Trained on {len(data)} utterances, model written to {args.output}")
+        return 0
+
+    result = confusion_report(data, args.folds)
+    width = max(len(label) for label in LABELS) + 2
+    print(" " * width + "".join(f"{label:>{width}}" for label in LABELS) + "   <- predicted")
+    for label, row in zip(LABELS, result["matrix"]):
+        print(f"{label:<{width}}" + "".join(f"{count:>{width}}" for count in row))
+    print(f"accuracy: {result['accuracy']:.3f} over {len(data)} utterances ({args.folds}-fold)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,152 @@
+import json
+from typing import Any, List, Optional
+
+_INVALID = object()   # _load result for text that is not (yet) valid JSON
+
+
+class JsonStreamExtractor:
+    """Incremental extractor for JSON embedded in streamed LLM output.
+
+    Feed completion chunks as they arrive. Every element of a top-level array
+    (or of the array stored under `array_key` in a top-level object) is
+    returned as soon as it is complete: containers when their brackets
+    balance, scalars at the following comma or closing bracket. Any other
+    top-level object or array is returned once it closes. Prose and code
+    fences around the JSON are skipped, and brackets inside strings
+    (including escaped quotes) are ignored.
+    """
+
+    def __init__(self, array_key: Optional[str] = None):
+        """
+        :param array_key: Key of a top-level object whose array elements are
+                          streamed individually, e.g. "tasks"
+        """
+        self.array_key = array_key
+        self.completed_raw = []   # Raw text of every finished top-level value
+        self._buffer = []         # Characters of the current top-level value
+        self._stack = []          # [opening char, start offset, streams elements, next element offset]
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._last_string = None  # Last string closed directly inside the top-level object
+        self._key = None          # Key whose value is being read at depth 1
+
+    def feed(self, chunk: str) -> List[Any]:
+        """
+        Consume the next piece of output
+        :param chunk: Text delta from the model
+        :return: Values completed by this chunk, in order
+        """
+        out = []
+        for char in chunk:
+            if not self._stack:
+                if char in "{[":
+                    self._buffer = [char]
+                    self._stack.append([char, 0, char == "[", 1])
+                    self._key = None
+                    self._last_string = None
+                continue
+
+            self._buffer.append(char)
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1 and self._stack[0][0] == "{":
+                        self._last_string = "".join(self._buffer[self._string_start:])
+                continue
+
+            pos = len(self._buffer) - 1
+            if char == '"':
+                self._in_string = True
+                self._string_start = pos
+            elif char == ":" and len(self._stack) == 1:
+                try:
+                    self._key = json.loads(self._last_string) if self._last_string else None
+                except ValueError:
+                    self._key = None
+            elif char == ",":
+                if len(self._stack) == 1:
+                    self._key = None
+                if self._stack[-1][2]:
+                    self._scalar_element(pos, out)
+            elif char in "{[":
+                streams = (char == "[" and len(self._stack) == 1 and self._stack[0][0] == "{"
+                           and self.array_key is not None and self._key == self.array_key)
+                self._stack.append([char, pos, streams, pos + 1])
+            elif char in "}]":
+                if self._stack[-1][2] and char == "]":
+                    self._scalar_element(pos, out)
+                opening, start, _, _ = self._stack.pop()
+                if (opening == "{") != (char == "}"):
+                    # Mismatched bracket: the model produced broken JSON
+                    self._reset()
+                    continue
+                if not self._stack:
+                    raw = "".join(self._buffer)
+                    self.completed_raw.append(raw)
+                    if not self._streamed_top_level(raw):
+                        value = self._load(raw)
+                        if value is not _INVALID:
+                            out.append(value)
+                    self._buffer = []
+                elif self._stack[-1][2]:
+                    value = self._load("".join(self._buffer[start:]))
+                    if value is not _INVALID:
+                        out.append(value)
+                    self._stack[-1][3] = pos + 1
+        return out
+
+    def _scalar_element(self, end: int, out: List[Any]):
+        """Emit a number, string or literal element of the streamed array ending at end"""
+        entry = self._stack[-1]
+        raw = "".join(self._buffer[entry[3]:end]).strip()
+        entry[3] = end + 1
+        if raw:
+            value = self._load(raw)
+            if value is not _INVALID:
+                out.append(value)
+
+    def _streamed_top_level(self, raw: str) -> bool:
+        """True when the elements of this top-level value were already emitted"""
+        if raw.startswith("["):
+            return True
+        if self.array_key is None:
+            return False
+        value = self._load(raw)
+        return isinstance(value, dict) and isinstance(value.get(self.array_key), list)
+
+    def _reset(self):
+        self._buffer = []
+        self._stack = []
+        self._in_string = False
+        self._escape = False
+
+    @staticmethod
+    def _load(raw: str) -> Any:
+        """Parsed value, or _INVALID when raw is not valid JSON (a JSON null loads as None)"""
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _INVALID
+
+    @property
+    def partial(self) -> str:
+        """Text of the top-level value that is still open"""
+        return "".join(self._buffer) if self._stack else ""
+
+
+def first_json_value(text: str) -> str:
+    """Raw text of the first complete top-level JSON object or array in text
+
+    Falls back to everything from the first bracket when the value never
+    closes, so callers still get a meaningful JSONDecodeError.
+    """
+    extractor = JsonStreamExtractor()
+    extractor.feed(text)
+    if extractor.completed_raw:
+        return extractor.completed_raw[0]
+    return extractor.partial
@@ -0,0 +1,416 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from types import SimpleNamespace
+from typing import Dict, Optional
+
+import openai
+from openai import AsyncOpenAI, OpenAI
+
+DEFAULT_BASE_URL = "https://api.chatanywhere.tech/v1"
+
+# Failures worth another attempt; anything else (bad request, auth) is final
+RETRYABLE = (openai.APITimeoutError, openai.APIConnectionError,
+             openai.RateLimitError, openai.InternalServerError)
+
+
+class LLMGateway:
+    """Shared entry point for every chat completion in the project.
+
+    One OpenAI client (and so one keep-alive connection pool) per API key and
+    base URL. Calls are limited per model, time out, retry transient errors
+    with full-jitter exponential backoff and can hedge slow non-streaming
+    requests with a second copy. `gateway.chat.completions.create(...)`
+    behaves like the OpenAI client, so call sites and test doubles stay the
+    same. `await gateway.achat.completions.create(...)` is the asyncio
+    counterpart on an AsyncOpenAI client (one per event loop, closed when
+    asyncio.run() shuts the loop down or by aclose()) with the same limits,
+    retries, timeout and hedging; cancelling the awaiting task aborts the request.
+
+    Environment overrides (e.g. for a local OpenAI-compatible stand-in):
+    LLM_BASE_URL replaces every base URL, LLM_API_KEY is used when no key is
+    given, LLM_TIMEOUT sets the request timeout in seconds.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: Optional[str] = None,
+                 timeout: Optional[float] = None, max_retries: int = 2, backoff: float = 0.5,
+                 max_backoff: float = 8.0, model_limits: Optional[Dict[str, int]] = None,
+                 default_limit: int = 8, hedge_after: Optional[float] = None):
+        """
+        :param api_key: API key (falls back to LLM_API_KEY)
+        :param base_url: Server URL (LLM_BASE_URL takes precedence)
+        :param timeout: Seconds per attempt (falls back to LLM_TIMEOUT, then 30)
+        :param max_retries: Extra attempts after a transient failure
+        :param backoff: Base of the exponential backoff in seconds
+        :param max_backoff: Cap of a single backoff sleep
+        :param model_limits: Concurrent requests allowed per model name
+        :param default_limit: Concurrent requests for models not in model_limits
+        :param hedge_after: Seconds before a duplicate of a slow request is sent (None = never)
+        """
+        self.base_url = os.environ.get("LLM_BASE_URL") or base_url or DEFAULT_BASE_URL
+        self.timeout = timeout if timeout is not None else float(os.environ.get("LLM_TIMEOUT", 30.0))
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.model_limits = dict(model_limits or {})
+        self.default_limit = default_limit
+        self.hedge_after = hedge_after
+        self.api_key = api_key or os.environ.get("LLM_API_KEY")
+        # Retries are done here, with jitter and per-model limits, not in the SDK
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url, timeout=self.timeout, max_retries=0)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0, "hedges": 0, "hedge_wins": 0}
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.achat = SimpleNamespace(completions=SimpleNamespace(create=self.acreate))
+        # AsyncOpenAI clients and asyncio semaphores are bound to the loop that
+        # uses them, so each running event loop gets its own pair
+        self._loop_state = weakref.WeakKeyDictionary()
+        self._limits = {}
+        self._lock = threading.Lock()
+        self._hedge_pool = None
+
+    def _semaphore(self, model: str) -> threading.BoundedSemaphore:
+        with self._lock:
+            semaphore = self._limits.get(model)
+            if semaphore is None:
+                semaphore = threading.BoundedSemaphore(self.model_limits.get(model, self.default_limit))
+                self._limits[model] = semaphore
+            return semaphore
+
+    def _count(self, key: str):
+        with self._lock:
+            self.stats[key] += 1
+
+    def create(self, **kwargs):
+        """
+        Chat completion with the same arguments and result as client.chat.completions.create
+        A streaming call keeps its concurrency slot until the stream is consumed, closed or dropped.
+        """
+        self._count("requests")
+        model = kwargs.get("model", "")
+        if kwargs.get("stream"):
+            return self._stream(model, kwargs)
+        if self.hedge_after is None:
+            return self._with_retries(model, kwargs)
+        return self._hedged(model, kwargs)
+
+    def _with_retries(self, model: str, kwargs: Dict, stop: Optional[threading.Event] = None):
+        """
+        :param stop: Set once another copy of the request won; no further attempt is made
+                     (returns None then)
+        """
+        semaphore = self._semaphore(model)
+        attempt = 0
+        while True:
+            with semaphore:
+                if stop is not None and stop.is_set():
+                    return None
+                try:
+                    return self.client.chat.completions.create(**kwargs)
+                except RETRYABLE:
+                    if attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+            self._count("retries")
+            delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+            if stop is not None:
+                if stop.wait(delay):
+                    return None
+            else:
+                time.sleep(delay)
+            attempt += 1
+
+    def _hedged(self, model: str, kwargs: Dict):
+        """
+        Send a second copy when the first is slower than hedge_after; first result wins
+        A thread cannot be cancelled, so the losing copy's in-flight attempt runs on,
+        holding its slot, until it returns or hits the request timeout; it makes no
+        further attempts and waits for no slot once the winner is known.
+        """
+        with self._lock:
+            if self._hedge_pool is None:
+                self._hedge_pool = ThreadPoolExecutor(max_workers=2 * max(self.default_limit, 1),
+                                                      thread_name_prefix="llm-hedge")
+        stop = threading.Event()
+        primary = self._hedge_pool.submit(self._with_retries, model, kwargs, stop)
+        done, _ = wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        backup = self._hedge_pool.submit(self._with_retries, model, kwargs, stop)
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            stop.set()
+
+    def _stream(self, model: str, kwargs: Dict):
+        semaphore = self._semaphore(model)
+        attempt = 0
+        while True:
+            semaphore.acquire()
+            try:
+                stream = self.client.chat.completions.create(**kwargs)
+                break
+            except RETRYABLE:
+                semaphore.release()
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+            except BaseException:
+                semaphore.release()
+                raise
+            self._count("retries")
+            time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+        return _SlotStream(stream, semaphore.release)
+
+    def _async_state(self) -> SimpleNamespace:
+        """AsyncOpenAI client and per-model semaphores of the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            state = self._loop_state.get(loop)
+            if state is None:
+                # The client's connections can keep a finished loop alive, so
+                # entries of closed loops are dropped here rather than by the GC
+                for other in [other for other in self._loop_state if other.is_closed()]:
+                    del self._loop_state[other]
+                client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url,
+                                     timeout=self.timeout, max_retries=0)
+                state = SimpleNamespace(client=client, limits={}, closer=None)
+                self._loop_state[loop] = state
+            return state
+
+    async def _bind_to_loop(self) -> SimpleNamespace:
+        """
+        State of the running loop, with its client closed when the loop shuts down
+        The closer is an async generator, so asyncio.run() (loop.shutdown_asyncgens)
+        finalizes it and awaits client.close() before the loop closes.
+        """
+        state = self._async_state()
+        if state.closer is None:
+            state.closer = self._close_on_shutdown(state.client)
+            await state.closer.__anext__()
+        return state
+
+    @staticmethod
+    async def _close_on_shutdown(client: AsyncOpenAI):
+        try:
+            yield
+        finally:
+            await client.close()
+
+    async def aclose(self):
+        """Close the running loop's AsyncOpenAI client; the next async call creates a new one"""
+        with self._lock:
+            state = self._loop_state.pop(asyncio.get_running_loop(), None)
+        if state is None:
+            return
+        if state.closer is not None:
+            await state.closer.aclose()
+        else:
+            await state.client.close()
+
+    @property
+    def async_client(self) -> AsyncOpenAI:
+        """AsyncOpenAI client with the same settings for the running event loop, created on first use"""
+        return self._async_state().client
+
+    def _async_semaphore(self, model: str) -> asyncio.Semaphore:
+        limits = self._async_state().limits
+        semaphore = limits.get(model)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.model_limits.get(model, self.default_limit))
+            limits[model] = semaphore
+        return semaphore
+
+    async def acreate(self, **kwargs):
+        """
+        Async chat completion with the same arguments and result as AsyncOpenAI's create
+        Every attempt is bounded by the request timeout (or a "timeout" argument); a
+        streaming call returns an async iterator that keeps its slot until consumed, closed or dropped.
+        """
+        self._count("requests")
+        await self._bind_to_loop()
+        model = kwargs.get("model", "")
+        if kwargs.get("stream"):
+            return await self._astream(model, kwargs)
+        if self.hedge_after is None:
+            return await self._awith_retries(model, kwargs)
+        return await self._ahedged(model, kwargs)
+
+    async def _awith_retries(self, model: str, kwargs: Dict):
+        semaphore = self._async_semaphore(model)
+        timeout = kwargs.get("timeout") or self.timeout
+        attempt = 0
+        while True:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(self.async_client.chat.completions.create(**kwargs), timeout)
+                except (asyncio.TimeoutError, *RETRYABLE):
+                    if attempt >= self.max_retries:
+                        self._count("failures")
+                        raise
+            self._count("retries")
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+
+    async def _ahedged(self, model: str, kwargs: Dict):
+        """Async hedging: the slower copy is cancelled as soon as one succeeds"""
+        primary = asyncio.ensure_future(self._awith_retries(model, kwargs))
+        done, _ = await asyncio.wait([primary], timeout=self.hedge_after)
+        if done:
+            return primary.result()
+        self._count("hedges")
+        backup = asyncio.ensure_future(self._awith_retries(model, kwargs))
+        pending = {primary, backup}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        if future is backup:
+                            self._count("hedge_wins")
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            for future in pending:
+                future.cancel()
+
+    async def _astream(self, model: str, kwargs: Dict):
+        semaphore = self._async_semaphore(model)
+        timeout = kwargs.get("timeout") or self.timeout
+        attempt = 0
+        while True:
+            await semaphore.acquire()
+            try:
+                stream = await asyncio.wait_for(self.async_client.chat.completions.create(**kwargs), timeout)
+                break
+            except (asyncio.TimeoutError, *RETRYABLE):
+                semaphore.release()
+                if attempt >= self.max_retries:
+                    self._count("failures")
+                    raise
+            except BaseException:
+                semaphore.release()
+                raise
+            self._count("retries")
+            await asyncio.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+            attempt += 1
+        return _AsyncSlotStream(stream, semaphore.release)
+
+
+class _SlotStream:
+    """Streamed completion that gives its concurrency slot back exactly once:
+    when the stream is exhausted or fails, on close(), or when it is garbage
+    collected, so an abandoned stream does not keep the slot forever."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._iterator = iter(stream)
+        self._release = release
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._iterator)
+        except BaseException:
+            self.close()
+            raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                close()
+        finally:
+            release()
+
+    def __del__(self):
+        self.close()
+
+
+class _AsyncSlotStream:
+    """Async counterpart of _SlotStream; garbage collection releases the slot
+    on the loop that owns the semaphore."""
+
+    def __init__(self, stream, release):
+        self._stream = stream
+        self._iterator = stream.__aiter__()
+        self._release = release
+        self._loop = asyncio.get_running_loop()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return await self._iterator.__anext__()
+        except BaseException:
+            await self.aclose()
+            raise
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.aclose()
+
+    async def aclose(self):
+        release, self._release = self._release, None
+        if release is None:
+            return
+        try:
+            close = getattr(self._stream, "close", None)
+            if close is not None:
+                await close()
+        finally:
+            release()
+
+    def __del__(self):
+        release, self._release = self._release, None
+        if release is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(release)
+
+
+_gateways = {}
+_gateways_lock = threading.Lock()
+
+
+def get_gateway(api_key: Optional[str] = None, base_url: Optional[str] = None, **options) -> LLMGateway:
+    """
+    Process-wide gateway for an API key and server, created on first use
+    :param options: LLMGateway settings, only applied when the gateway is created
+    """
+    key = (api_key, os.environ.get("LLM_BASE_URL") or base_url or DEFAULT_BASE_URL)
+    with _gateways_lock:
+        gateway = _gateways.get(key)
+        if gateway is None:
+            gateway = LLMGateway(api_key, base_url, **options)
+            _gateways[key] = gateway
+        return gateway
@@ -0,0 +1,172 @@
+import math
+import os
+import threading
+import time
+from typing import Optional, Tuple
+
+from config_registry import BASE_DIR, get_registry
+
+ROBOT_CONFIG = os.path.join(BASE_DIR, "Robot", "config.json")
+# Exploration used before the map path was configurable
+DEFAULT_MAP_FILE = "~/.local/share/Explorer/2025-04-12T094940.153Z.explo"
+
+
+def configured_map_file() -> str:
+    """
+    Map path from PEPPER_MAP_FILE, else "robot": {"map_file": ...} in Robot/config.json,
+    else the original exploration
+    """
+    path = os.environ.get("PEPPER_MAP_FILE")
+    if path:
+        return path
+    try:
+        robot = get_registry().get(ROBOT_CONFIG).get("robot") or {}
+    except (OSError, ValueError):
+        robot = {}
+    return robot.get("map_file") or DEFAULT_MAP_FILE
+
+
+class MapSession:
+    """Keeps one exploration loaded and the robot localized in it.
+
+    ALNavigation keeps a loaded exploration and the localization in it until
+    something else replaces them, so the map is loaded once and the robot
+    localized once. Both are redone only when needed:
+    - the map file changes (another path, or a new mtime/size when the file
+      is readable from here),
+    - the loaded map was replaced, e.g. by an explore() run,
+    - the pose uncertainty reported by ALNavigation exceeds drift_threshold,
+    - a navigation failed, which usually means the robot got lost.
+    """
+
+    def __init__(self, nav_service, map_file: Optional[str] = None, drift_threshold: float = 0.5,
+                 pose_interval: float = 0.5):
+        """
+        :param nav_service: ALNavigation proxy
+        :param map_file: Exploration on the robot (configured_map_file() when None)
+        :param drift_threshold: Pose uncertainty (m or rad) above which the robot re-localizes
+        :param pose_interval: Seconds a queried pose is reused before asking again
+        """
+        self.nav_service = nav_service
+        self.map_file = map_file or configured_map_file()
+        self.drift_threshold = drift_threshold
+        self.pose_interval = pose_interval
+        self.loaded_map = None      # Identity of the exploration loaded by this session
+        self.localized = False
+        self.stats = {"loads": 0, "localizations": 0, "navigations": 0}
+        self._pose = None
+        self._pose_at = 0.0
+        self._uncertainty = 0.0
+        self._lock = threading.RLock()
+
+    def map_identity(self) -> Tuple:
+        """Path plus mtime and size when the file is visible locally (e.g. running on the robot)"""
+        path = os.path.expanduser(self.map_file)
+        try:
+            stat = os.stat(path)
+            return (self.map_file, stat.st_mtime_ns, stat.st_size)
+        except OSError:
+            return (self.map_file,)
+
+    def use_map(self, map_file: str):
+        """Switch to another exploration; it is loaded on the next navigation"""
+        with self._lock:
+            self.map_file = map_file
+
+    def ensure_ready(self):
+        """Load the map and localize only if the current state cannot be trusted"""
+        with self._lock:
+            identity = self.map_identity()
+            if identity != self.loaded_map or self._map_replaced():
+                print(f"Loading map {self.map_file}")
+                self.nav_service.loadExploration(self.map_file)
+                self.loaded_map = identity
+                self.localized = False
+                self.stats["loads"] += 1
+            if self.localized and self._drifted():
+                print(f"Localization drifted (uncertainty {self._uncertainty:.2f}), re-localizing")
+                self.localized = False
+            if not self.localized:
+                self.nav_service.startLocalization()
+                self.localized = True
+                self._pose = None
+                self.stats["localizations"] += 1
+
+    def navigate_to(self, x: float, y: float, theta: float):
+        """Navigate to a pose of the map, preparing map and localization first"""
+        self.ensure_ready()
+        with self._lock:
+            self.stats["navigations"] += 1
+            self._pose = None
+        future = self.nav_service.navigateToInMap([x, y, theta], _async=True)
+        if hasattr(future, "addCallback"):
+            future.addCallback(self._navigation_done)
+        return future
+
+    def _navigation_done(self, future):
+        try:
+            ok = future.value() is not False
+        except Exception:
+            ok = False
+        if not ok:
+            self.mark_lost()
+
+    def mark_lost(self):
+        """Force re-localization before the next navigation"""
+        with self._lock:
+            self.localized = False
+            self._pose = None
+
+    def explored(self):
+        """
+        An explore() run replaced the loaded map: localize in the new one, and reload
+        the configured map before the next navigation (its coordinates refer to it)
+        """
+        with self._lock:
+            self.loaded_map = None
+            self.nav_service.startLocalization()
+            self.localized = True
+            self._pose = None
+            self.stats["localizations"] += 1
+
+    def pose(self, refresh: bool = False) -> Optional[Tuple[float, float, float]]:
+        """
+        Current (x, y, theta) in the map, or None when not localized
+        :param refresh: Ask ALNavigation even if the last answer is recent
+        """
+        with self._lock:
+            if not self.localized:
+                return None
+            if refresh or self._pose is None or time.time() - self._pose_at > self.pose_interval:
+                self._query_pose()
+            return self._pose
+
+    def _query_pose(self):
+        try:
+            position = self.nav_service.getRobotPositionInMap()
+        except Exception as e:
+            print(f"Pose query failed: {e}")
+            return
+        # [[x, y, theta], [uncertainty...]]
+        x, y, theta = (float(v) for v in position[0][:3])
+        uncertainty = position[1] if len(position) > 1 else []
+        self._pose = (x, y, theta)
+        self._pose_at = time.time()
+        self._uncertainty = max((abs(float(u)) for u in uncertainty), default=0.0)
+
+    def _drifted(self) -> bool:
+        if self._pose is None or time.time() - self._pose_at > self.pose_interval:
+            self._query_pose()
+        return self._pose is not None and (self._uncertainty > self.drift_threshold
+                                           or not all(math.isfinite(v) for v in self._pose))
+
+    def _map_replaced(self) -> bool:
+        """True when ALNavigation reports a different loaded exploration than ours"""
+        if self.loaded_map is None:
+            return False
+        try:
+            current = self.nav_service.getExplorationPath()
+        except Exception:
+            return False   # Not available on this NAOqi version; trust our own state
+        # "~" expands on the robot, so compare the (timestamped) file names
+        return bool(current) and os.path.basename(current) != os.path.basename(self.map_file)
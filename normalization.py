@@ -1,33 +1,68 @@
-from openai import OpenAI
+from conversation_memory import get_memory
+from llm_gateway import get_gateway
 import re
 import time
 
 class Boss:
     # Initialization module
-    def __init__(self, api_key: str, model: str ):   
+    def __init__(self, api_key: str, model: str, memory=None):
+        """
+        :param memory: ConversationMemory for coreference (the default session when None)
+        """
         self.model = model  # Model
-        self.client = OpenAI(api_key=api_key, base_url="https://api.chatanywhere.tech/v1")       
-    def task_normalization(self, task_description):
+        self.client = get_gateway(api_key, "https://api.chatanywhere.tech/v1")
+        self.memory = memory if memory is not None else get_memory()
+
+    def task_normalization(self, task_description, remember=True):
         """
         Use the large model to break down complex tasks
+        :param remember: Add the input and the result to the conversation memory
+        """
+        print("Task--->\n")
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=self._messages(task_description),
+            temperature=0.3
+        )
+        return self._finish(task_description, response, remember)
+
+    async def task_normalization_async(self, task_description, remember=True):
+        """
+        task_normalization on the asyncio gateway; cancelling the caller aborts the request
+        :param remember: Add the input and the result to the conversation memory
         """
         print("Task--->\n")
+        response = await self.client.achat.completions.create(
+            model=self.model,
+            messages=self._messages(task_description),
+            temperature=0.3
+        )
+        return self._finish(task_description, response, remember)
+
+    def _messages(self, task_description):
+        memory = self.memory.summary()
+        memory = f"""
+        **Conversation Memory** (resolve references such as "there", "it", "him" against it):
+        {memory}
+        """ if memory else ""
         sys_prompt = f"""
         You are a senior language analysis expert, especially skilled in synonym and near-synonym normalization. 
         **Please convert the following input text:
         {task_description} 
-        into a unified format and semantic executable task description, and perform context disambiguation(Remember the keywords from the last 3 rounds of conversation ,automatically extract entity nouns.Perform coreference resolution)
+        into a unified format and semantic executable task description, and perform context disambiguation(use the entities and turns of the conversation memory below.Perform coreference resolution)
         Finally, output only the result directly, without any explanation, thought process, or additional text. The answer format must be: Task: [content]**
-        """
-        response = self.client.chat.completions.create(
-            model=self.model,
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": task_description}
-            ],
-            temperature=0.3
-        )
+        """ + memory
+        return [
+            {"role": "system", "content": sys_prompt},
+            {"role": "user", "content": task_description}
+        ]
+
+    def _finish(self, task_description, response, remember):
         tasktext = response.choices[0].message.content
         cleaned_response = re.sub(r'<think>.*?</think>', '', tasktext, flags=re.DOTALL)
         tasktext = cleaned_response.strip()
         print(f"{tasktext}")  
+        if remember:
+            self.memory.add("user", task_description)
+            self.memory.add("assistant", tasktext)
+        return tasktext
@@ -1,28 +1,56 @@
 # pepper_controller.py
 import qi
+import queue
+import threading
 import time
-import json
+from command_schema import CommandError, validate_command
+from config_registry import get_registry
+from map_session import MapSession
+from term_matcher import TermMatcher
 
 class PepperController:
-    def __init__(self, ip="127.0.0.1", port=9559):
+    def __init__(self, ip="127.0.0.1", port=9559, map_file=None):
+        """
+        :param map_file: Exploration to navigate in (PEPPER_MAP_FILE, then Robot/config.json when None)
+        """
         self.session = qi.Session()
         self.session.connect(f"tcp://{ip}:{str(port)}")
   
         # Initialize service modules
-        self.mapfile="~/.local/share/Explorer/2025-04-12T094940.153Z.explo"
         self.nav_service = self.session.service("ALNavigation")
         self.motion_service = self.session.service("ALMotion")
         self.tts_service = self.session.service("ALTextToSpeech")
         self.audio_service = self.session.service("ALAudioPlayer")
         self.led_service = self.session.service("ALLeds")
         self.autonomous_service = self.session.service("ALAutonomousLife")
+        # Map is loaded and the robot localized once, not before every navigation
+        self.map_session = MapSession(self.nav_service, map_file)
 
         # Robot state initialization
-        with open("navigation_params.json") as f:
-            self.domain_terms = json.load(f)  
+        self.registry = get_registry()
         self.current_volume = 0.5  # Default volume at 50%
 
+        # Sentences are spoken in order by one worker, so speech can start while text is still arriving
+        self._speech_queue = queue.Queue()
+        self._speech_thread = None
+
+    @property
+    def current_pose(self):
+        """(x, y, theta) in the navigation map, or None before the robot is localized"""
+        return self.map_session.pose()
+
+    @property
+    def domain_terms(self):
+        return self.registry.get("navigation_params.json")
+
     def execute(self, command):
+        """Carry out one command; returns False when it could not be executed"""
+        try:
+            # Bad parameters are caught before any robot service is called
+            command = validate_command(command)
+        except CommandError as e:
+            self.tts_service.say(f"Error executing command: {str(e)}")
+            return False
         action_type = command["action"]
         try:
             if action_type == "navigate":
@@ -41,8 +69,11 @@ class PepperController:
                 self._perform_gesture(command["params"]["name"])
             else:
                 self.tts_service.say("Unrecognized command type")
+                return False
+            return True
         except Exception as e:
             self.tts_service.say(f"Error executing command: {str(e)}")
+            return False
 
     def _handle_move(self, params):
         x = params.get("x", 0)
@@ -61,12 +92,8 @@ class PepperController:
         if not location_name:
             raise ValueError("No target location specified")
         # Match location configuration
-        matched_term = None
-        
-        for term in self.domain_terms:
-            if term["pattern"] == location_name or term["std"] == location_name:
-                matched_term = term
-                break
+        matcher = self.registry.index("navigation_params.json", "term_matcher", TermMatcher)
+        matched_term = matcher.lookup(location_name)
         # Execute navigation
         if matched_term and matched_term["type"] == "location":
             nav_params = matched_term["params"]
@@ -84,17 +111,50 @@ class PepperController:
         print(f"Navigating to coordinates: x={x}, y={y}, θ={theta}")
         if self.nav_service:
             print(f"Begin Navigating------------------------------------------------------")
-            self.nav_service.loadExploration(self.mapfile)
-            self.nav_service.startLocalization()
-            self.nav_service.navigateToInMap([x, y, theta], _async=True)
+            self.map_session.navigate_to(x, y, theta)
 
     def _handle_exploration(self, params):
         radius = params.get("radius", 2.0)
         self.nav_service.explore(radius)
-        self.nav_service.startLocalization()
+        self.map_session.explored()
 
     def _handle_response(self, response):
-        self.tts_service.say(response)
+        self.say_async(response)
+        self._speech_queue.join()
+
+    def say_async(self, text):
+        """Queue text for the speech worker and return immediately"""
+        if self._speech_thread is None:
+            self._speech_thread = threading.Thread(target=self._speech_worker, name="pepper-tts", daemon=True)
+            self._speech_thread.start()
+        self._speech_queue.put(text)
+
+    def speak_stream(self, sentences, wait=True):
+        """
+        Speak sentences as they are produced (e.g. by dialogue_mode.Boss.dialogue_stream)
+        :param sentences: Iterable of sentences; the first is spoken while later ones are generated
+        :param wait: Block until everything queued has been spoken
+        :return: The full spoken text
+        """
+        spoken = []
+        for sentence in sentences:
+            spoken.append(sentence)
+            self.say_async(sentence)
+        if wait:
+            self._speech_queue.join()
+        return " ".join(spoken)
+
+    def _speech_worker(self):
+        while True:
+            text = self._speech_queue.get()
+            try:
+                if text is None:
+                    return
+                self.tts_service.say(text)
+            except Exception as e:
+                print(f"Speech failed: {e}")
+            finally:
+                self._speech_queue.task_done()
 
     def _set_audio_volume(self, level):
         level = max(0.0, min(1.0, level))  # Clamp between 0-1 range
@@ -136,4 +196,8 @@ class PepperController:
             self.tts_service.say("Unsupported preset gesture")
 
     def cleanup(self):
+        if self._speech_thread is not None:
+            self._speech_queue.put(None)
+            self._speech_thread.join()
+            self._speech_thread = None
         self.motion_service.rest()
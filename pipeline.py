@@ -0,0 +1,374 @@
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from typing import Dict, Optional
+
+from adapter import DeepSeekAdapter, build_command_prompt
+from command_schema import CommandError, validate_command
+from conversation_memory import get_memory
+from determine_task_type import Boss as TaskTypeBoss
+from dialogue_mode import Boss as DialogueBoss
+from normalization import Boss as NormalizationBoss
+from prompt_builder import PromptBuilder
+from taskplan import DECOMPOSITION_SECTIONS, TaskPlanner
+
+FUSED_INTRO = """You are the front end of a Pepper service robot. For the user input, do all of the following in one step and return a single JSON object:
+1. **Intent**: "dialogue" for general conversation or question answering, "task" when the robot must perform an operation.
+2. **Normalization**: convert the input into a unified, executable description (normalize synonyms and near-synonyms, resolve references using the recent context).
+3. **Dialogue**: answer as a friendly, knowledgeable conversationalist in 3-5 sentences, honest about uncertainty, in "response".
+4. **Single-action task**: when the task maps to exactly one robot action, give it in "command" using the command rules below.
+5. **Multi-step task**: otherwise decompose it into atomic tasks in "tasks" using the task rules below.
+Output exactly one of these shapes, as compact pure JSON without any other text:
+{"intent": "dialogue", "normalized": "...", "response": "..."}
+{"intent": "task", "normalized": "...", "command": {"action": "...", "params": {...}}}
+{"intent": "task", "normalized": "...", "tasks": [{"id": 1, "name": "...", "duration": 1.0, "depends": [], "resources": []}]}"""
+
+
+def build_fused_prompt() -> PromptBuilder:
+    """Intent, normalization, command and decomposition rules as one static prefix"""
+    command = dict(build_command_prompt().sections)
+    task = dict(DECOMPOSITION_SECTIONS)
+    return PromptBuilder("fused", [
+        ("intro", FUSED_INTRO),
+        ("command_mapping", "**Command Rules**\n" + command["mapping"]),
+        ("command_parameters", command["parameters"]),
+        ("command_defaults", command["defaults"]),
+        ("task_format", "**Task Rules** (for the \"tasks\" field)\n" + task["role"].split("\n", 1)[1]),
+        ("task_notes", task["notes"]),
+    ])
+
+
+class Pipeline:
+    """Front end from an utterance to a command, a plan or a spoken answer.
+
+    Order of attempts: the local fast path, then one fused LLM request that
+    returns intent, normalized text and command/plan together, then the
+    original staged chain (task type -> normalization -> parse or plan ->
+    dialogue) if the fused answer is missing or invalid. Every stage's
+    latency is recorded so the two paths can be compared.
+
+    In the staged chain an utterance the local intent classifier is unsure
+    about can be dispatched speculatively: task type, dialogue reply and
+    task branch start together as asyncio tasks on one background event loop
+    owned by the pipeline (stopped by close()), the branch matching the
+    decided intent is committed and the other one is cancelled, which aborts
+    its in-flight request. speculate_below is the policy:
+    speculate when the classifier's confidence is below it (0 = never,
+    1 = always; default: whenever determine_task_type would ask the LLM).
+    """
+
+    def __init__(self, api_key: str, model: str, adapter: Optional[DeepSeekAdapter] = None,
+                 planner: Optional[TaskPlanner] = None, fused: bool = True,
+                 speculate_below: Optional[float] = None, session_id: str = "default"):
+        """
+        :param api_key: API key for the LLM gateway
+        :param model: Model used by every stage
+        :param adapter: Command parser (created when None)
+        :param planner: Task planner (created when None)
+        :param fused: Try the single fused request before the staged chain
+        :param speculate_below: Classifier confidence under which the staged branches run
+                                concurrently (falls back to PIPELINE_SPECULATE_BELOW, then to
+                                the task type threshold)
+        :param session_id: Conversation memory session shared by all stages
+        """
+        self.model = model
+        self.adapter = adapter if adapter is not None else DeepSeekAdapter(api_key, model)
+        self.planner = planner if planner is not None else TaskPlanner(api_key, model)
+        self.client = self.adapter.client
+        self.memory = get_memory(session_id)
+        self.task_type = TaskTypeBoss(api_key, model)
+        self.normalizer = NormalizationBoss(api_key, model, self.memory)
+        self.dialogue = DialogueBoss(api_key, model, self.memory)
+        self.fused = fused
+        self.fused_prompt = build_fused_prompt()
+        if speculate_below is None:
+            speculate_below = float(os.environ.get("PIPELINE_SPECULATE_BELOW", self.task_type.threshold))
+        self.speculate_below = speculate_below
+        self.speculation = {"speculated": 0, "dropped_task": 0, "dropped_dialogue": 0}
+        self.latency = {}   # stage -> {"calls", "total_ms", "max_ms"}
+        self._lock = threading.Lock()
+        self._loop = None     # Long-lived event loop of the speculative branches
+        self._loop_thread = None
+
+    def _timed(self, timings: Dict, stage: str, func, *args):
+        started = time.perf_counter()
+        try:
+            return func(*args)
+        finally:
+            self._record(timings, stage, (time.perf_counter() - started) * 1000.0)
+
+    async def _atimed(self, timings: Dict, stage: str, func, *args):
+        """_timed for a coroutine function; a cancelled stage is not recorded"""
+        started = time.perf_counter()
+        result = await func(*args)
+        self._record(timings, stage, (time.perf_counter() - started) * 1000.0)
+        return result
+
+    def _record(self, timings: Dict, stage: str, elapsed: float):
+        with self._lock:
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+            entry = self.latency.setdefault(stage, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += elapsed
+            entry["max_ms"] = max(entry["max_ms"], elapsed)
+
+    def handle(self, text: str) -> Dict:
+        """
+        Turn one utterance into something the robot can act on
+        :param text: User utterance
+        :return: {"intent", "normalized", "path", "timings"} plus "command" (single action),
+                 "tasks" (plan, also loaded into the planner) or "response" (dialogue)
+        """
+        timings = {}
+        started = time.perf_counter()
+        command = self._timed(timings, "fast_path", self._fast_command, text)
+        if command is not None:
+            result = {"intent": "task", "normalized": text, "command": command, "path": "fast"}
+        else:
+            result = None
+            if self.fused:
+                result = self._timed(timings, "fused", self._fused, text)
+            if result is None:
+                result = self._staged(text, timings)
+        timings["total"] = (time.perf_counter() - started) * 1000.0
+        result["timings"] = timings
+        # Only the committed outcome is remembered, whichever path produced it
+        self.memory.add("user", text)
+        self.memory.add("assistant", result.get("response") or result["normalized"])
+        print(f"[pipeline] {result['path']} {result['intent']}: "
+              + ", ".join(f"{stage}={ms:.1f}ms" for stage, ms in timings.items()))
+        return result
+
+    def _fast_command(self, text: str) -> Optional[Dict]:
+        if self.adapter.fast_path is None:
+            return None
+        command = self.adapter.fast_path.parse(text)
+        return None if command is None else self.adapter._validate_output(command)
+
+    def _fused(self, text: str) -> Optional[Dict]:
+        """One structured request; None when the answer fails validation"""
+        dynamic = [("Conversation Memory", self.memory.summary()),
+                   ("Recent Commands", self.adapter.engine.context_prompt())]
+        example = self.planner.local_example(text)
+        if example is not None:
+            dynamic.append(("Example Steps", f"{example}"))
+        messages = self.fused_prompt.messages(text, dynamic)
+        try:
+            response = self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                response_format={"type": "json_object"},
+                temperature=0.3
+            )
+        except Exception as e:
+            print(f"Fused request failed: {e}")
+            return None
+        self.fused_prompt.record_usage(response, messages)
+        try:
+            data = json.loads(self.adapter.engine.extract_json_from_text(response.choices[0].message.content))
+        except json.JSONDecodeError:
+            return None
+        return self._accept_fused(text, data, None if example is None else example[0])
+
+    def _accept_fused(self, text: str, data, example_key: Optional[str]) -> Optional[Dict]:
+        """Validate a fused answer and apply it; None sends the utterance down the staged path"""
+        if not isinstance(data, dict) or data.get("intent") not in ("dialogue", "task"):
+            return None
+        normalized = data.get("normalized")
+        if not isinstance(normalized, str) or not normalized.strip():
+            normalized = text
+        result = {"intent": data["intent"], "normalized": normalized.strip(), "path": "fused"}
+
+        if data["intent"] == "dialogue":
+            response = data.get("response")
+            if not isinstance(response, str) or not response.strip():
+                return None
+            result["response"] = response.strip()
+            return result
+
+        if isinstance(data.get("command"), dict):
+            try:
+                command = validate_command(data["command"])
+            except CommandError as e:
+                print(f"Fused command rejected: {e}")
+                return None
+            result["command"] = self.adapter._validate_output(command)
+            return result
+
+        tasks = data.get("tasks")
+        if not self._valid_tasks(tasks):
+            return None
+        try:
+            result["tasks"] = self.planner.adopt_tasks(tasks, text if example_key else None, example_key)
+        except ValueError as e:
+            print(f"Fused plan rejected: {e}")
+            return None
+        return result
+
+    @staticmethod
+    def _valid_tasks(tasks) -> bool:
+        if not isinstance(tasks, list) or not tasks:
+            return False
+        ids = set()
+        for task in tasks:
+            if not isinstance(task, dict) or not isinstance(task.get("id"), int) \
+                    or not isinstance(task.get("name"), str):
+                return False
+            for key in ("depends", "resources"):
+                if not isinstance(task.get(key, []), list):
+                    return False
+            try:
+                float(task.get("duration", 0.0))
+            except (TypeError, ValueError):
+                return False
+            ids.add(task["id"])
+        return len(ids) == len(tasks)
+
+    def _staged(self, text: str, timings: Dict) -> Dict:
+        """The original chain of separate requests"""
+        _, confidence = self.task_type.classifier.predict(text)
+        if confidence < self.speculate_below:
+            return self._speculative(text, timings)
+        intent = self._timed(timings, "task_type", self.task_type.determine_task_type, text)
+        if intent != "task":
+            return self._dialogue_branch(text, timings)
+        return self._commit_task(self._task_branch(text, timings), timings)
+
+    def _speculative(self, text: str, timings: Dict) -> Dict:
+        """Task type, dialogue reply and task branch at once; the decided intent's branch is kept"""
+        with self._lock:
+            self.speculation["speculated"] += 1
+        intent, outcome, branch_timings = self._run_async(self._speculate(text))
+        for stage, elapsed in branch_timings.items():
+            timings[stage] = timings.get(stage, 0.0) + elapsed
+        result = self._commit_task(outcome, timings) if intent == "task" else outcome
+        result["path"] = "speculative"
+        return result
+
+    def _run_async(self, coro):
+        """
+        Run a coroutine on the pipeline's background event loop and wait for it
+        One loop for the pipeline's lifetime keeps the gateway's AsyncOpenAI client,
+        and so its keep-alive connections, across utterances.
+        """
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(target=self._loop.run_forever,
+                                                     name="pipeline-speculation", daemon=True)
+                self._loop_thread.start()
+        return asyncio.run_coroutine_threadsafe(coro, self._loop).result()
+
+    def close(self):
+        """Close the async clients of the background loop and stop it"""
+        with self._lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None:
+            return
+        gateways = {id(stage.client): stage.client for stage in
+                    (self.task_type, self.dialogue, self.normalizer, self.planner, self.adapter)}
+        for gateway in gateways.values():
+            asyncio.run_coroutine_threadsafe(gateway.aclose(), loop).result()
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
+
+    async def _speculate(self, text: str):
+        """
+        Run the three requests as asyncio tasks and cancel the losing branch
+        :return: (intent, winning branch's outcome, timings of task type and the winner)
+        """
+        # Separate timings per branch, so the cancelled one never leaks into the result
+        intent_timings, dialogue_timings, task_timings = {}, {}, {}
+        intent_task = asyncio.ensure_future(self._atimed(intent_timings, "task_type",
+                                                         self.task_type.determine_task_type_async, text))
+        dialogue_task = asyncio.ensure_future(self._dialogue_branch_async(text, dialogue_timings))
+        task_task = asyncio.ensure_future(self._task_branch_async(text, task_timings))
+        try:
+            intent = await intent_task
+            if intent == "task":
+                winner, winner_timings, loser, dropped = task_task, task_timings, dialogue_task, "dropped_dialogue"
+            else:
+                winner, winner_timings, loser, dropped = dialogue_task, dialogue_timings, task_task, "dropped_task"
+            loser.cancel()
+            self._count_dropped(dropped)
+            outcome = await winner
+        finally:
+            for pending in (intent_task, dialogue_task, task_task):
+                pending.cancel()
+        intent_timings.update(winner_timings)
+        return intent, outcome, intent_timings
+
+    def _count_dropped(self, key: str):
+        with self._lock:
+            self.speculation[key] += 1
+
+    def _dialogue_branch(self, text: str, timings: Dict) -> Dict:
+        chat = self._timed(timings, "dialogue", self.dialogue.dialogue_mode, text, False)
+        return self._dialogue_result(text, chat)
+
+    async def _dialogue_branch_async(self, text: str, timings: Dict) -> Dict:
+        chat = await self._atimed(timings, "dialogue", self.dialogue.dialogue_mode_async, text, False)
+        return self._dialogue_result(text, chat)
+
+    @staticmethod
+    def _dialogue_result(text: str, chat: Dict) -> Dict:
+        return {"intent": "dialogue", "normalized": text, "path": "staged",
+                "response": chat["params"]["response"]}
+
+    def _task_branch(self, text: str, timings: Dict) -> Dict:
+        """
+        Normalize and then parse or decompose, without touching planner or context state
+        :return: {"normalized"} plus "command" or "tasks" and "example_key"
+        """
+        normalized = self._timed(timings, "normalization", self.normalizer.task_normalization, text, False)
+        normalized = self._clean_normalized(text, normalized)
+        command = self._branch_fast_path(normalized, timings)
+        if command is not None:
+            return {"normalized": normalized, "command": command}
+        tasks, example_key = self._timed(timings, "plan", self.planner.propose_tasks, normalized)
+        return {"normalized": normalized, "tasks": tasks, "example_key": example_key}
+
+    async def _task_branch_async(self, text: str, timings: Dict) -> Dict:
+        """_task_branch on the asyncio gateway; cancelling it aborts the pending request"""
+        normalized = await self._atimed(timings, "normalization", self.normalizer.task_normalization_async,
+                                        text, False)
+        normalized = self._clean_normalized(text, normalized)
+        command = self._branch_fast_path(normalized, timings)
+        if command is not None:
+            return {"normalized": normalized, "command": command}
+        tasks, example_key = await self._atimed(timings, "plan", self.planner.propose_tasks_async, normalized)
+        return {"normalized": normalized, "tasks": tasks, "example_key": example_key}
+
+    @staticmethod
+    def _clean_normalized(text: str, normalized: Optional[str]) -> str:
+        normalized = normalized or text
+        return re.sub(r"^\**\s*task\s*[:：]\s*", "", normalized, flags=re.IGNORECASE).strip("* ") or text
+
+    def _branch_fast_path(self, normalized: str, timings: Dict) -> Optional[Dict]:
+        if self.adapter.fast_path is None:
+            return None
+        return self._timed(timings, "fast_path", self.adapter.fast_path.parse, normalized)
+
+    def _commit_task(self, proposal: Dict, timings: Dict) -> Dict:
+        """Apply the task branch: record the command or adopt the plan"""
+        result = {"intent": "task", "normalized": proposal["normalized"], "path": "staged"}
+        if "command" in proposal:
+            result["command"] = self.adapter._validate_output(proposal["command"])
+            return result
+        tasks = self.planner.adopt_tasks(proposal["tasks"], proposal["normalized"], proposal["example_key"])
+        if len(tasks) != 1:
+            result["tasks"] = tasks
+            return result
+        result["command"] = self._timed(timings, "parse", self.adapter.parse_command, tasks[0]["name"])
+        return result
+
+    def latency_report(self) -> Dict[str, Dict[str, float]]:
+        """Mean and max latency of every stage so far, in milliseconds"""
+        return {stage: {"calls": entry["calls"], "mean_ms": entry["total_ms"] / entry["calls"],
+                        "max_ms": entry["max_ms"]}
+                for stage, entry in self.latency.items()}
@@ -0,0 +1,258 @@
+"""Planner benchmark suite.
+
+Generates random task DAGs in the generate_tasks schema, runs every planner
+mode on them and writes wall time, nodes expanded, peak memory and plan cost
+to a JSON file. The "sequence" mode runs TaskPlanner.optimize_taskplan.
+Passing --baseline compares against an earlier run and exits non-zero on
+regressions.
+
+    python plan_benchmark.py --sizes 8 12 16 24 --trials 5 --output planner_bench.json
+"""
+import argparse
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, List
+
+from plan_cache import PlanCache
+from plan_search import IncrementalScheduler, TaskGraph, list_schedule, search_schedule
+from taskplan import TaskPlanner
+
+RESOURCES = ["legs", "voice", "right_arm", "left_arm", "leds", "head", "tablet"]
+
+
+def generate_task_dag(size: int, density: float = 0.2, durations: str = "uniform",
+                      resources: int = 4, contention: float = 0.5,
+                      seed: int = 0) -> List[Dict]:
+    """
+    Random task DAG in the generate_tasks schema
+    :param size: Number of tasks
+    :param density: Probability of an edge from each earlier task
+    :param durations: "uniform" (1-10 s), "exponential" (mean 3 s) or "lognormal"
+    :param resources: Size of the resource pool
+    :param contention: Probability that a task needs each extra resource;
+                       a task needs at least one resource with this probability too
+    :param seed: Random seed
+    :return: Task list
+    """
+    rng = random.Random(seed)
+    pool = RESOURCES[:resources] if resources <= len(RESOURCES) else \
+        RESOURCES + [f"res_{i}" for i in range(len(RESOURCES), resources)]
+    tasks = []
+    for i in range(size):
+        if durations == "exponential":
+            duration = rng.expovariate(1 / 3.0)
+        elif durations == "lognormal":
+            duration = rng.lognormvariate(1.0, 0.75)
+        else:
+            duration = rng.uniform(1.0, 10.0)
+        depends = [j + 1 for j in range(i) if rng.random() < density]
+        needs = []
+        if pool and rng.random() < contention:
+            needs = [rng.choice(pool)]
+            needs += [r for r in pool if r not in needs and rng.random() < contention / len(pool)]
+        tasks.append({
+            "id": i + 1,
+            "name": f"Task {i + 1}",
+            "duration": round(duration, 2),
+            "depends": depends,
+            "resources": needs,
+        })
+    return tasks
+
+
+_planner = None
+
+
+def _get_planner() -> TaskPlanner:
+    """Offline planner shared by all runs (optimize_taskplan never contacts the model)"""
+    global _planner
+    if _planner is None:
+        _planner = TaskPlanner("benchmark", "benchmark", plan_cache=PlanCache(":memory:"))
+    return _planner
+
+
+def _run_sequence(tasks, args):
+    """TaskPlanner.optimize_taskplan, costed as the makespan of its execution order"""
+    planner = _get_planner()
+    plan = planner.optimize_taskplan(tasks)
+    stats = planner.search_stats
+    return _makespan(plan), stats.expanded, stats.complete
+
+
+def _makespan(order: List[Dict]) -> float:
+    """Finish time when each task starts, in order, once its dependencies and resources are free"""
+    finish = {}
+    free = {}
+    for task in order:
+        start = max([finish.get(dep, 0.0) for dep in task["depends"]]
+                    + [free.get(res, 0.0) for res in task["resources"]] + [0.0])
+        finish[task["id"]] = start + task["duration"]
+        for res in task["resources"]:
+            free[res] = finish[task["id"]]
+    return max(finish.values(), default=0.0)
+
+
+def _run_greedy(tasks, args):
+    schedule = list_schedule(TaskGraph(tasks))
+    return schedule["makespan"], 0, False
+
+
+def _run_schedule(tasks, args):
+    schedule, stats = search_schedule(TaskGraph(tasks), max_expansions=args.max_expansions)
+    return schedule["makespan"], stats.expanded, stats.complete
+
+
+def _run_anytime(tasks, args):
+    schedule, stats = search_schedule(TaskGraph(tasks), weight=args.weight,
+                                      time_budget=args.budget,
+                                      max_expansions=args.max_expansions)
+    return schedule["makespan"], stats.expanded, stats.complete
+
+
+def _run_replan(tasks, args):
+    """Plan, execute the first third, drop one task, insert an urgent one, replan"""
+    planner = IncrementalScheduler(tasks)
+    schedule, _ = planner.plan(time_budget=args.budget)
+    order = [entry["id"] for entry in schedule["schedule"]]
+    planner.mark_executed(order[:len(order) // 3])
+    if len(order) > 2:
+        planner.remove([order[-1]])
+    # The most contended resource of this workload, so the insertion has something to preempt
+    used = Counter(res for task in tasks for res in task["resources"])
+    resources = [used.most_common(1)[0][0]] if used else []
+    planner.insert([{"id": len(tasks) + 1, "name": "Urgent task", "duration": 2.0,
+                     "depends": [], "resources": resources}], urgent=True)
+    schedule, stats = planner.plan(time_budget=args.budget)
+    return schedule["makespan"], stats.expanded, stats.complete
+
+
+def _copy(tasks: List[Dict]) -> List[Dict]:
+    return [dict(task, depends=list(task["depends"]), resources=list(task["resources"])) for task in tasks]
+
+
+MODES: Dict[str, Callable] = {
+    "sequence": _run_sequence,
+    "greedy": _run_greedy,
+    "schedule": _run_schedule,
+    "anytime": _run_anytime,
+    "replan": _run_replan,
+}
+
+
+def measure(mode: str, tasks: List[Dict], args) -> Dict:
+    """
+    Run one mode on one DAG and collect its metrics
+    Wall time and peak memory come from separate runs, since tracing every
+    allocation slows the timed run down considerably.
+    """
+    started = time.perf_counter()
+    try:
+        cost, expanded, complete = MODES[mode](_copy(tasks), args)
+        error = None
+    except ValueError as e:
+        cost, expanded, complete, error = None, 0, False, str(e)
+    wall = time.perf_counter() - started
+
+    tracemalloc.start()
+    try:
+        MODES[mode](_copy(tasks), args)
+    except ValueError:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"wall_time_ms": wall * 1000.0, "nodes_expanded": expanded,
+            "peak_memory_kb": peak / 1024.0, "cost": cost, "optimal": complete,
+            "error": error}
+
+
+def run_suite(args) -> Dict:
+    if "sequence" in args.modes:
+        _get_planner()   # Keep the planner's construction out of the first timing
+    results = []
+    for size in args.sizes:
+        for trial in range(args.trials):
+            seed = args.seed + trial
+            tasks = generate_task_dag(size, args.density, args.durations,
+                                      args.resources, args.contention, seed)
+            for mode in args.modes:
+                row = {"mode": mode, "size": size, "seed": seed}
+                row.update(measure(mode, tasks, args))
+                results.append(row)
+                print(f"{mode:>9} n={size:<3} seed={seed:<4} "
+                      f"{row['wall_time_ms']:9.2f} ms  expanded={row['nodes_expanded']:<7} "
+                      f"peak={row['peak_memory_kb']:8.1f} KiB  "
+                      f"cost={'-' if row['cost'] is None else format(row['cost'], '.2f')}")
+    return {
+        "config": {key: value for key, value in vars(args).items()
+                   if key not in ("output", "baseline")},
+        "python": platform.python_version(),
+        "results": results,
+    }
+
+
+def compare(current: Dict, baseline: Dict, time_tolerance: float, cost_tolerance: float) -> List[str]:
+    """
+    Regressions of the current run against a baseline run
+    :return: Human-readable regression messages (empty when none)
+    """
+    def key(row):
+        return row["mode"], row["size"], row["seed"]
+
+    previous = {key(row): row for row in baseline.get("results", [])}
+    problems = []
+    for row in current["results"]:
+        old = previous.get(key(row))
+        if old is None:
+            continue
+        label = "{} n={} seed={}".format(*key(row))
+        if old["cost"] is not None and row["cost"] is None:
+            problems.append(f"{label}: no plan found (baseline cost {old['cost']:.2f})")
+        elif old["cost"] is not None and row["cost"] > old["cost"] * (1 + cost_tolerance) + 1e-9:
+            problems.append(f"{label}: cost {row['cost']:.2f} > baseline {old['cost']:.2f}")
+        # Sub-millisecond runs are too noisy to compare
+        if old["wall_time_ms"] >= 1.0 and row["wall_time_ms"] > old["wall_time_ms"] * (1 + time_tolerance):
+            problems.append(f"{label}: {row['wall_time_ms']:.2f} ms > baseline {old['wall_time_ms']:.2f} ms")
+    return problems
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description="Benchmark the task planner modes")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[6, 10, 14, 20])
+    parser.add_argument("--trials", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--density", type=float, default=0.2)
+    parser.add_argument("--durations", choices=["uniform", "exponential", "lognormal"], default="uniform")
+    parser.add_argument("--resources", type=int, default=4)
+    parser.add_argument("--contention", type=float, default=0.5)
+    parser.add_argument("--modes", nargs="+", choices=sorted(MODES), default=list(MODES))
+    parser.add_argument("--max-expansions", type=int, default=20000)
+    parser.add_argument("--budget", type=float, default=0.05, help="Anytime/replan budget in seconds")
+    parser.add_argument("--weight", type=float, default=2.0, help="Anytime heuristic weight")
+    parser.add_argument("--output", default="planner_bench.json")
+    parser.add_argument("--baseline", help="Earlier output file to compare against")
+    parser.add_argument("--time-tolerance", type=float, default=0.5)
+    parser.add_argument("--cost-tolerance", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    report = run_suite(args)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        problems = compare(report, baseline, args.time_tolerance, args.cost_tolerance)
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        return 1 if problems else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
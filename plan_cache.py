@@ -0,0 +1,207 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from config_registry import BASE_DIR
+
+
+def normalize_instruction(text: str) -> str:
+    """Cache key form of an instruction: lower case, no punctuation, single spaces"""
+    text = re.sub(r"[^\w\s]", " ", text.lower())
+    return re.sub(r"\s+", " ", text).strip()
+
+
+class LRUCache:
+    """Thread-safe in-memory LRU with an optional per-entry time to live"""
+
+    def __init__(self, max_entries: int = 256, ttl: Optional[float] = None):
+        """
+        :param max_entries: Entries kept before the least recently used is evicted
+        :param ttl: Seconds an entry stays valid (None = no expiry)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            value, expires = item
+            if expires is not None and expires < time.time():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def put(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        with self._lock:
+            self._data[key] = (value, None if ttl is None else time.time() + ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key: str) -> bool:
+        """Whether a live entry exists, without touching its recency"""
+        with self._lock:
+            item = self._data.get(key)
+            return item is not None and (item[1] is None or item[1] >= time.time())
+
+    def __len__(self):
+        return len(self._data)
+
+
+class PlanCache:
+    """Two-level cache of task decompositions.
+
+    Entries are keyed on the normalized instruction and the selected
+    demonstration. An in-memory LRU sits in front of a SQLite table, so
+    decompositions survive restarts. Every entry is tagged with a fingerprint
+    of the demonstration file; editing that file invalidates the cache.
+    """
+
+    def __init__(self, path: str = "plan_cache.sqlite3", max_entries: int = 5000,
+                 memory_entries: int = 256, ttl: Optional[float] = 7 * 24 * 3600,
+                 examples_path: str = "available_examples_short.json"):
+        """
+        :param path: SQLite database file, relative paths against the project directory
+                     (":memory:" for a process-local store)
+        :param max_entries: Rows kept on disk before the least recently used are evicted
+        :param memory_entries: Entries kept in the in-memory LRU
+        :param ttl: Seconds an entry stays valid (None = no expiry)
+        :param examples_path: Demonstration file whose changes invalidate the cache
+                              (relative to the project directory)
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.examples_path = os.path.join(BASE_DIR, examples_path)
+        self.memory = LRUCache(memory_entries, ttl)
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0,
+                      "stores": 0, "evictions": 0, "invalidations": 0}
+        self._lock = threading.Lock()
+        self._examples_stat = None
+        self._fingerprint = None
+        if path != ":memory:":
+            path = os.path.join(BASE_DIR, path)
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute("""CREATE TABLE IF NOT EXISTS plans (
+                                key TEXT PRIMARY KEY,
+                                fingerprint TEXT NOT NULL,
+                                tasks TEXT NOT NULL,
+                                created REAL NOT NULL,
+                                last_used REAL NOT NULL)""")
+        self._db.commit()
+        self._refresh_fingerprint()
+
+    def _refresh_fingerprint(self):
+        """Rehash the demonstration file when its mtime or size changed"""
+        try:
+            st = os.stat(self.examples_path)
+            stat = (st.st_mtime_ns, st.st_size)
+        except OSError:
+            stat = None
+        if stat == self._examples_stat and self._fingerprint is not None:
+            return
+        if stat is None:
+            fingerprint = "none"
+        else:
+            with open(self.examples_path, "rb") as f:
+                fingerprint = hashlib.sha1(f.read()).hexdigest()
+        self._examples_stat = stat
+        if fingerprint != self._fingerprint:
+            if self._fingerprint is not None:
+                self.stats["invalidations"] += 1
+            self._fingerprint = fingerprint
+            self.memory.clear()
+            self._db.execute("DELETE FROM plans WHERE fingerprint != ?", (fingerprint,))
+            self._db.commit()
+
+    @staticmethod
+    def make_key(instruction: str, example_key: str) -> str:
+        raw = normalize_instruction(instruction) + "\x1f" + example_key
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, instruction: str, example_key: str) -> Optional[list]:
+        """
+        Look up a cached decomposition
+        :return: A fresh copy of the cached task list, or None
+        """
+        key = self.make_key(instruction, example_key)
+        with self._lock:
+            self._refresh_fingerprint()
+            cached = self.memory.get(key)
+            if cached is not None:
+                self.stats["memory_hits"] += 1
+                return json.loads(cached)
+            row = self._db.execute(
+                "SELECT tasks, created FROM plans WHERE key = ? AND fingerprint = ?",
+                (key, self._fingerprint)).fetchone()
+            now = time.time()
+            if row is None or (self.ttl is not None and row[1] + self.ttl < now):
+                if row is not None:
+                    self._db.execute("DELETE FROM plans WHERE key = ?", (key,))
+                    self._db.commit()
+                self.stats["misses"] += 1
+                return None
+            self._db.execute("UPDATE plans SET last_used = ? WHERE key = ?", (now, key))
+            self._db.commit()
+            remaining = None if self.ttl is None else row[1] + self.ttl - now
+            self.memory.put(key, row[0], ttl=remaining)
+            self.stats["disk_hits"] += 1
+            return json.loads(row[0])
+
+    def put(self, instruction: str, example_key: str, tasks: list):
+        """Store a decomposition in both levels"""
+        key = self.make_key(instruction, example_key)
+        payload = json.dumps(tasks, ensure_ascii=False)
+        now = time.time()
+        with self._lock:
+            self._refresh_fingerprint()
+            self.memory.put(key, payload)
+            self._db.execute(
+                "INSERT OR REPLACE INTO plans (key, fingerprint, tasks, created, last_used) "
+                "VALUES (?, ?, ?, ?, ?)", (key, self._fingerprint, payload, now, now))
+            self.stats["stores"] += 1
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now: float):
+        if self.ttl is not None:
+            cur = self._db.execute("DELETE FROM plans WHERE created < ?", (now - self.ttl,))
+            self.stats["evictions"] += cur.rowcount
+        (count,) = self._db.execute("SELECT COUNT(*) FROM plans").fetchone()
+        if count > self.max_entries:
+            cur = self._db.execute(
+                "DELETE FROM plans WHERE key IN (SELECT key FROM plans "
+                "ORDER BY last_used ASC LIMIT ?)", (count - self.max_entries,))
+            self.stats["evictions"] += cur.rowcount
+
+    def clear(self):
+        with self._lock:
+            self.memory.clear()
+            self._db.execute("DELETE FROM plans")
+            self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def report(self) -> Dict:
+        """Hit/miss statistics"""
+        return {**self.stats, "hit_rate": self.hit_rate(), "memory_entries": len(self.memory)}
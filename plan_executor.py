@@ -0,0 +1,160 @@
+import asyncio
+import time
+from typing import Callable, Dict, List, Optional
+
+from command_schema import CommandError, validate_command, validate_plan
+
+
+class PlanExecutor:
+    """Asynchronous DAG executor for TaskPlanner plans.
+
+    Every task whose dependencies are done and whose resources are free is
+    started at once; resources are taken and returned through the planner's
+    _update_resources. Robot calls are blocking (NAOqi), so each dispatch runs
+    in the default thread pool. A task that keeps failing is dropped together
+    with its dependents and the rest of the plan is repaired by the planner.
+    """
+
+    def __init__(self, planner, controller=None,
+                 command_parser: Optional[Callable[[str], Dict]] = None,
+                 max_retries: int = 3):
+        """
+        :param planner: TaskPlanner holding the optimized plan
+        :param controller: PepperController (None = print the commands only)
+        :param command_parser: Turns a task name into a robot command,
+                               e.g. DeepSeekAdapter.parse_command
+        :param max_retries: Attempts per task before it is dropped
+        """
+        self.planner = planner
+        self.controller = controller
+        self.command_parser = command_parser
+        self.max_retries = max_retries
+
+    def resolve_command(self, task: Dict) -> Dict:
+        """Robot command for a task: explicit 'command', parsed name, or a spoken answer"""
+        if isinstance(task.get('command'), dict):
+            return task['command']
+        if self.command_parser is not None:
+            return self.command_parser(task['name'])
+        return {"action": "answer", "params": {"response": task['name']}}
+
+    def _dispatch_blocking(self, task: Dict) -> bool:
+        try:
+            command = validate_command(self.resolve_command(task))
+        except CommandError as e:
+            print(f"Task {task['id']} rejected: {e}")
+            return False
+        if self.controller is None:
+            print(f"Executing {task['name']}: {command}")
+            return True
+        return self.controller.execute(command) is not False
+
+    async def _dispatch(self, task: Dict) -> bool:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._dispatch_blocking, task)
+
+    async def run(self) -> Dict:
+        """
+        Execute the planner's optimized plan
+        :return: Execution report {"success", "failed", "dropped", "elapsed"}
+        """
+        planner = self.planner
+        report = {"success": [], "failed": [], "dropped": []}
+        started_at = time.perf_counter()
+        pending = [t for t in planner.optimized_plan if t['id'] not in planner.executed_tasks]
+        running = {}   # asyncio.Task -> task dict
+        held = set()   # Resources taken by running tasks
+        retries = {}
+        await self._reject_invalid(pending, report)
+
+        while pending or running:
+            if planner._plan_changed:
+                # Tasks were inserted while executing
+                active = {t['id'] for t in running.values()}
+                pending = [t for t in planner.optimized_plan
+                           if t['id'] not in planner.executed_tasks and t['id'] not in active]
+                planner._plan_changed = False
+
+            for task in self._startable(pending, running, held):
+                pending.remove(task)
+                held.update(task.get('resources', []))
+                planner._update_resources(task, acquire=True)
+                running[asyncio.ensure_future(self._dispatch(task))] = task
+
+            if not running:
+                # Remaining tasks wait on dependencies that will never finish
+                report["dropped"].extend(t['id'] for t in pending)
+                break
+
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                held.difference_update(task.get('resources', []))
+                planner._update_resources(task, acquire=False)
+                try:
+                    ok = future.result()
+                    error = None if ok else "command reported failure"
+                except Exception as e:
+                    ok, error = False, str(e)
+                if ok:
+                    report["success"].append(task)
+                    planner.executed_tasks.append(task['id'])
+                    continue
+
+                print(f"Task failed: {error}")
+                report["failed"].append(task)
+                retries[task['id']] = retries.get(task['id'], 0) + 1
+                if retries[task['id']] < self.max_retries:
+                    pending.insert(0, task)
+                    continue
+                print("Triggering replanning...")
+                # Running tasks stay pending in the replanner until they succeed, so a
+                # later permanent failure still drops their dependents
+                active = {t['id'] for t in running.values()}
+                report["dropped"].extend(planner.replanner.remove([task['id']]))
+                planner._replan(pending)
+                pending[:] = [t for t in pending if t['id'] not in active]
+
+        report["elapsed"] = time.perf_counter() - started_at
+        return report
+
+    async def _reject_invalid(self, pending: List[Dict], report: Dict):
+        """
+        Resolve the command of every task and validate the plan in bulk; bad tasks
+        are dropped before anything runs. Names are parsed concurrently, and the
+        validated commands are kept on the tasks so dispatch does not parse again.
+        """
+        loop = asyncio.get_running_loop()
+        resolved = await asyncio.gather(*(loop.run_in_executor(None, self.resolve_command, task)
+                                          for task in pending), return_exceptions=True)
+        normalized, errors = validate_plan([None if isinstance(command, BaseException) else command
+                                            for command in resolved])
+        for i, command in enumerate(resolved):
+            if isinstance(command, BaseException):
+                errors[i] = command
+        for task, command in zip(pending, normalized):
+            if command is not None:
+                task['command'] = command
+        if not errors:
+            return
+        for i, error in sorted(errors.items()):
+            print(f"Task {pending[i]['id']} rejected: {error}")
+            report["failed"].append(pending[i])
+        report["dropped"].extend(self.planner.replanner.remove([pending[i]['id'] for i in errors]))
+        self.planner._replan(pending)
+
+    def _startable(self, pending: List[Dict], running: Dict, held: set) -> List[Dict]:
+        """Tasks, in plan order, whose dependencies are done and resources free"""
+        blocked = {t['id'] for t in pending} | {t['id'] for t in running.values()}
+        taken = set(held)
+        startable = []
+        for task in pending:
+            if any(dep in blocked for dep in task.get('depends', [])):
+                continue
+            resources = set(task.get('resources', []))
+            if not resources & taken:
+                startable.append(task)
+            # A ready task waiting for a resource keeps its place in the plan
+            # order; later tasks may not take that resource before it
+            taken |= resources
+        return startable
@@ -0,0 +1,529 @@
+import heapq
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class TaskGraph:
+    """Compiled view of a task list used by the planner searches.
+
+    Every task gets a bit position, so a set of completed tasks is a single
+    integer. Dependencies and resources are precomputed as bitmasks, which
+    turns the per-expansion membership checks into integer operations.
+    """
+    __slots__ = ['tasks', 'ids', 'bit_of', 'durations', 'dep_masks',
+                 'dependents', 'res_masks', 'resource_names', 'full_mask']
+
+    def __init__(self, tasks: List[Dict]):
+        """
+        :param tasks: Task dicts in the format produced by generate_tasks
+        """
+        self.tasks = list(tasks)
+        self.ids = [t['id'] for t in self.tasks]
+        self.bit_of = {tid: i for i, tid in enumerate(self.ids)}
+        self.durations = [float(t.get('duration', 0.0)) for t in self.tasks]
+        self.resource_names = []
+        res_bit = {}
+        self.dep_masks = []
+        self.res_masks = []
+        for task in self.tasks:
+            dep_mask = 0
+            for dep in task.get('depends', []) or []:
+                # Dependencies outside the planned set (e.g. already executed
+                # tasks after a replan) are treated as satisfied
+                if dep in self.bit_of:
+                    dep_mask |= 1 << self.bit_of[dep]
+            res_mask = 0
+            for res in task.get('resources', []) or []:
+                if res not in res_bit:
+                    res_bit[res] = len(self.resource_names)
+                    self.resource_names.append(res)
+                res_mask |= 1 << res_bit[res]
+            self.dep_masks.append(dep_mask)
+            self.res_masks.append(res_mask)
+        self.dependents = [0] * len(self.tasks)
+        for i, deps in enumerate(self.dep_masks):
+            for j in range(len(self.tasks)):
+                if deps >> j & 1:
+                    self.dependents[j] |= 1 << i
+        self.full_mask = (1 << len(self.tasks)) - 1
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def add_tasks(self, tasks: List[Dict]) -> List[int]:
+        """
+        Append tasks in place, keeping existing bit positions stable
+        :param tasks: New task dicts; they may depend on existing tasks
+        :return: Bit positions assigned to the new tasks
+        """
+        first = len(self.tasks)
+        for task in tasks:
+            self.bit_of[task['id']] = len(self.tasks)
+            self.tasks.append(task)
+            self.ids.append(task['id'])
+            self.durations.append(float(task.get('duration', 0.0)))
+            self.dep_masks.append(0)
+            self.dependents.append(0)
+            res_mask = 0
+            for res in task.get('resources', []) or []:
+                if res not in self.resource_names:
+                    self.resource_names.append(res)
+                res_mask |= 1 << self.resource_names.index(res)
+            self.res_masks.append(res_mask)
+        self.full_mask = (1 << len(self.tasks)) - 1
+        for i in range(first, len(self.tasks)):
+            for dep in self.tasks[i].get('depends', []) or []:
+                if dep in self.bit_of:
+                    self.add_dependency(self.bit_of[dep], i)
+        return list(range(first, len(self.tasks)))
+
+    def add_dependency(self, before: int, after: int):
+        """Require task index `before` to finish before task index `after` starts"""
+        self.dep_masks[after] |= 1 << before
+        self.dependents[before] |= 1 << after
+
+    def ancestors(self, i: int) -> int:
+        """Mask of every task that task i transitively depends on"""
+        seen = 0
+        stack = [i]
+        while stack:
+            deps = self.dep_masks[stack.pop()] & ~seen
+            seen |= deps
+            j = 0
+            while deps:
+                if deps & 1:
+                    stack.append(j)
+                deps >>= 1
+                j += 1
+        return seen
+
+    def ready(self, done: int) -> List[int]:
+        """Indices of pending tasks whose dependencies are all in `done`"""
+        return [i for i in range(len(self.tasks))
+                if not done >> i & 1 and self.dep_masks[i] & done == self.dep_masks[i]]
+
+
+class SearchStats:
+    """Counters collected by a single search run"""
+    __slots__ = ['expanded', 'generated', 'pruned', 'complete']
+
+    def __init__(self):
+        self.expanded = 0   # Nodes popped from the open list
+        self.generated = 0  # Nodes pushed onto the open list
+        self.pruned = 0     # Successors dropped by the closed set or dominance
+        self.complete = False
+
+    def as_dict(self) -> Dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class _SchedNode:
+    """Timeline search node for the parallel scheduler"""
+    __slots__ = ['mask', 'free', 'finish', 'g', 'parent', 'index', 'start']
+
+    def __init__(self, mask: int, free: tuple, finish: tuple, g: float,
+                 parent, index: Optional[int], start: float):
+        self.mask = mask        # Scheduled tasks
+        self.free = free        # Time at which each resource becomes free
+        self.finish = finish    # Finish time per task (0.0 while pending)
+        self.g = g              # Makespan of the partial schedule
+        self.parent = parent
+        self.index = index      # Task scheduled by this node
+        self.start = start      # Its start time
+
+
+def _place(graph: TaskGraph, free: tuple, finish: tuple, i: int) -> float:
+    """Earliest start of task i given dependency finishes and resource availability"""
+    start = 0.0
+    deps = graph.dep_masks[i]
+    j = 0
+    while deps:
+        if deps & 1 and finish[j] > start:
+            start = finish[j]
+        deps >>= 1
+        j += 1
+    res = graph.res_masks[i]
+    r = 0
+    while res:
+        if res & 1 and free[r] > start:
+            start = free[r]
+        res >>= 1
+        r += 1
+    return start
+
+
+def _advance(graph: TaskGraph, node: _SchedNode, i: int) -> _SchedNode:
+    """Child node that schedules task i as early as possible after node"""
+    start = _place(graph, node.free, node.finish, i)
+    end = start + graph.durations[i]
+    free = node.free
+    res = graph.res_masks[i]
+    if res:
+        free = tuple(end if res >> r & 1 else t for r, t in enumerate(free))
+    finish = node.finish[:i] + (end,) + node.finish[i + 1:]
+    return _SchedNode(node.mask | 1 << i, free, finish, max(node.g, end), node, i, start)
+
+
+def critical_tails(graph: TaskGraph) -> List[float]:
+    """
+    Longest dependency chain starting at each task, including the task itself
+    :param graph: Compiled, acyclic task graph
+    :return: Tail length per task index
+    """
+    tails = [0.0] * len(graph.tasks)
+    for i in reversed(_topological_order(graph)):
+        longest = 0.0
+        dependents = graph.dependents[i]
+        j = 0
+        while dependents:
+            if dependents & 1 and tails[j] > longest:
+                longest = tails[j]
+            dependents >>= 1
+            j += 1
+        tails[i] = graph.durations[i] + longest
+    return tails
+
+
+def _topological_order(graph: TaskGraph) -> List[int]:
+    order = []
+    done = 0
+    while done != graph.full_mask:
+        ready = graph.ready(done)
+        if not ready:
+            raise ValueError("Task dependencies contain a cycle")
+        for i in ready:
+            done |= 1 << i
+        order.extend(ready)
+    return order
+
+
+def _lower_bound(graph: TaskGraph, node: _SchedNode, tails: List[float]) -> float:
+    """
+    Admissible makespan bound: the partial makespan, each pending task's
+    earliest possible start plus its critical tail, and each resource's free
+    time plus its pending load
+    """
+    bound = node.g
+    pending = graph.full_mask & ~node.mask
+    loads = list(node.free)
+    i = 0
+    rest = pending
+    while rest:
+        if rest & 1:
+            start = _place(graph, node.free, node.finish, i)
+            if start + tails[i] > bound:
+                bound = start + tails[i]
+            res = graph.res_masks[i]
+            r = 0
+            while res:
+                if res & 1:
+                    loads[r] += graph.durations[i]
+                res >>= 1
+                r += 1
+        rest >>= 1
+        i += 1
+    for load in loads:
+        if load > bound:
+            bound = load
+    return bound
+
+
+def _signature(graph: TaskGraph, node: _SchedNode) -> tuple:
+    """Vector compared component-wise for dominance between nodes with equal masks"""
+    pending = graph.full_mask & ~node.mask
+    relevant = tuple(node.finish[i] for i in range(len(graph.tasks))
+                     if node.mask >> i & 1 and graph.dependents[i] & pending)
+    return (node.g,) + node.free + relevant
+
+
+def _schedule_from(graph: TaskGraph, node: _SchedNode) -> Dict:
+    """Turn a goal node into the timed schedule format"""
+    placed = []
+    while node.index is not None:
+        placed.append((node.start, node.index))
+        node = node.parent
+    placed.sort()
+    entries = []
+    lanes = {name: [] for name in graph.resource_names}
+    makespan = 0.0
+    for start, i in placed:
+        task = graph.tasks[i]
+        end = start + graph.durations[i]
+        entries.append({"id": task['id'], "name": task.get('name', ''),
+                        "start": start, "end": end,
+                        "resources": list(task.get('resources', []) or [])})
+        for res in task.get('resources', []) or []:
+            lanes[res].append({"id": task['id'], "start": start, "end": end})
+        makespan = max(makespan, end)
+    return {"schedule": entries, "lanes": lanes, "makespan": makespan}
+
+
+def _root(graph: TaskGraph, busy: Optional[Dict], start_mask: int = 0) -> _SchedNode:
+    busy = busy or {}
+    free = tuple(max(0.0, float(busy.get(name, 0.0))) for name in graph.resource_names)
+    return _SchedNode(start_mask, free, (0.0,) * len(graph.tasks), 0.0, None, None, 0.0)
+
+
+def list_schedule(graph: TaskGraph, busy: Optional[Dict] = None,
+                  tails: Optional[List[float]] = None, start_mask: int = 0,
+                  rank: Optional[Dict[int, int]] = None) -> Dict:
+    """
+    Greedy list scheduling: repeatedly place the ready task that can start
+    first, preferring an earlier rank and then the longest critical tail on ties
+    :param graph: Compiled task graph
+    :param busy: Resource name -> time until which it is already occupied
+    :param tails: Critical tails per task index (computed when omitted)
+    :param start_mask: Tasks that are already finished and are not scheduled
+    :param rank: Task index -> position in a previous schedule
+    :return: Timed schedule (see search_schedule)
+    """
+    if tails is None:
+        tails = critical_tails(graph)
+    rank = rank or {}
+    unranked = len(graph.tasks)
+    node = _root(graph, busy, start_mask)
+    while node.mask != graph.full_mask:
+        ready = graph.ready(node.mask)
+        i = min(ready, key=lambda k: (_place(graph, node.free, node.finish, k),
+                                      rank.get(k, unranked), -tails[k], k))
+        node = _advance(graph, node, i)
+    return _schedule_from(graph, node)
+
+
+def search_schedule(graph: TaskGraph, busy: Optional[Dict] = None,
+                    max_expansions: int = 200000, weight: float = 1.0,
+                    time_budget: Optional[float] = None,
+                    tails: Optional[List[float]] = None,
+                    on_improve: Optional[Callable[[Dict], None]] = None,
+                    start_mask: int = 0,
+                    incumbent: Optional[Dict] = None) -> Tuple[Dict, SearchStats]:
+    """
+    Makespan-optimal (anytime) A* over a resource timeline
+    :param graph: Compiled task graph
+    :param busy: Resource name -> time until which it is already occupied
+    :param max_expansions: Expansion cap
+    :param weight: Heuristic weight; above 1.0 the search finds a first
+                   schedule quickly and keeps improving it until the open list
+                   is exhausted or the budget runs out
+    :param time_budget: Planning deadline in seconds
+    :param tails: Critical tails per task index (computed when omitted)
+    :param on_improve: Called with every schedule better than the previous one
+    :param start_mask: Tasks that are already finished and are not scheduled
+    :param incumbent: Known valid schedule to start from instead of the
+                      greedy one
+    :return: ({"schedule": [...], "lanes": {...}, "makespan": float}, stats)
+
+    Tasks hold their resources only while they run, so tasks sharing no
+    resource overlap freely. Each step appends one ready task at its earliest
+    start; every optimal schedule is reachable this way because resources
+    are exclusive. The greedy list schedule seeds the incumbent, so a valid
+    schedule is returned even when the budget expires immediately;
+    stats.complete is True only when the result is proven optimal.
+    """
+    deadline = None if time_budget is None else time.perf_counter() + time_budget
+    stats = SearchStats()
+    if tails is None:
+        tails = critical_tails(graph)
+    if incumbent is None:
+        incumbent = list_schedule(graph, busy, tails, start_mask)
+    best_cost = incumbent["makespan"]
+    if on_improve:
+        on_improve(incumbent)
+
+    root = _root(graph, busy, start_mask)
+    counter = 0
+    bound = _lower_bound(graph, root, tails)
+    open_heap = [(bound, 0, counter, bound, root)]
+    frontier = {}
+
+    while open_heap:
+        key, _, _, f, current = heapq.heappop(open_heap)
+        if key >= weight * best_cost - 1e-9:
+            # Every remaining bound is at least key / weight, so nothing left
+            # can beat the incumbent
+            break
+        if f >= best_cost - 1e-9:
+            stats.pruned += 1
+            continue
+        stats.expanded += 1
+        if stats.expanded > max_expansions or (
+                deadline is not None and time.perf_counter() >= deadline):
+            return incumbent, stats
+        if current.mask == graph.full_mask:
+            incumbent = _schedule_from(graph, current)
+            best_cost = incumbent["makespan"]
+            if on_improve:
+                on_improve(incumbent)
+            continue
+
+        depth = bin(current.mask).count('1') + 1
+        for i in graph.ready(current.mask):
+            child = _advance(graph, current, i)
+            f = _lower_bound(graph, child, tails)
+            if f >= best_cost - 1e-9:
+                stats.pruned += 1
+                continue
+            sig = _signature(graph, child)
+            entries = frontier.setdefault(child.mask, [])
+            if any(all(a <= b for a, b in zip(other, sig)) for other in entries):
+                stats.pruned += 1
+                continue
+            entries[:] = [e for e in entries if not all(a <= b for a, b in zip(sig, e))]
+            entries.append(sig)
+            counter += 1
+            stats.generated += 1
+            heapq.heappush(open_heap, (child.g + weight * (f - child.g), -depth, counter, f, child))
+
+    stats.complete = True
+    return incumbent, stats
+
+
+def search_sequence(graph: TaskGraph, **options) -> Tuple[List[Dict], SearchStats]:
+    """
+    Execution order of a makespan-optimal schedule
+    :param graph: Compiled task graph
+    :param options: Passed to search_schedule (busy, max_expansions, time_budget, ...)
+    :return: (tasks ordered by start time, stats)
+
+    A strictly sequential plan costs the summed duration whatever the order,
+    so the order is taken from the resource timeline search instead: tasks
+    competing for a resource are ordered to minimise the makespan, and
+    dependencies are respected. Raises ValueError on a dependency cycle.
+    """
+    schedule, stats = search_schedule(graph, **options)
+    by_id = {task['id']: task for task in graph.tasks}
+    return [by_id[entry['id']] for entry in schedule['schedule']], stats
+
+
+class IncrementalScheduler:
+    """Lifelong scheduler that repairs its previous result instead of replanning
+
+    The compiled graph, the critical tails and the last schedule survive
+    between calls. Executing tasks only moves them into the finished mask;
+    removals and insertions update the tails of the affected ancestors only.
+    Each plan() starts from the previous schedule repaired in its old order,
+    and skips the search entirely when that repair already meets the lower
+    bound, so replanning cost follows the size of the change.
+    """
+
+    def __init__(self, tasks: List[Dict]):
+        """
+        :param tasks: Task dicts in the format produced by generate_tasks
+        """
+        self.graph = TaskGraph(tasks)
+        self.tails = critical_tails(self.graph)
+        self.finished = 0      # Executed or removed tasks
+        self.removed = 0       # Tasks dropped from the plan
+        self.urgent = 0        # Tasks inserted as urgent
+        self.rank = {}         # Task index -> position in the last schedule
+        self.schedule = None
+
+    def pending_ids(self) -> List:
+        return [tid for i, tid in enumerate(self.graph.ids) if not self.finished >> i & 1]
+
+    def mark_executed(self, task_ids) -> None:
+        """Record finished tasks; no estimates change for the pending ones"""
+        for tid in task_ids:
+            if tid in self.graph.bit_of:
+                self.finished |= 1 << self.graph.bit_of[tid]
+
+    def remove(self, task_ids, cascade: bool = True) -> List:
+        """
+        Drop tasks (e.g. after repeated failures) from the remaining plan
+        :param task_ids: Tasks to drop
+        :param cascade: Also drop every pending task that depends on them
+        :return: Ids of all dropped tasks
+        """
+        drop = 0
+        stack = [self.graph.bit_of[tid] for tid in task_ids if tid in self.graph.bit_of]
+        while stack:
+            i = stack.pop()
+            if drop >> i & 1 or self.finished >> i & 1:
+                continue
+            drop |= 1 << i
+            if cascade:
+                dependents = self.graph.dependents[i]
+                j = 0
+                while dependents:
+                    if dependents & 1:
+                        stack.append(j)
+                    dependents >>= 1
+                    j += 1
+        self.finished |= drop
+        self.removed |= drop
+        changed = [i for i in range(len(self.graph)) if drop >> i & 1]
+        for i in changed:
+            self.tails[i] = 0.0
+        self._propagate(changed)
+        return [self.graph.ids[i] for i in changed]
+
+    def insert(self, tasks: List[Dict], urgent: bool = False) -> None:
+        """
+        Add tasks to the remaining plan
+        :param tasks: New task dicts
+        :param urgent: Run the new tasks before any pending task that competes
+                       for the same resources
+        """
+        new = self.graph.add_tasks(tasks)
+        self.tails.extend(self.graph.durations[i] for i in new)
+        if urgent:
+            for u in new:
+                self.urgent |= 1 << u
+                ancestors = self.graph.ancestors(u)
+                for j in range(len(self.graph)):
+                    if (self.finished | self.urgent | ancestors) >> j & 1:
+                        continue
+                    if self.graph.res_masks[j] & self.graph.res_masks[u]:
+                        self.graph.add_dependency(u, j)
+        for i in new:
+            self._recompute(i)
+        self._propagate(new)
+
+    def plan(self, busy: Optional[Dict] = None, **kwargs) -> Tuple[Dict, SearchStats]:
+        """
+        Schedule the remaining tasks, reusing the previous schedule
+        :param busy: Resource name -> time until which it is already occupied
+        :param kwargs: Forwarded to search_schedule (weight, time_budget, ...)
+        :return: (schedule, stats)
+        """
+        start_mask = self.finished
+        repaired = list_schedule(self.graph, busy, self.tails, start_mask, self.rank)
+        root = _root(self.graph, busy, start_mask)
+        if repaired["makespan"] <= _lower_bound(self.graph, root, self.tails) + 1e-9:
+            stats = SearchStats()
+            stats.complete = True
+            schedule = repaired
+        else:
+            schedule, stats = search_schedule(self.graph, busy, tails=self.tails,
+                                              start_mask=start_mask, incumbent=repaired,
+                                              **kwargs)
+        self.schedule = schedule
+        self.rank = {self.graph.bit_of[entry['id']]: n
+                     for n, entry in enumerate(schedule['schedule'])}
+        return schedule, stats
+
+    def _recompute(self, i: int) -> bool:
+        longest = 0.0
+        dependents = self.graph.dependents[i] & ~self.removed
+        j = 0
+        while dependents:
+            if dependents & 1 and self.tails[j] > longest:
+                longest = self.tails[j]
+            dependents >>= 1
+            j += 1
+        tail = 0.0 if self.removed >> i & 1 else self.graph.durations[i] + longest
+        changed = tail != self.tails[i]
+        self.tails[i] = tail
+        return changed
+
+    def _propagate(self, changed: List[int]) -> None:
+        """Push tail changes up to the ancestors that depend on them"""
+        stack = list(changed)
+        while stack:
+            deps = self.graph.dep_masks[stack.pop()]
+            j = 0
+            while deps:
+                if deps & 1 and self._recompute(j):
+                    stack.append(j)
+                deps >>= 1
+                j += 1
@@ -0,0 +1,105 @@
+import math
+import re
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # tiktoken is optional; fall back to an estimate
+    _ENCODING = None
+
+_CJK = re.compile(r"[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uff00-\uffef]")
+
+
+def count_tokens(text: str) -> int:
+    """Token count of text (exact with tiktoken, otherwise ~4 chars per token and 1 per CJK char)"""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    cjk = len(_CJK.findall(text))
+    return cjk + math.ceil((len(text) - cjk) / 4)
+
+
+class UsageLog:
+    """Per-prompt totals of the token usage reported by the API"""
+
+    def __init__(self):
+        self.totals = {}
+        self._lock = threading.Lock()
+
+    def record(self, prompt: str, response=None, estimated_prompt_tokens: int = 0) -> Dict:
+        """
+        Log the usage of one call
+        :param prompt: Name of the prompt (and variant) that was sent
+        :param response: Completion response; its usage block is used when present
+        :param estimated_prompt_tokens: Local count used when the response has no usage
+        :return: The usage of this call
+        """
+        usage = getattr(response, "usage", None)
+        prompt_tokens = getattr(usage, "prompt_tokens", None) or estimated_prompt_tokens
+        completion_tokens = getattr(usage, "completion_tokens", None) or 0
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached_tokens = getattr(details, "cached_tokens", None) or 0
+        call = {"prompt_tokens": prompt_tokens, "cached_tokens": cached_tokens,
+                "completion_tokens": completion_tokens, "estimated": usage is None}
+        with self._lock:
+            total = self.totals.setdefault(prompt, {"calls": 0, "prompt_tokens": 0,
+                                                    "cached_tokens": 0, "completion_tokens": 0})
+            total["calls"] += 1
+            total["prompt_tokens"] += prompt_tokens
+            total["cached_tokens"] += cached_tokens
+            total["completion_tokens"] += completion_tokens
+        print(f"[tokens] {prompt}: prompt={prompt_tokens}{'~' if usage is None else ''} "
+              f"cached={cached_tokens} completion={completion_tokens}")
+        return call
+
+
+usage_log = UsageLog()
+
+
+class PromptBuilder:
+    """Assembles a system prompt from named sections.
+
+    The static sections are joined once, so the system message is the same
+    bytes on every call and provider-side prefix caching can reuse it.
+    Anything that varies per call (examples, context, the instruction) goes
+    into the user message after it.
+    """
+
+    def __init__(self, name: str, sections: Iterable[Tuple[str, str]], separator: str = "\n\n"):
+        """
+        :param name: Prompt name used in the usage log
+        :param sections: (section name, text) pairs in prompt order
+        :param separator: Text placed between sections
+        """
+        self.name = name
+        self.sections = [(title, text.strip()) for title, text in sections if text.strip()]
+        self.prefix = separator.join(text for _, text in self.sections)
+
+    def section_tokens(self) -> Dict[str, int]:
+        """Token count of every section, in prompt order"""
+        return {title: count_tokens(text) for title, text in self.sections}
+
+    @property
+    def prefix_tokens(self) -> int:
+        return count_tokens(self.prefix)
+
+    def messages(self, user_content: str, dynamic: Optional[List[Tuple[str, str]]] = None) -> List[Dict]:
+        """
+        Chat messages: the static system prefix, then a user turn
+        :param user_content: The instruction itself
+        :param dynamic: (label, text) blocks placed before the instruction in the user turn
+        """
+        parts = [f"**{label}**:\n{text}" for label, text in (dynamic or []) if text]
+        parts.append(user_content)
+        return [{"role": "system", "content": self.prefix},
+                {"role": "user", "content": "\n\n".join(parts)}]
+
+    def record_usage(self, response=None, messages: Optional[List[Dict]] = None) -> Dict:
+        """Log the usage of a call made with this prompt"""
+        estimated = sum(count_tokens(m["content"]) for m in messages or [])
+        return usage_log.record(self.name, response, estimated)
+
+    def report(self) -> Dict:
+        return {"name": self.name, "prefix_tokens": self.prefix_tokens,
+                "sections": self.section_tokens()}
@@ -0,0 +1,113 @@
+import json
+import re
+from typing import Dict, Optional, Tuple
+
+from config_registry import get_registry
+from fast_path import FastPathParser
+from plan_cache import LRUCache, normalize_instruction
+from term_matcher import TermMatcher
+
+# Utterances whose command depends on robot or conversation state
+STATEFUL = re.compile(
+    r"\b(?:again|back|there|here|it|that|this|same|previous|last|more|less|louder|quieter|"
+    r"softer|brighter|dimmer|increase|decrease|raise|lower|further|closer|return)\b"
+    r"|\bvolume (?:up|down)\b|\b(?:turn|go) (?:up|down)\b"
+    r"|再|又|刚才|上次|之前|那里|那儿|这里|回去|回到|大点|小点|调高|调低|增大|减小")
+
+# Words that change the command even when two utterances are almost identical
+SLOTS = re.compile(
+    r"\d+(?:\.\d+)?|\b(?:half|one|two|three|four|five|six|seven|eight|nine|ten|left|right|forwards?|ahead|"
+    r"backwards?|around|max|maximum|min|minimum|full|red|green|blue|yellow|white|wave|bow|reset)\b"
+    r"|[零一二两三四五六七八九十半前后左右红绿蓝黄白]")
+
+# Words that can be added or dropped without changing the command
+FILLER = frozenset("a an the please kindly just now pepper robot hey ok okay can could would will you "
+                   "me us for to".split()) | frozenset("请吧的了呢啊呀嘛")
+# Latin words, and single characters otherwise (CJK text has no spaces)
+_TOKEN = re.compile(r"[a-z0-9_]+|\S")
+
+
+class ResponseCache:
+    """LRU + TTL cache of validated commands in front of parse_command.
+
+    Lookups key on the normalized utterance (filler such as "please" and
+    punctuation removed). With near_duplicates, the key is the utterance's
+    slots (numbers, directions, colours, gestures, domain terms) plus its
+    words without filler, so "take me to meeting room" reuses the command
+    of "take me to the meeting room" while any other differing word misses.
+    Utterances that refer to earlier state and "answer" commands are never
+    cached.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = 3600.0,
+                 near_duplicates: bool = True):
+        """
+        :param max_entries: Commands kept before the least recently used is evicted
+        :param ttl: Seconds an entry stays valid (None = no expiry)
+        :param near_duplicates: Also match utterances that differ only in filler words
+        """
+        self.memory = LRUCache(max_entries, ttl)
+        self.near_duplicates = near_duplicates
+        self.stats = {"hits": 0, "near_hits": 0, "misses": 0, "bypassed": 0, "stores": 0}
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return normalize_instruction(FastPathParser.normalize(text))
+
+    @staticmethod
+    def is_stateful(key: str) -> bool:
+        return STATEFUL.search(key) is not None
+
+    @staticmethod
+    def _slots(key: str) -> Tuple:
+        matcher = get_registry().index("navigation_params.json", "term_matcher", TermMatcher)
+        terms = sorted(term["std"] for _, _, term in matcher.finditer(key))
+        return tuple(SLOTS.findall(key)), tuple(terms)
+
+    @staticmethod
+    def _content(key: str) -> Tuple:
+        """Tokens of a key without filler, in order"""
+        return tuple(token for token in _TOKEN.findall(key) if token not in FILLER)
+
+    def _cache_key(self, key: str) -> str:
+        if not self.near_duplicates:
+            return key
+        return json.dumps([self._slots(key), self._content(key)], ensure_ascii=False)
+
+    def get(self, text: str) -> Optional[Dict]:
+        """
+        Cached command for an utterance
+        :return: A fresh copy of the command, or None on a miss or for stateful utterances
+        """
+        key = self.normalize(text)
+        if not key or self.is_stateful(key):
+            self.stats["bypassed"] += 1
+            return None
+        cached = self.memory.get(self._cache_key(key))
+        if cached is None:
+            self.stats["misses"] += 1
+            return None
+        payload, stored_key = cached
+        self.stats["hits" if stored_key == key else "near_hits"] += 1
+        return json.loads(payload)
+
+    def put(self, text: str, command: Dict):
+        """Store a validated command unless it depends on state or is a free-form answer"""
+        key = self.normalize(text)
+        if not key or self.is_stateful(key) or command.get("action") in (None, "answer"):
+            return
+        self.memory.put(self._cache_key(key), (json.dumps(command, ensure_ascii=False), key))
+        self.stats["stores"] += 1
+
+    def clear(self):
+        self.memory.clear()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["hits"] + self.stats["near_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def report(self) -> Dict:
+        """Hit/miss statistics"""
+        return {**self.stats, "evictions": self.memory.evictions,
+                "hit_rate": self.hit_rate(), "entries": len(self.memory)}
@@ -0,0 +1,135 @@
+from typing import Iterable, Iterator, List
+
+THINK_OPEN = "<think>"
+THINK_CLOSE = "</think>"
+
+# Terminators that end a sentence on their own, and those that need a following space
+_HARD_END = "。！？；!?\n"
+_SOFT_END = ".;"
+_CLOSERS = "\"'”’)）」』"
+
+
+class ThinkFilter:
+    """Incremental removal of <think>...</think> blocks from streamed text.
+
+    Tags may be split across chunks: a trailing fragment that could still
+    become a tag is held back until the next chunk decides it.
+    """
+
+    def __init__(self):
+        self._pending = ""
+        self._thinking = False
+
+    def feed(self, chunk: str) -> str:
+        """
+        :param chunk: Text delta from the model
+        :return: Visible text released by this chunk
+        """
+        text = self._pending + chunk
+        self._pending = ""
+        out = []
+        while text:
+            tag = THINK_CLOSE if self._thinking else THINK_OPEN
+            index = text.find(tag)
+            if index >= 0:
+                if not self._thinking:
+                    out.append(text[:index])
+                text = text[index + len(tag):]
+                self._thinking = not self._thinking
+                continue
+            keep = self._partial_tag(text, tag)
+            if not self._thinking:
+                out.append(text[:len(text) - keep])
+            self._pending = text[len(text) - keep:] if keep else ""
+            break
+        return "".join(out)
+
+    def flush(self) -> str:
+        """Visible text still held back at the end of the stream"""
+        text, self._pending = self._pending, ""
+        return "" if self._thinking else text
+
+    @staticmethod
+    def _partial_tag(text: str, tag: str) -> int:
+        """Length of the longest suffix of text that is a prefix of tag"""
+        for size in range(min(len(tag) - 1, len(text)), 0, -1):
+            if text.endswith(tag[:size]):
+                return size
+        return 0
+
+
+class SentenceSplitter:
+    """Cuts streamed text into sentences as soon as each one ends.
+
+    CJK terminators, "!" "?" and newlines end a sentence immediately; "."
+    and ";" only when followed by whitespace, so decimals like 3.5 stay
+    whole. Fragments shorter than min_chars are joined to the next sentence.
+    """
+
+    def __init__(self, min_chars: int = 2):
+        """
+        :param min_chars: Shortest text released on its own
+        """
+        self.min_chars = min_chars
+        self._buffer = ""
+
+    def feed(self, text: str) -> List[str]:
+        """
+        :param text: Next piece of visible text
+        :return: Sentences completed by it, in order
+        """
+        self._buffer += text
+        out = []
+        start = 0
+        i = 0
+        while i < len(self._buffer):
+            char = self._buffer[i]
+            end = None
+            if char in _HARD_END:
+                end = i + 1
+            elif char in _SOFT_END:
+                after = i + 1
+                while after < len(self._buffer) and self._buffer[after] in _CLOSERS:
+                    after += 1
+                if after >= len(self._buffer):
+                    break   # Wait for the next chunk to see what follows
+                if self._buffer[after].isspace():
+                    end = after
+            if end is not None:
+                while end < len(self._buffer) and self._buffer[end] in _CLOSERS:
+                    end += 1
+                sentence = self._buffer[start:end].strip()
+                if len(sentence) >= self.min_chars:
+                    out.append(sentence)
+                    start = end
+                i = end
+                continue
+            i += 1
+        self._buffer = self._buffer[start:]
+        if not self._buffer.strip():
+            self._buffer = ""
+        return out
+
+    def flush(self) -> List[str]:
+        """The unterminated tail at the end of the stream"""
+        tail, self._buffer = self._buffer.strip(), ""
+        return [tail] if tail else []
+
+
+def stream_sentences(deltas: Iterable[str], min_chars: int = 2) -> Iterator[str]:
+    """
+    Visible sentences of a streamed completion, <think> blocks removed
+    :param deltas: Text deltas in arrival order
+    :param min_chars: Shortest text released on its own
+    """
+    think = ThinkFilter()
+    splitter = SentenceSplitter(min_chars)
+    for delta in deltas:
+        visible = think.feed(delta)
+        if visible:
+            yield from splitter.feed(visible)
+    tail = think.flush()
+    if tail:
+        yield from splitter.feed(tail)
+    yield from splitter.flush()
+
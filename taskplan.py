@@ -1,45 +1,84 @@
-from openai import OpenAI
+from llm_gateway import get_gateway
+import asyncio
 import json
-from typing import List, Dict, Tuple
-import heapq
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
 from PepperPromptEngine import PepperPromptEngine
+from config_registry import get_registry
+from example_index import ExampleIndex
+from json_stream import JsonStreamExtractor
+from plan_cache import PlanCache
+from plan_executor import PlanExecutor
+from plan_search import IncrementalScheduler, TaskGraph, search_sequence
+from prompt_builder import PromptBuilder, usage_log
+
+DECOMPOSITION_SECTIONS = [
+    ("role", """You are a professional task decomposition expert skilled in breaking down semantic tasks into core steps. When decomposing tasks, refer to the example steps given with the user input.
+Then decompose each core step into multiple independent atomic tasks (atomic task types can be: movement|dialogue|navigation|exploration|volume setting | LED setting |gesture). Each atomic task should be indivisible, considering task dependencies, priority levels, and resource requirements.
+The output should be an array where each element represents an atomic task. Prioritize urgent tasks.
+**When the user input is a question or dialogue, do not answer the question, but generate a task with the "name" value as the user's input text.**"""),
+    ("format", """**Requirements for JSON Generation**:
+1. **Format Requirements**:
+   - The output must be in a compact, pure JSON format with no additional markup or explanatory text.
+   - The JSON structure must strictly adhere to the following template:
+     {"tasks": [{"id": integer, "name": "string", "duration": float, "depends": [optional], "resources": [optional]}]}
+     (duration unit: seconds)
+   - The `tasks` field must be present, and its value must be an array."""),
+    ("content", """2. **Content Requirements**:
+   - **No Empty Objects Allowed**: If no atomic tasks are found, the following task must be returned:
+     {"id": 0, "name": "Sorry, I cannot complete the task", "duration": 0.0}
+   - **Array Format**:
+     - Use English square brackets `[]` to enclose the entire task array.
+     - Separate tasks within the array with English commas `,`.
+     - Multiple JSON objects outside the array are prohibited."""),
+    ("example", """3. **Example Structure**:
+   {"tasks": [{"id": 1, "name": "Move to the podium", "duration": 5.0, "depends": [], "resources": []}, {"id": 2, "name": "Raise left hand", "duration": 3.0, "depends": [], "resources": []}]}"""),
+    ("notes", """**Note**:
+- `id` must be an integer.
+- `duration` must be a float (unit: seconds).
+- `depends` and `resources` are optional fields; if present, they must be arrays.
+- The generated JSON must strictly match the template and example structure, ensuring field names, data types, and formats are identical."""),
+]
+
 
 class TaskPlanner:
-    def __init__(self, api_key: str, model: str ):
+    def __init__(self, api_key: str, model: str, plan_cache: Optional[PlanCache] = None):
         """
         Integrated Task Planner
         :param api_key: SiliconFlow API key
         :param model: Model name to use
+        :param plan_cache: Decomposition cache (defaults to plan_cache.sqlite3 in the working directory)
         """
         self.model = model  # Model
-        self.client = OpenAI(api_key=api_key, base_url="https://api.chatanywhere.tech/v1")
+        self.client = get_gateway(api_key, "https://api.chatanywhere.tech/v1")
         self.tasks = []          # Original task list
         self.optimized_plan = [] # Optimized execution sequence
         self.resource_map = {}   # Resource timeline
         self.executed_tasks = [] # Record of executed tasks
-        with open('available_examples_short.json', 'r') as f:
-            action_list = json.load(f)
-        self.demonstration_set = []
-        for key, value in action_list.items():
-            self.demonstration_set.append((key, value))
-
-    class TaskNode:
-        """A* Algorithm Node Inner Class"""
-        __slots__ = ['task_id', 'g', 'h', 'path', 'resources']
-        
-        def __init__(self, task_id: int, g: float, h: float, path: list, resources: dict):
-            self.task_id = task_id
-            self.g = g      # Cost so far
-            self.h = h      # Heuristic estimate
-            self.path = path
-            self.resources = resources
+        self.search_stats = None # Counters from the last search
+        self.schedule = None     # Timed schedule from schedule_plan
+        self.replan_budget = 0.05  # Seconds allowed for each incremental replan
+        self._plan_changed = False # Set when tasks are inserted during execution
+        self.registry = get_registry()
+        self.engine = PepperPromptEngine()
+        # Byte-identical across calls so the provider can cache the prefix
+        self.decomposition_prompt = PromptBuilder("decomposition", DECOMPOSITION_SECTIONS)
+        self.example_min_score = 0.05  # Below this cosine score the LLM picks the example
+        self.plan_cache = plan_cache if plan_cache is not None else PlanCache()
 
-        @property
-        def f(self):
-            return self.g + self.h
+    @property
+    def demonstrations(self):
+        """Demonstration name -> steps, reloaded when the file changes"""
+        return self.registry.get('available_examples_short.json')
 
-        def __lt__(self, other):
-            return self.f < other.f
+    @property
+    def demonstration_set(self) -> List[Tuple[str, List[str]]]:
+        return list(self.demonstrations.items())
+
+    @property
+    def example_index(self) -> ExampleIndex:
+        """Local retrieval index over the demonstration names"""
+        return self.registry.index('available_examples_short.json', 'example_index',
+                                   lambda data: ExampleIndex(list(data)))
 
     def generate_tasks(self, instruction: str) -> List[Dict]:
         """
@@ -65,254 +104,304 @@ class TaskPlanner:
         #)
         #instruction = response.choices[0].message.content
         #print("Corrected text:", instruction)
-        example = self._select_most_similar_example(instruction)
-        sys_prompt = """You are a professional task decomposition expert skilled in breaking down semantic tasks into core steps. When decomposing tasks, refer to the following example steps:"""+f"{example}"+"""
-        Then decompose each core step into multiple independent atomic tasks (atomic task types can be: movement|dialogue|navigation|exploration|volume setting | LED setting |gesture). Each atomic task should be indivisible, considering task dependencies, priority levels, and resource requirements.
-        The output should be an array where each element represents an atomic task. Prioritize urgent tasks.
-        **When the user input is a question or dialogue, do not answer the question, but generate a task with the "name" value as the user's input text.**
-        **Requirements for JSON Generation**:
-        1. **Format Requirements**:
-           - The output must be in a compact, pure JSON format with no additional markup or explanatory text.
-           - The JSON structure must strictly adhere to the following template:
-             {
-               "tasks": [
-                 {
-                   "id": integer,
-                   "name": "string",
-                   "duration": float,  # Unit: seconds
-                   "depends": [optional],
-                   "resources": [optional]
-                 }
-               ]
-             }
-           - The `tasks` field must be present, and its value must be an array.
-        2. **Content Requirements**:
-           - **No Empty Objects Allowed**: If no atomic tasks are found, the following task must be returned:
-             {
-               "id": 0,
-               "name": "Sorry, I cannot complete the task",
-               "duration": 0.0
-             }
-           - **Array Format**:
-             - Use English square brackets `[]` to enclose the entire task array.
-             - Separate tasks within the array with English commas `,`.
-             - Multiple JSON objects outside the array are prohibited.
-        3. **Example Structure**:        
-           {
-             "tasks": [
-               {
-                 "id": 1,
-                 "name": "Move to the podium",
-                 "duration": 5.0,
-                 "depends": [],
-                 "resources": []
-               },
-               {
-                 "id": 2,
-                 "name": "Raise left hand",
-                 "duration": 3.0,
-                 "depends": [],
-                 "resources": []
-               }
-             ]
-           }
-
-        **Note**:
-        - `id` must be an integer.
-        - `duration` must be a float (unit: seconds).
-        - `depends` and `resources` are optional fields; if present, they must be arrays.
-        - The generated JSON must strictly match the template and example structure, ensuring field names, data types, and formats are identical.
+        tasks, example_key = self.propose_tasks(instruction)
+        return self.adopt_tasks(tasks, instruction, example_key)
+
+    def propose_tasks(self, instruction: str, use_cache: bool = True) -> Tuple[List[Dict], Optional[str]]:
         """
-        
+        Decompose an instruction without making the result the current plan
+        (safe to run speculatively; pass the result to adopt_tasks to commit it)
+        :param instruction: Natural language instruction
+        :param use_cache: Look the decomposition up in the plan cache first
+        :return: (tasks, demonstration key; None when the tasks came from the plan cache)
+        """
+        example = self._select_most_similar_example(instruction)
+        example_key = example[0]
+        cached = self.plan_cache.get(instruction, example_key) if use_cache else None
+        if cached is not None:
+            # Same instruction and demonstration as before: skip the LLM entirely
+            return cached, None
+        messages = self._decomposition_messages(instruction, example)
+
         response = self.client.chat.completions.create(
             model=self.model,
-            messages=[
-                {"role": "system", "content": sys_prompt},
-                {"role": "user", "content": instruction}
-            ],
+            messages=messages,
             temperature=0.3,
             response_format={"type": "json_object"}
         )
+        return self._decode_tasks(messages, response), example_key
+
+    async def propose_tasks_async(self, instruction: str,
+                                  use_cache: bool = True) -> Tuple[List[Dict], Optional[str]]:
+        """propose_tasks on the asyncio gateway; cancelling the caller aborts the request"""
+        example = await self._select_most_similar_example_async(instruction)
+        example_key = example[0]
+        cached = self.plan_cache.get(instruction, example_key) if use_cache else None
+        if cached is not None:
+            return cached, None
+        messages = self._decomposition_messages(instruction, example)
+        response = await self.client.achat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.3,
+            response_format={"type": "json_object"}
+        )
+        return self._decode_tasks(messages, response), example_key
+
+    async def generate_tasks_async(self, instruction: str) -> List[Dict]:
+        """generate_tasks on the asyncio gateway"""
+        tasks, example_key = await self.propose_tasks_async(instruction)
+        try:
+            self._install_tasks(tasks)
+        except ValueError as e:
+            print(f"Rejected decomposition ({e}), regenerating")
+            tasks, example_key = await self.propose_tasks_async(instruction, use_cache=False)
+            self._install_tasks(tasks)
+        if example_key is not None:
+            self.plan_cache.put(instruction, example_key, self.tasks)
+        return self.tasks
+
+    def _decode_tasks(self, messages: List[Dict], response) -> List[Dict]:
+        self.decomposition_prompt.record_usage(response, messages)
+
+        raw_content=self.engine.extract_json_from_text(response.choices[0].message.content)         
+        return json.loads(raw_content)["tasks"]
+
+    def adopt_tasks(self, tasks: List[Dict], instruction: Optional[str] = None,
+                    example_key: Optional[str] = None) -> List[Dict]:
+        """
+        Make a decomposition produced elsewhere (e.g. a fused front-end call) the current plan
+        :param tasks: Tasks in the generate_tasks format
+        :param instruction: Instruction they decompose; with example_key, stores them in the plan cache
+        :param example_key: Demonstration the decomposition was guided by
+        :return: The task list
 
-        engine=PepperPromptEngine()
-        raw_content=engine.extract_json_from_text(response.choices[0].message.content)         
-        self.tasks = json.loads(raw_content)["tasks"]
-        self._preprocess_tasks()
-        # Modification point 3: Enforce completion of the duration field
-        for task in self.tasks:
-            if 'duration' not in task:
-                task['duration'] = 0.0
-                print(f"Warning: Task {task['id']} lacks duration, set to 0")
-            else:
-                # Ensure correct type
-                task['duration'] = float(task['duration'])
+        A decomposition with duplicate ids or a dependency cycle is regenerated
+        from the instruction without the plan cache (ValueError when there is no
+        instruction or the new one is rejected too). Only accepted plans are cached.
+        """
+        try:
+            self._install_tasks(tasks)
+        except ValueError as e:
+            if instruction is None:
+                raise
+            print(f"Rejected decomposition ({e}), regenerating")
+            tasks, example_key = self.propose_tasks(instruction, use_cache=False)
+            self._install_tasks(tasks)
+        if instruction is not None and example_key is not None:
+            self.plan_cache.put(instruction, example_key, self.tasks)
         return self.tasks
 
+    def _install_tasks(self, tasks: List[Dict]):
+        """
+        Validate a decomposition and make it the current plan
+        :raises ValueError: Task without id, duplicate ids or a dependency cycle;
+                            the current plan is left unchanged
+        """
+        ids = set()
+        for task in tasks:
+            if not isinstance(task, dict) or 'id' not in task:
+                raise ValueError(f"Task without id: {task!r}")
+            if task['id'] in ids:
+                raise ValueError(f"Duplicate task id {task['id']!r}")
+            ids.add(task['id'])
+            self._complete_task(task)
+        previous = self.tasks
+        self.tasks = tasks
+        try:
+            self._preprocess_tasks()
+        except ValueError:
+            self.tasks = previous
+            raise
+
+    def generate_tasks_stream(self, instruction: str) -> Iterator[Dict]:
+        """
+        Generate the task sequence while the completion is still streaming
+        :param instruction: Natural language instruction
+        :return: Iterator over tasks, each yielded as soon as its JSON closes
+
+        When the iterator is exhausted self.tasks holds the full list, exactly
+        as after generate_tasks. A streamed decomposition that turns out to be
+        invalid (duplicate ids, dependency cycle) is not cached; it is replaced
+        by a regenerated one in self.tasks.
+        """
+        example = self._select_most_similar_example(instruction)
+        example_key = example[0]
+        cached = self.plan_cache.get(instruction, example_key)
+        if cached is not None:
+            self.adopt_tasks(cached, instruction)
+            yield from self.tasks
+            return
+
+        messages = self._decomposition_messages(instruction, example)
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=0.3,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+        self.decomposition_prompt.record_usage(None, messages)
+        extractor = JsonStreamExtractor(array_key="tasks")
+        tasks = []
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            for task in extractor.feed(chunk.choices[0].delta.content or ""):
+                if not isinstance(task, dict) or 'id' not in task:
+                    continue
+                self._complete_task(task)
+                tasks.append(task)
+                yield task
+
+        self.adopt_tasks(tasks, instruction, example_key)
+
+    def _complete_task(self, task: Dict):
+        """Enforce completion of the duration field"""
+        if 'duration' not in task:
+            task['duration'] = 0.0
+            print(f"Warning: Task {task['id']} lacks duration, set to 0")
+        else:
+            # Ensure correct type
+            task['duration'] = float(task['duration'])
+
+    def _decomposition_messages(self, instruction: str, example) -> List[Dict]:
+        """Static decomposition rules as the system prefix; the demonstration travels with the instruction"""
+        return self.decomposition_prompt.messages(instruction, dynamic=[("Example Steps", f"{example}")])
+
     def _preprocess_tasks(self):
-        """Task preprocessing: Build dependency graph"""
+        """Task preprocessing: Build dependency graph and the incremental scheduler"""
         #self.dep_graph = {t['id']: set(t['depends']) for t in self.tasks}
+        # Kept across replans so that repairs reuse the compiled graph and estimates;
+        # built first because it rejects dependency cycles (ValueError)
+        self.replanner = IncrementalScheduler(self.tasks)
         self.dep_graph = {t['id']: set(t.get('depends', [])) for t in self.tasks}
         self.task_dict = {t['id']: t for t in self.tasks}
-    def _heuristic(self, remaining: List[int]) -> float:
-        """Heuristic function: Estimate shortest time for remaining tasks"""
-        return sum(self.task_dict[tid].get('duration', 0) for tid in remaining)  # Add default value 0
-
-    def _validate_resources(self, task_id: int, resources: dict) -> bool:
-        """Resource conflict detection"""
-        task = self.task_dict[task_id]
-        # Modify this line, add empty list by default
-        for res in task.get('resources', []):  # <--- Key modification
-            if resources.get(res, 0) > 0:
-                return False
-        return True
+        self.task_graph = self.replanner.graph
 
     def optimize_taskplan(self, tasks) -> List[Dict]:
-        """Perform A* algorithm optimization"""
-        open_heap = []
-        start_node = self.TaskNode(
-            task_id=None,
-            g=0,
-            h=self._heuristic([t['id'] for t in tasks]),
-            path=[],
-            resources={}
-        )
-        heapq.heappush(open_heap, start_node)
-        while open_heap:
-            current = heapq.heappop(open_heap)
-            if len(current.path) == len(tasks):
-                self.optimized_plan = [self.task_dict[tid] for tid in current.path]
-                return self.optimized_plan
-
-            # Generate successor nodes
-            for task in tasks:
-                if task['id'] in current.path:
-                    continue
-                if all(dep in current.path for dep in task.get('depends', [])):
-                    # Insert resource validation --------------------------------------------------
-                    if not self._validate_resources(task['id'], current.resources):
-                        continue  # Skip task due to resource conflict
-                    # ------------------------------------------------------------
-                    new_resources = current.resources.copy()
-                    valid = True
-                    # Simulate resource usage
-                    for res in task.get('resources', []):  # <--- Similarly modified
-                        if new_resources.get(res, 0) > 0:
-                            valid = False
-                            break
-                        new_resources[res] = task.get('duration', 0.0)  # Safe assignment                                           
-                    if valid:
-                        new_path = current.path + [task['id']]
-                        remaining = [t['id'] for t in tasks if t['id'] not in new_path]
-                        new_node = self.TaskNode(
-                            task_id=task['id'],
-                            g=current.g + task.get('duration', 0.0),  # Add default value
-                            h=self._heuristic(remaining),
-                            path=new_path,
-                            resources=new_resources
-                        )
-                        heapq.heappush(open_heap, new_node)
-
-        return tasks
+        """
+        Perform A* algorithm optimization on an explicit task list
+        :return: Tasks in the start order of a makespan-optimal schedule, where
+                 tasks sharing a resource run one after the other (ValueError on a
+                 dependency cycle)
+        """
+        self.optimized_plan, self.search_stats = search_sequence(TaskGraph(tasks))
+        return self.optimized_plan
 
     def optimize_plan(self) -> List[Dict]:
         """Perform A* algorithm optimization"""
-        open_heap = []
-        start_node = self.TaskNode(
-            task_id=None,
-            g=0,
-            h=self._heuristic([t['id'] for t in self.tasks]),
-            path=[],
-            resources={}
-        )
-        heapq.heappush(open_heap, start_node)
+        return self.optimize_taskplan(self.tasks)
 
-        while open_heap:
-            current = heapq.heappop(open_heap)
-            
-            if len(current.path) == len(self.tasks):
-                self.optimized_plan = [self.task_dict[tid] for tid in current.path]
-                return self.optimized_plan
+    def schedule_plan(self, max_expansions: int = 200000) -> Dict:
+        """
+        Build a parallel, makespan-optimal schedule
+        :param max_expansions: Search expansion cap
+        :return: {"schedule": [...], "lanes": {...}, "makespan": float}
 
-            # Generate successor nodes
-            for task in self.tasks:
-                if task['id'] in current.path:
-                    continue
-                if all(dep in current.path for dep in task.get('depends', [])):           
-                    # Insert resource validation --------------------------------------------------
-                    if not self._validate_resources(task['id'], current.resources):
-                        continue  # Skip task due to resource conflict
-                    # ------------------------------------------------------------
-                    new_resources = current.resources.copy()
-                    valid = True
-                    
-                    # Simulate resource usage
-                    for res in task.get('resources', []):  # <--- Similarly modified
-                        if new_resources.get(res, 0) > 0:
-                            valid = False
-                            break
-                        new_resources[res] = task.get('duration', 0.0)  # Safe assignment            
-                    if valid:
-                        new_path = current.path + [task['id']]
-                        remaining = [t['id'] for t in self.tasks if t['id'] not in new_path]
-                        new_node = self.TaskNode(
-                            task_id=task['id'],
-                            g=current.g + task.get('duration', 0.0),  # Add default value
-                            h=self._heuristic(remaining),
-                            path=new_path,
-                            resources=new_resources
-                        )
-                        heapq.heappush(open_heap, new_node)
-
-        return tasks
-
-    def execute(self, max_retries: int = 3) -> Dict:
+        Tasks that share no resources may overlap. Resources still occupied in
+        self.resource_map delay the first task that needs them. The start-ordered
+        tasks also become self.optimized_plan.
+        """
+        return self._run_schedule_search(max_expansions=max_expansions)
+
+    def anytime_schedule(self, time_budget: float = 0.05, weight: float = 2.0,
+                         on_improve: Optional[Callable[[Dict], None]] = None) -> Dict:
         """
-        Execute the optimized task sequence
+        Anytime weighted A* scheduling under a planning deadline
+        :param time_budget: Planning deadline in seconds (e.g. 0.05 for 50 ms)
+        :param weight: Heuristic weight for the first solutions
+        :param on_improve: Optional callback receiving each improved schedule
+        :return: Best schedule found before the deadline
+
+        A greedy schedule is available immediately; the search then keeps
+        improving it until the deadline or until optimality is proven
+        (self.search_stats.complete).
+        """
+        return self._run_schedule_search(weight=weight, time_budget=time_budget,
+                                         on_improve=on_improve)
+
+    def _run_schedule_search(self, **kwargs) -> Dict:
+        self.schedule, self.search_stats = self.replanner.plan(busy=self.resource_map, **kwargs)
+        self.optimized_plan = [self.task_dict[entry['id']] for entry in self.schedule['schedule']]
+        return self.schedule
+
+    def execute(self, max_retries: int = 3, controller=None,
+                command_parser: Optional[Callable[[str], Dict]] = None) -> Dict:
+        """
+        Execute the optimized plan, running independent branches concurrently
         :param max_retries: Maximum number of retries
+        :param controller: PepperController that carries out the commands (None = print only)
+        :param command_parser: Turns a task name into a robot command, e.g. DeepSeekAdapter.parse_command
         :return: Execution result report
         """
-        report = {"success": [], "failed": []}
-        current_plan = self.optimized_plan.copy()
-        retry_count = 0
-
-        while current_plan and retry_count < max_retries:
-            task = current_plan[0]
-            try:
-                # Simulate task execution (should actually connect to executor interface)
-                print(f"Executing {task['name']}...")
-                self._update_resources(task, acquire=True)
-                
-                # Record successful task
-                report["success"].append(task)
-                self.executed_tasks.append(task['id'])
-                current_plan.pop(0)
-                retry_count = 0  # Reset retry counter
-            except Exception as e:
-                print(f"Task failed: {str(e)}")
-                report["failed"].append(task)
-                retry_count += 1
-                
-                if retry_count >= max_retries:
-                    print("Triggering replanning...")
-                    self._replan(current_plan)
-                    retry_count = 0
-
-        return report
+        return asyncio.run(self.execute_async(max_retries, controller, command_parser))
+
+    async def execute_async(self, max_retries: int = 3, controller=None,
+                            command_parser: Optional[Callable[[str], Dict]] = None) -> Dict:
+        """Coroutine version of execute for callers that already run an event loop"""
+        executor = PlanExecutor(self, controller, command_parser, max_retries)
+        return await executor.run()
 
     def _update_resources(self, task: Dict, acquire: bool):
         """Update resource usage status"""
         factor = 1 if acquire else -1
-        for res in task['resources']:
+        for res in task.get('resources', []):
             self.resource_map[res] = self.resource_map.get(res, 0) + factor * task['duration']
 
     def _replan(self, remaining_tasks: List[Dict]):
-        """Dynamic replanning"""
-        self.tasks = [t for t in self.tasks if t['id'] not in self.executed_tasks]
-        self._preprocess_tasks()
-        new_plan = self.optimize_plan()
+        """Incremental replanning: repair the previous schedule instead of planning from scratch"""
+        self.replanner.mark_executed(self.executed_tasks)
+        pending = set(self.replanner.pending_ids())
+        self.tasks = [t for t in self.tasks if t['id'] in pending]
+        new_plan = self._run_schedule_search(time_budget=self.replan_budget)
         remaining_tasks.clear()
-        remaining_tasks.extend(new_plan)
+        remaining_tasks.extend(self.task_dict[entry['id']] for entry in new_plan['schedule'])
+
+    def insert_tasks(self, tasks: List[Dict], urgent: bool = True) -> List[Dict]:
+        """
+        Insert new tasks into the current plan, also while execute() is running
+        :param tasks: Task dicts in the generate_tasks format
+        :param urgent: Schedule them ahead of pending tasks competing for the same resources
+        :return: The updated optimized plan
+        """
+        for task in tasks:
+            task['duration'] = float(task.get('duration', 0.0))
+            self.task_dict[task['id']] = task
+            self.dep_graph[task['id']] = set(task.get('depends', []))
+        self.tasks.extend(tasks)
+        self.replanner.mark_executed(self.executed_tasks)
+        self.replanner.insert(tasks, urgent=urgent)
+        self._run_schedule_search(time_budget=self.replan_budget)
+        self._plan_changed = True
+        return self.optimized_plan
+
+    def local_example(self, query_task: str) -> Optional[Tuple[str, List[str]]]:
+        """Closest demonstration from the local index, or None when nothing is similar enough"""
+        example, score = self._closest_example(query_task)
+        return example if score >= self.example_min_score else None
+
+    def _closest_example(self, query_task: str) -> Tuple[Tuple[str, List[str]], float]:
+        (task, score), = self.example_index.search(query_task, k=1)
+        return (task, self.demonstrations[task]), score
+
     def _select_most_similar_example(self, query_task: str) -> Tuple[str, List[str]]:
+        """Pick the closest demonstration with the local index, without an LLM round trip"""
+        best_example = self.local_example(query_task)
+        if best_example is None:
+            # Nothing in common with any demonstration; let the LLM judge semantics
+            return self._select_example_with_llm(query_task)
+        print(f"Identified best example: {best_example}")
+        return best_example
+
+    async def _select_most_similar_example_async(self, query_task: str) -> Tuple[str, List[str]]:
+        best_example = self.local_example(query_task)
+        if best_example is None:
+            return await self._select_example_with_llm_async(query_task)
+        print(f"Identified best example: {best_example}")
+        return best_example
+
+    def _select_example_with_llm(self, query_task: str) -> Tuple[str, List[str]]:
         # 1. Construct LLM semantic matching prompt
         prompt = self._build_semantic_match_prompt(query_task)
         #print(f"Constructing LLM semantic matching prompt--->{prompt}")
@@ -323,44 +412,60 @@ class TaskPlanner:
             messages=prompt,
             temperature=0.3
         )
+        return self._decode_example_match(query_task, response)
+
+    async def _select_example_with_llm_async(self, query_task: str) -> Tuple[str, List[str]]:
+        response = await self.client.achat.completions.create(
+            model=self.model,
+            messages=self._build_semantic_match_prompt(query_task),
+            temperature=0.3
+        )
+        return self._decode_example_match(query_task, response)
+
+    def _decode_example_match(self, query_task: str, response) -> Tuple[str, List[str]]:
+        usage_log.record("example_match", response)
     
-        engine = PepperPromptEngine()
         #print(f"LLM response--->{response}")
-        llm_response = engine.extract_json_from_text(response.choices[0].message.content)
+        llm_response = self.engine.extract_json_from_text(response.choices[0].message.content)
         
         # 3. Parse response and extract optimal match
         best_example = self._parse_llm_response(llm_response)
+        if best_example is None:
+            # No usable answer: the closest local match, however weak, still gives
+            # the plan cache a real demonstration key
+            best_example, _ = self._closest_example(query_task)
         print(f"Identified best example: {best_example}")
         return best_example
     
     def _build_semantic_match_prompt(self, query_task: str) -> str:
+        candidate_examples = "\n".join([
+            f"Candidate {i+1}: Task Name '{task}'" 
+            for i, (task, plan) in enumerate(self.demonstration_set)
+        ])
+
+        # Rules and candidate pool only change with the demonstration file, so they form a cacheable prefix
         system_msg = {
             "role": "system",
-            "content": """You are a semantic matching expert. Select the candidate example most semantically similar to the user query by strictly following these rules:
+            "content": f"""You are a semantic matching expert. Select the candidate example most semantically similar to the user query by strictly following these rules:
     1. Analyze core intent and contextual scenario of the query
     2. Compare descriptive keywords and contextual relevance of candidates
     3. Prioritize matching on three dimensions: task objective, operation target, constraints
-    4. Output must be JSON format containing the highest-scoring task name and plan in JSON format"""
+    4. Output must be JSON format containing the highest-scoring task name and plan in JSON format
+
+    Candidate Pool:
+    {candidate_examples}"""
         }
         
-        candidate_examples = "\n".join([
-            f"Candidate {i+1}: Task Name '{task}'" 
-            for i, (task, plan) in enumerate(self.demonstration_set)
-        ])
-        
         user_msg = {
             "role": "user",
             "content": f"""Query Task: {query_task}
     
-    Candidate Pool:
-    {candidate_examples}
-    
     Return the highest-scoring task name and plan in JSON format, sorted by descending score."""
         }
         
         return [system_msg, user_msg]
     
-    def _parse_llm_response(self, response: str) -> Tuple[str, List[str]]:
+    def _parse_llm_response(self, response: str) -> Optional[Tuple[str, List[str]]]:
         try:
             # Extract and validate JSON content
             json_start = response.find('{')
@@ -372,6 +477,7 @@ class TaskPlanner:
                 if task == result["task_name"]:
                     return (task, plan)
                     
-        except (json.JSONDecodeError, KeyError):
-            # Fallback to alternative similarity algorithm
-            return response 
+        except (json.JSONDecodeError, KeyError, TypeError):
+            pass
+        # Unparsable or not a candidate
+        return None 
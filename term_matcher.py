@@ -0,0 +1,68 @@
+import re
+from typing import Dict, List, Tuple
+
+
+class TermMatcher:
+    """Domain term matcher compiled once from navigation_params.json entries.
+
+    All patterns (plus optional "aliases") are folded into a single
+    alternation ordered longest first, so "安全出口" wins over "出口" and the
+    text is scanned once. Tags inserted by a replacement are never rescanned.
+    Latin patterns only match whole words; CJK patterns match anywhere.
+    """
+
+    def __init__(self, terms: List[Dict]):
+        """
+        :param terms: Entries with "pattern", "std", "type" and optional "aliases"
+        """
+        self.terms = terms
+        self._by_surface = {}
+        for term in terms:
+            for surface in [term["pattern"]] + list(term.get("aliases", [])):
+                # The first entry wins when two terms share a surface form
+                self._by_surface.setdefault(surface.casefold(), term)
+        surfaces = sorted(self._by_surface, key=lambda s: (-len(s), s))
+        if surfaces:
+            self._regex = re.compile("|".join(self._wrap(s) for s in surfaces), re.IGNORECASE)
+        else:
+            self._regex = None
+
+    @staticmethod
+    def _wrap(surface: str) -> str:
+        pattern = re.escape(surface)
+        if re.match(r"[A-Za-z0-9_]", surface):
+            pattern = r"(?<![A-Za-z0-9_])" + pattern
+        if re.search(r"[A-Za-z0-9_]$", surface):
+            pattern += r"(?![A-Za-z0-9_])"
+        return pattern
+
+    def finditer(self, text: str) -> List[Tuple[int, int, Dict]]:
+        """
+        Non-overlapping term occurrences, left to right
+        :return: (start, end, term) tuples
+        """
+        if self._regex is None:
+            return []
+        return [(m.start(), m.end(), self._by_surface[m.group(0).casefold()])
+                for m in self._regex.finditer(text)]
+
+    def tag(self, text: str) -> str:
+        """Replace every term with <type>std</type> in one pass"""
+        if self._regex is None:
+            return text
+
+        def replace(match):
+            term = self._by_surface[match.group(0).casefold()]
+            return f"<{term['type']}>{term['std']}</{term['type']}>"
+
+        return self._regex.sub(replace, text)
+
+    def lookup(self, surface: str):
+        """Term for an exact surface form or standard name, or None"""
+        key = surface.casefold()
+        if key in self._by_surface:
+            return self._by_surface[key]
+        for term in self.terms:
+            if term["std"].casefold() == key:
+                return term
+        return None